@@ -1,14 +1,11 @@
+import time
+
+STARTED = time.perf_counter()  # Cold start is measured from here to the first idle main loop
+
 import customtkinter as ctk
-from customtkinter import *
-from CTkColorPicker import *
-from CTkMenuBar import *
-from miio import Yeelight
-from miio.exceptions import DeviceException
-from PIL import ImageColor
-import threading
 from functools import partial
-import json
-import os
+from lamp_engine import LampEngine
+from throttle import CoalescingThrottle
 
 #Color Palette
 BG_COLOR = "#343541"      # Background color
@@ -17,12 +14,17 @@ ACCENT_COLOR = "#10A37F"
 TEXT_COLOR = "#ECECF1"
 
 SIZE = "300x350"
-CONFIG_FILE = "config.json"
+SLIDER_INTERVAL = 0.2  # Minimum seconds between writes of one slider
+DRAG_HOLD = 1.0  # Seconds pushed state is not applied to a slider being dragged
+STARTUP_TARGET_MS = 300  # Budget from launch to an interactive window
 
 class MiHomeApp:
     def __init__(self, root):
         self.root = root
-        self.load_config()
+        # Device results arrive on the executor threads; widgets are only touched via root.after
+        self.engine = LampEngine(dispatch=lambda func, *args: self.root.after(0, func, *args))
+        self.engine.state_listeners.append(self.show_state)
+        self.engine.props_listeners.append(self.show_props)
 
         self.root.title("Mi Home")
         self.root.geometry(SIZE)
@@ -32,56 +34,37 @@ class MiHomeApp:
         ctk.set_default_color_theme("green")
         self.root.configure(fg_color=BG_COLOR)
 
-        self.device = None
-        self.connect_device()
-        self.timer = None
+        self.slider_channel = CoalescingThrottle(SLIDER_INTERVAL)
+        self.dragged_at = 0.0
 
         self.create_widgets()
-        self.update_status()
-
-    def load_config(self):
-        if os.path.exists(CONFIG_FILE):
-            try:
-                with open(CONFIG_FILE, "r") as f:
-                    config = json.load(f)
-                    self.DEVICE_IP = config.get("DEVICE_IP")
-                    self.DEVICE_TOKEN = config.get("DEVICE_TOKEN")
-                    self.MODEL = config.get("MODEL")
-            except json.JSONDecodeError:
-                print("Error reading config.json.")
-        else:
-            print("config.json not found.")
-
-    def save_config(self):
-        config = {
-            "DEVICE_IP": self.DEVICE_IP,
-            "DEVICE_TOKEN": self.DEVICE_TOKEN,
-            "MODEL": self.MODEL
-        }
-        try:
-            with open(CONFIG_FILE, "w") as f:
-                json.dump(config, f, indent=4)
-            print("Settings saved successfully.")
-        except Exception as e:
-            print(f"Error saving settings: {e}")
-
-    def connect_device(self):
-        try:
-            self.device = Yeelight(
-                ip=self.DEVICE_IP,
-                token=self.DEVICE_TOKEN,
-                model=self.MODEL
-            )
-            print("Device connected successfully.")
-        except DeviceException as e:
-            print(f"Connection error: {e}")
-            self.device = None
+        self.engine.start()
+        self.root.after(0, self.report_startup)
+
+    def report_startup(self):
+        elapsed = (time.perf_counter() - STARTED) * 1000
+        note = "" if elapsed <= STARTUP_TARGET_MS else f", over the {STARTUP_TARGET_MS} ms target"
+        print(f"Window ready in {elapsed:.0f} ms{note}")
+
+    @property
+    def registry(self):
+        return self.engine.registry
+
+    @property
+    def state(self):
+        # The widgets show the first bulb of the selected device or group
+        return self.engine.state
+
+    def select_target(self, target):
+        self.engine.select_target(target)
 
     def create_widgets(self):
+        from CTkMenuBar import CTkTitleMenu
+
         # Menu bar with settings and reload buttons
         menu = CTkTitleMenu(master=self.root, x_offset=105, title_bar_color='black')
         menu.add_cascade("⚙", command=self.open_settings, fg_color='black')
-        menu.add_cascade("⟳", command=self.connect_device, fg_color='black')
+        menu.add_cascade("⟳", command=self.engine.connect, fg_color='black')
 
         # Header
         header_frame = ctk.CTkFrame(self.root, fg_color=FRAME_COLOR, corner_radius=10)
@@ -101,6 +84,15 @@ class MiHomeApp:
         )
         self.power_btn.pack(pady=8, padx=30)
 
+        targets = self.registry.targets()
+        if len(targets) > 1:
+            self.target_menu = ctk.CTkOptionMenu(
+                control_frame, values=targets, command=self.select_target,
+                fg_color=ACCENT_COLOR, button_color=ACCENT_COLOR
+            )
+            self.target_menu.set(self.engine.target)
+            self.target_menu.pack(pady=(0, 8), padx=30)
+
         # Main frame for controls
         self.main_frame = ctk.CTkFrame(self.root, fg_color=BG_COLOR, corner_radius=10)
         self.main_frame.pack()
@@ -122,36 +114,32 @@ class MiHomeApp:
         )
         self.brightness_scale.pack(fill="x", padx=10, pady=5)
 
-    def toggle_power(self):
-        if self.device:
-            try:
-                if self.device.status().is_on:
-                    self.device.off()
-                else:
-                    self.device.on()
-                self.update_status()
-            except DeviceException as e:
-                print(f"Error: {e}")
-
-    def update_status(self):
-        if not self.device:
-            self.power_btn.configure(text="ON")
-            self.main_frame.forget()
+    def show_props(self, name, props):
+        members = self.registry.members(self.engine.target)
+        if not members or name != members[0]:
             return
+        if "power" in props:
+            self.show_state()
+        elif "brightness" in props and time.monotonic() - self.dragged_at >= DRAG_HOLD:
+            self.brightness_scale.set(props["brightness"])
 
-        try:
-            status = self.device.status()
-        except DeviceException as e:
-            print(f"Error getting status: {e}")
-            self.device = None
-            self.power_btn.configure(text="ON")
-            self.main_frame.forget()
-            return
+    def toggle_power(self):
+        self.engine.toggle_power()
+
+    def show_disconnected(self):
+        self.power_btn.configure(text="ON")
+        self.main_frame.forget()
 
-        if status.is_on:
+    def show_state(self, outcome=None):
+        state = self.state
+        if not state.known:
+            self.show_disconnected()
+        elif state.power:
             self.root.geometry(SIZE)
             self.power_btn.configure(text="OFF")
-            self.brightness_scale.set(int(status.brightness))
+            # Every throttled slider write is reported back; leave a slider being dragged alone
+            if time.monotonic() - self.dragged_at >= DRAG_HOLD:
+                self.brightness_scale.set(state.brightness)
             self.main_frame.pack()
         else:
             self.root.geometry("300x150")
@@ -159,19 +147,13 @@ class MiHomeApp:
             self.main_frame.forget()
 
     def on_change(self, setter_function, value):
-        if self.timer:
-            self.timer.cancel()
-        self.timer = threading.Timer(0.5, setter_function, args=(value,))
-        self.timer.start()
+        self.dragged_at = time.monotonic()
+        self.slider_channel.push(setter_function, value)
 
     def set_brightness(self, value):
-        if self.device:
-            try:
-                self.device.set_brightness(int(float(value)))
-            except DeviceException as e:
-                print(f"Error: {e}")
+        return self.engine.set_brightness(value)
 
 if __name__ == "__main__":
-    app_window = CTk()
+    app_window = ctk.CTk()
     MiHomeApp(app_window)
     app_window.mainloop()
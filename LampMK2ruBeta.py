@@ -1,18 +1,13 @@
+import time
+
+STARTED = time.perf_counter()  # Cold start is measured from here to the first idle main loop
+
 import customtkinter as ctk
-from customtkinter import *
-from CTkColorPicker import *
-from CTkMenuBar import *
-from miio import Yeelight
-from miio.exceptions import DeviceException
-from PIL import ImageColor
 import threading
 from functools import partial
-import json
-import os
-import speech_recognition as sr
-from speech_recognition.recognizers import google
-from google.cloud import dialogflow_v2 as df
-from google.protobuf.json_format import MessageToDict
+from lamp_engine import LampEngine
+from throttle import CoalescingThrottle
+from voice_engine import VoiceControl
 
 # UI Colors and settings
 BG_COLOR = "#343541"           # Background color for the window
@@ -20,38 +15,9 @@ FRAME_COLOR = "#40414F"        # Color for internal frames
 ACCENT_COLOR = "#10A37F"        # Accent green color
 TEXT_COLOR = "#ECECF1"         # Light font color
 SIZE = "300x350"
-CONFIG_FILE = "config.json"
-
-
-class VoiceProcessor:
-    """
-    Processes voice commands by sending text to Dialogflow.
-    """
-    def __init__(self):
-        self.project_id = "smartbulbproject"  # Replace with your Google Cloud Project ID
-        self.credentials_path = "smartbulbproject-2955748c5ce9.json"  # Path to the service account file
-
-        os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = self.credentials_path
-        self.session_client = df.SessionsClient()
-        self.session_id = "1-session"  # Unique session identifier
-
-    def process_query(self, text):
-        try:
-            session = self.session_client.session_path(self.project_id, self.session_id)
-            text_input = df.TextInput(text=text, language_code="ru-RU")
-            query_input = df.QueryInput(text=text_input)
-            response = self.session_client.detect_intent(request={"session": session, "query_input": query_input})
-            result = MessageToDict(response._pb)
-
-            intent = result["queryResult"]["intent"]["displayName"]
-            parameters = result["queryResult"].get("parameters", {})
-            confidence = result["queryResult"].get("intentDetectionConfidence", 0)
-
-            return {"intent": intent, "parameters": parameters, "confidence": confidence}
-
-        except Exception as e:
-            print(f"Dialogflow error: {str(e)}")
-            return None
+SLIDER_INTERVAL = 0.2          # Minimum seconds between writes of one slider
+DRAG_HOLD = 1.0                # Seconds pushed state is not applied to a slider being dragged
+STARTUP_TARGET_MS = 300        # Budget from launch to an interactive window
 
 
 class MiHomeApp:
@@ -60,7 +26,10 @@ class MiHomeApp:
     """
     def __init__(self, root):
         self.root = root
-        self.load_config()
+        # Device and voice logic lives in the engine; its callbacks come back on the Tk thread
+        self.engine = LampEngine(dispatch=lambda func, *args: self.root.after(0, func, *args))
+        self.engine.state_listeners.append(self.show_state)
+        self.engine.props_listeners.append(self.show_props)
 
         self.root.title("Mi Home")
         self.root.geometry(SIZE)
@@ -70,60 +39,38 @@ class MiHomeApp:
         ctk.set_default_color_theme("green")
         self.root.configure(fg_color=BG_COLOR)
 
-        self.device = None
-        self.connect_device()
+        self.slider_channel = CoalescingThrottle(SLIDER_INTERVAL)
+        self.dragged_at = 0.0
 
-        # Initialize voice control
-        self.voice_enabled = True
-        self.recognizer = sr.Recognizer()
-        self.microphone = sr.Microphone()
-        self.voice_thread = threading.Thread(target=self.voice_loop, daemon=True)
-        self.voice_thread.start()
-        self.voice_processor = VoiceProcessor()
+        # Create UI widgets, then connect and load voice control in the background
+        self.create_widgets()
+        self.engine.start()
+        self.voice = VoiceControl(self.engine, on_command=lambda _: self.root.after(0, self.root.bell))
+        self.voice.start()
+        self.root.after(0, self.report_startup)
 
-        self.setup_advanced_commands()
+    def report_startup(self):
+        elapsed = (time.perf_counter() - STARTED) * 1000
+        note = "" if elapsed <= STARTUP_TARGET_MS else f", over the {STARTUP_TARGET_MS} ms target"
+        print(f"Window ready in {elapsed:.0f} ms{note}")
 
-        self.timer = None
+    @property
+    def registry(self):
+        return self.engine.registry
 
-        # Create UI widgets
-        self.create_widgets()
-        self.update_status()
-
-    def load_config(self):
-        if os.path.exists(CONFIG_FILE):
-            try:
-                with open(CONFIG_FILE, "r", encoding="utf-8") as f:
-                    config = json.load(f)
-                    self.DEVICE_IP = config.get("DEVICE_IP")
-                    self.DEVICE_TOKEN = config.get("DEVICE_TOKEN")
-                    self.MODEL = config.get("MODEL")
-            except json.JSONDecodeError:
-                print("Error reading config.json.")
-        else:
-            print("config.json not found.")
-
-    def save_config(self):
-        config = {
-            "DEVICE_IP": self.DEVICE_IP,
-            "DEVICE_TOKEN": self.DEVICE_TOKEN,
-            "MODEL": self.MODEL
-        }
-        try:
-            with open(CONFIG_FILE, "w", encoding="utf-8") as f:
-                json.dump(config, f, indent=4, ensure_ascii=False)
-            print("Settings saved successfully.")
-        except Exception as e:
-            print(f"Error saving settings: {e}")
-
-    def connect_device(self):
-        try:
-            self.device = Yeelight(ip=self.DEVICE_IP, token=self.DEVICE_TOKEN, model=self.MODEL)
-            print("Device connected successfully.")
-        except DeviceException as e:
-            print(f"Connection error: {e}")
-            self.device = None
+    @property
+    def state(self):
+        """
+        Cached state of the first bulb of the selected device or group, as shown by the widgets.
+        """
+        return self.engine.state
+
+    def select_target(self, target):
+        self.engine.select_target(target)
 
     def create_widgets(self):
+        from CTkMenuBar import CTkTitleMenu
+
         # Menu bar with settings option
         menu = CTkTitleMenu(master=self.root, x_offset=105, title_bar_color='black')
         menu.add_cascade("⚙", command=self.open_settings, fg_color='black')
@@ -157,6 +104,19 @@ class MiHomeApp:
         )
         self.power_btn.pack(pady=8, padx=30)
 
+        # Device or group selector, shown when the config lists more than one bulb
+        targets = self.registry.targets()
+        if len(targets) > 1:
+            self.target_menu = ctk.CTkOptionMenu(
+                control_frame,
+                values=targets,
+                command=self.select_target,
+                fg_color=ACCENT_COLOR,
+                button_color=ACCENT_COLOR
+            )
+            self.target_menu.set(self.engine.target)
+            self.target_menu.pack(pady=(0, 8), padx=30)
+
         # Main frame for controls
         self.main_frame = ctk.CTkFrame(self.root, fg_color=BG_COLOR, corner_radius=10)
         self.main_frame.pack()
@@ -242,7 +202,7 @@ class MiHomeApp:
         """
         settings_window = ctk.CTkToplevel(self.root)
         settings_window.title("Settings")
-        settings_window.geometry("280x310")
+        settings_window.geometry("280x350")
         settings_window.resizable(False, False)
         settings_window.configure(fg_color=FRAME_COLOR)
         settings_window.lift()
@@ -279,7 +239,7 @@ class MiHomeApp:
             corner_radius=5
         )
         self.ip_entry.pack(fill="x", padx=20, pady=5)
-        self.ip_entry.insert(0, self.DEVICE_IP or "")
+        self.ip_entry.insert(0, self.engine.DEVICE_IP or "")
 
         # DEVICE_TOKEN entry
         token_label = ctk.CTkLabel(
@@ -300,7 +260,7 @@ class MiHomeApp:
             corner_radius=5,
         )
         self.token_entry.pack(fill="x", padx=20, pady=5)
-        self.token_entry.insert(0, self.DEVICE_TOKEN or "")
+        self.token_entry.insert(0, self.engine.DEVICE_TOKEN or "")
 
         # MODEL entry
         model_label = ctk.CTkLabel(
@@ -321,7 +281,18 @@ class MiHomeApp:
             corner_radius=5
         )
         self.model_entry.pack(fill="x", padx=20, pady=5)
-        self.model_entry.insert(0, self.MODEL or "")
+        self.model_entry.insert(0, self.engine.MODEL or "")
+
+        # Fills the fields from a bulb found on the LAN
+        self.discover_menu = ctk.CTkOptionMenu(
+            settings_window,
+            values=["Discover"],
+            command=self.pick_discovered,
+            fg_color=ACCENT_COLOR,
+            button_color=ACCENT_COLOR
+        )
+        self.discover_menu.pack(pady=(10, 0))
+        self.discovered = {}
 
         save_button = ctk.CTkButton(
             settings_window,
@@ -333,6 +304,37 @@ class MiHomeApp:
         )
         save_button.pack(pady=10)
 
+    def pick_discovered(self, choice):
+        if choice == "Discover":
+            self.discover_menu.set("Searching...")
+            threading.Thread(target=self.run_discovery, daemon=True).start()
+            return
+        record = self.discovered.get(choice)
+        if not record:
+            return
+        for entry, value in ((self.ip_entry, record["ip"]), (self.model_entry, record.get("model")),
+                             (self.token_entry, record.get("token"))):
+            if value:
+                entry.delete(0, "end")
+                entry.insert(0, value)
+
+    def run_discovery(self):
+        from discovery import DeviceIndex, discover
+
+        found = discover()
+        index = DeviceIndex()
+        for record in found:
+            index.update(record)
+        index.save()
+        self.root.after(0, self.show_discovered, found)
+
+    def show_discovered(self, found):
+        if not self.discover_menu.winfo_exists():
+            return
+        self.discovered = {f"{r['ip']} {r.get('model') or ''}".strip(): r for r in found}
+        self.discover_menu.configure(values=list(self.discovered) + ["Discover"])
+        self.discover_menu.set(f"{len(found)} found" if found else "Nothing found")
+
     def save_settings(self, window):
         new_ip = self.ip_entry.get().strip()
         new_token = self.token_entry.get().strip()
@@ -342,13 +344,7 @@ class MiHomeApp:
             self.show_error("All fields are required.")
             return
 
-        self.DEVICE_IP = new_ip
-        self.DEVICE_TOKEN = new_token
-        self.MODEL = new_model
-
-        self.save_config()
-        self.connect_device()
-        self.update_status()
+        self.engine.update_default_device(new_ip, new_token, new_model)
 
         window.destroy()
 
@@ -379,256 +375,111 @@ class MiHomeApp:
         )
         ok_button.pack(pady=10)
 
-    def update_status(self):
+    def show_disconnected(self):
+        self.power_btn.configure(text="ON")
+        self.main_frame.forget()
+
+    def show_state(self, outcome=None):
         """
-        Updates UI based on device status.
+        Updates UI based on the cached device state; called by the engine after every command.
         """
-        if not self.device:
-            self.power_btn.configure(text="ON")
-            self.main_frame.forget()
-            return
-
-        try:
-            status = self.device.status()
-        except DeviceException as e:
-            print(f"Status error: {e}")
-            self.device = None
-            self.power_btn.configure(text="ON")
-            self.main_frame.forget()
-            return
-
-        if status.is_on:
+        state = self.state
+        # The engine reports every throttled slider write; leave a slider being dragged alone
+        dragging = time.monotonic() - self.dragged_at < DRAG_HOLD
+        if not state.known:
+            self.show_disconnected()
+        elif state.power:
             self.root.geometry(SIZE)
             self.power_btn.configure(text="OFF")
-            self.brightness_scale.set(int(status.brightness))
-            if status.color_temp is not None:
-                self.temp_scale.set(int(status.color_temp))
+            if not dragging:
+                self.brightness_scale.set(state.brightness)
+            if state.color_temp is not None:
+                if not dragging:
+                    self.temp_scale.set(int(state.color_temp))
+                self.color_patt.configure(fg_color='white')
             else:
                 self.temp_scale.set(1700)
-                self.color_patt.configure(fg_color=self.rgb_to_hex(status.rgb))
+                if state.rgb is not None:
+                    self.color_patt.configure(fg_color=self.rgb_to_hex(state.rgb))
             self.main_frame.pack()
         else:
             self.root.geometry("300x150")
             self.power_btn.configure(text="ON")
             self.main_frame.forget()
 
+    def show_props(self, name, props):
+        """
+        Applies a change pushed by the bulb to the widgets it touches.
+        """
+        members = self.registry.members(self.engine.target)
+        if not members or name != members[0]:
+            return
+        if "power" in props:
+            self.show_state()
+            return
+        dragging = time.monotonic() - self.dragged_at < DRAG_HOLD
+        if "brightness" in props and not dragging:
+            self.brightness_scale.set(props["brightness"])
+        if "color_temp" in props:
+            if not dragging:
+                self.temp_scale.set(props["color_temp"])
+            self.color_patt.configure(fg_color='white')
+        if "rgb" in props:
+            self.temp_scale.set(1700)
+            self.color_patt.configure(fg_color=self.rgb_to_hex(props["rgb"]))
+
     def toggle_power(self):
         """
         Toggles the power state of the device.
         """
-        if self.device:
-            try:
-                if self.device.status().is_on:
-                    self.device.off()
-                else:
-                    self.device.on()
-                self.update_status()
-            except DeviceException as e:
-                print(f"Error: {e}")
+        self.engine.toggle_power()
 
     def on_change(self, setter_function, value):
         """
-        Debounce slider value changes before applying them.
+        Throttles slider changes per property, always sending the latest value.
         """
-        if self.timer:
-            self.timer.cancel()
-        self.timer = threading.Timer(0.5, setter_function, args=(value,))
-        self.timer.start()
+        self.dragged_at = time.monotonic()
+        self.slider_channel.push(setter_function, value)
 
     def set_brightness(self, value):
         """
         Sets brightness based on slider value.
         """
-        if self.device:
-            try:
-                self.device.set_brightness(int(float(value)))
-            except DeviceException as e:
-                print(f"Error: {e}")
+        return self.engine.set_brightness(value)
 
     def set_temp(self, value):
         """
         Sets color temperature based on slider value.
         """
-        if self.device:
-            try:
-                self.device.set_color_temp(int(float(value)))
-                self.color_patt.configure(fg_color='white')
-            except DeviceException as e:
-                print(f"Error: {e}")
+        return self.engine.set_color_temp(value, lambda _: self.color_patt.configure(fg_color='white'))
 
     def choose_color(self):
         """
         Opens a color picker to choose a color for the device.
         """
+        from CTkColorPicker import AskColor
+        from PIL import ImageColor
+
         pick_color = AskColor(width=300, font=("Helvetica", 16, "bold"))
         pick_color.button.configure(height=30)
         pick_color.label.pack_forget()
         pick_color.slider.pack_forget()
         pick_color.minsize(200, 200)
         color = pick_color.get()  # Returns a string in the format '#RRGGBB'
-        if color and self.device:
-            try:
-                rgb = ImageColor.getcolor(color, "RGB")
-                self.device.set_rgb(rgb)
-                self.color_patt.configure(fg_color=color)
-                self.temp_scale.set(1700)
-            except DeviceException as e:
-                print(f"Error: {e}")
+        if color:
+            rgb = ImageColor.getcolor(color, "RGB")
+            self.engine.set_rgb(rgb, lambda _: self.show_color(color))
+
+    def show_color(self, color):
+        self.color_patt.configure(fg_color=color)
+        self.temp_scale.set(1700)
 
     @staticmethod
     def rgb_to_hex(rgb):
         return "#{:02x}{:02x}{:02x}".format(*rgb)
 
-    def voice_loop(self):
-        """
-        Runs continuous background speech recognition.
-        """
-        def callback(recognizer, audio):
-            try:
-                text = google.recognize_legacy(recognizer, audio, language="ru-RU")
-                print(f"Recognized text: {text}")
-                if "лампа" in text.lower():  # If "lamp" is mentioned, process the command
-                    self.process_voice_command(text)
-            except sr.UnknownValueError:
-                pass
-            except Exception as e:
-                print(f"Voice callback error: {e}")
-
-        with self.microphone as source:
-            self.recognizer.adjust_for_ambient_noise(source, duration=1)
-        self.stop_listening = self.recognizer.listen_in_background(self.microphone, callback)
-
-    def setup_advanced_commands(self):
-        """
-        Maps intents to advanced command methods.
-        """
-        self.advanced_commands = {
-            'brightness.adjust': self.adjust_brightness,
-            'color.set': self.set_advanced_color,
-            'preset.activate': self.activate_preset,
-            'temperature.set': self.advanced_set_temp,
-        }
-
-    def process_voice_command(self, text):
-        """
-        Processes voice commands via Dialogflow and executes the corresponding function.
-        """
-        try:
-            response = self.voice_processor.process_query(text)
-            if response:
-                intent = response['intent']
-                params = response['parameters']
-                confidence = response['confidence']
-                print(f"Dialogflow Intent: {intent}, Params: {params}, Conf: {confidence}")
-                if intent in self.advanced_commands:
-                    self.advanced_commands[intent](params)
-                    self.root.bell()
-        except Exception as e:
-            print(f"Processing error: {e}")
-
-    def adjust_brightness(self, params):
-        """
-        Adjusts brightness based on the provided parameters.
-        """
-        if not self.device:
-            return
-        try:
-            operation = params.get('operation', 'value')
-            new_value = 0
-            current = self.device.status().brightness
-            if operation == 'выше':
-                new_value = min(current + 10, 100)
-            elif operation == 'ниже':
-                new_value = max(current - 10, 1)
-            else:
-                value = int(params.get('value', 0))
-                if 1 <= value <= 100:
-                    new_value = value
-
-            self.device.set_brightness(new_value)
-            self.update_status()
-            print(f"Brightness set to: {new_value}")
-        except DeviceException as e:
-            print(f"Error: {e}")
-
-    def russian_color_to_codes(self, color_name: str) -> dict | None:
-        """
-        Converts a Russian color name to its HEX and RGB codes.
-        """
-        color_dictionary = {
-            "белый": {"hex": "#FFFFFF", "rgb": (255, 255, 255)},
-            "черный": {"hex": "#000000", "rgb": (0, 0, 0)},
-            "красный": {"hex": "#FF0000", "rgb": (255, 0, 0)},
-            "зеленый": {"hex": "#00FF00", "rgb": (0, 255, 0)},
-            "синий": {"hex": "#0000FF", "rgb": (0, 0, 255)},
-            "желтый": {"hex": "#FFFF00", "rgb": (255, 255, 0)},
-            "голубой": {"hex": "#00FFFF", "rgb": (0, 255, 255)},
-            "фиолетовый": {"hex": "#800080", "rgb": (128, 0, 128)},
-            "розовый": {"hex": "#FFC0CB", "rgb": (255, 192, 203)},
-            "оранжевый": {"hex": "#FFA500", "rgb": (255, 165, 0)},
-            "коричневый": {"hex": "#A52A2A", "rgb": (165, 42, 42)},
-            "серый": {"hex": "#808080", "rgb": (128, 128, 128)},
-        }
-        return color_dictionary.get(color_name.lower().strip())
-
-    def set_advanced_color(self, params):
-        """
-        Sets the device color using a provided color name.
-        """
-        if not self.device:
-            return
-        color = params.get('color')
-        try:
-            code = self.russian_color_to_codes(color)
-            self.device.set_rgb(code['rgb'])
-            self.color_patt.configure(fg_color=code['hex'])
-            print(f"Color set to: {color}, RGB={code['rgb']}")
-        except (ValueError, KeyError):
-            print(f"Unknown color format: {color}")
-        except DeviceException as e:
-            print(f"Error: {e}")
-
-    def activate_preset(self, params):
-        """
-        Activates a preset configuration.
-        """
-        if not self.device:
-            return
-        presets = {
-            'ночь': {'brightness': 30, 'rgb': (255, 0, 0)},
-            'день': {'brightness': 100, 'temp': 6500}
-        }
-        preset_name = params.get('preset')
-        preset = presets.get(preset_name)
-        if preset:
-            try:
-                self.device.set_brightness(preset['brightness'])
-                if 'rgb' in preset:
-                    self.device.set_rgb(preset['rgb'])
-                else:
-                    self.device.set_color_temp(preset['temp'])
-                self.update_status()
-            except DeviceException as e:
-                print(f"Error: {e}")
-        else:
-            print(f"Unknown preset: {preset_name}")
-
-    def advanced_set_temp(self, params):
-        """
-        Sets the color temperature using voice command parameters.
-        """
-        if not self.device:
-            return
-        try:
-            temp = params.get('temp')
-            self.device.set_color_temp(temp)
-            self.color_patt.configure(fg_color='white')
-            print(f"Temperature set to: {temp}K")
-        except DeviceException as e:
-            print(f"Error: {e}")
-
 
 if __name__ == "__main__":
-    app_window = CTk()
+    app_window = ctk.CTk()
     MiHomeApp(app_window)
     app_window.mainloop()
@@ -0,0 +1,283 @@
+import asyncio
+import json
+import sys
+import time
+
+from aiohttp import WSMsgType, web
+
+from command_trace import set_source
+from effects import compile_effect
+from lamp_engine import LampEngine
+from metrics import METRICS
+
+API_HOST = "127.0.0.1"
+API_PORT = 8765
+
+
+class LampApi:
+    """
+    Local HTTP/WebSocket API over a LampEngine.
+
+    Every bulb keeps its one device session on its executor thread, so clients never
+    trigger a miio handshake. Concurrent writes of one property to the same bulb are
+    merged by the executor: only the latest value is sent and every waiting request
+    gets its result. /ws pushes {"device", "state"} whenever a cached state changes.
+    """
+    def __init__(self, engine, loop):
+        self.engine = engine
+        self.loop = loop
+        self.sockets = set()
+        self._last = {}  # Last pushed snapshot per bulb, so unchanged states are not resent
+        set_source("api")  # Requests are handled on this loop thread
+        engine.dispatch = lambda func, *args: loop.call_soon_threadsafe(func, *args)
+        engine.state_listeners.append(self.on_outcome)
+        engine.props_listeners.append(lambda name, props: self.push(name))
+
+    def routes(self):
+        return [
+            web.get("/api/devices", self.devices),
+            web.get("/api/{target}", self.get_state),
+            web.get("/api/{target}/history", self.history),
+            web.post("/api/{target}/power", self.power),
+            web.post("/api/{target}/brightness", self.brightness),
+            web.post("/api/{target}/temp", self.temp),
+            web.post("/api/{target}/rgb", self.rgb),
+            web.post("/api/{target}/scene", self.scene),
+            web.post("/api/{target}/effect", self.effect),
+            web.get("/ws", self.websocket),
+            web.get("/metrics", self.metrics),
+        ]
+
+    def snapshot(self, name):
+        state = self.engine.fleet.states[name]
+        return state.snapshot() if state.known else None
+
+    def target_state(self, target):
+        return {name: self.snapshot(name) for name in self.engine.registry.members(target)}
+
+    # Responses
+
+    def target_of(self, request):
+        target = request.match_info["target"]
+        if target not in self.engine.registry.targets():
+            raise web.HTTPNotFound(text=f"Unknown device or group: {target}")
+        return target
+
+    async def body(self, request, optional=False):
+        """
+        The JSON object of a request; an empty body reads as {} where optional.
+        """
+        if optional and not (await request.read()).strip():
+            return {}
+        try:
+            body = await request.json()
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            raise web.HTTPBadRequest(text="Expected a JSON body")
+        if not isinstance(body, dict):
+            raise web.HTTPBadRequest(text="Expected a JSON object")
+        return body
+
+    async def respond(self, target, future):
+        if future is None:
+            raise web.HTTPBadRequest(text="Invalid command")
+        outcome = await asyncio.wrap_future(future)
+        errors = {name: str(e) for name, e in outcome.errors.items()}
+        return web.json_response(
+            {"state": self.target_state(target), "errors": errors},
+            status=502 if errors and not outcome.results else 200,
+        )
+
+    # Endpoints
+
+    async def devices(self, request):
+        registry = self.engine.registry
+        return web.json_response({
+            "devices": {name: self.snapshot(name) for name in registry.devices},
+            "groups": {name: registry.members(name) for name in registry.groups},
+        })
+
+    async def get_state(self, request):
+        target = self.target_of(request)
+        if request.query.get("refresh"):
+            # Concurrent refreshes of one bulb share a single status call
+            return await self.respond(target, self.engine.update_status(target=target))
+        return web.json_response({"state": self.target_state(target)})
+
+    async def history(self, request):
+        target = self.target_of(request)
+        if self.engine.history is None:
+            raise web.HTTPNotFound(text="History is off; set \"HISTORY_DB\" in config.json")
+        try:
+            hours = float(request.query.get("hours", 24))
+        except ValueError:
+            raise web.HTTPBadRequest(text="Expected hours as a number")
+        start = time.time() - hours * 3600
+        usage = {
+            name: await asyncio.to_thread(self.engine.history.usage, name, start)
+            for name in self.engine.registry.members(target)
+        }
+        return web.json_response({"hours": hours, "usage": usage})
+
+    async def power(self, request):
+        target = self.target_of(request)
+        on = (await self.body(request, optional=True)).get("on")
+        if on is None:
+            return await self.respond(target, self.engine.toggle_power(target))
+        if not isinstance(on, bool):
+            raise web.HTTPBadRequest(text="Expected on as true or false")
+        return await self.respond(target, self.engine.set_power(on, target))
+
+    async def brightness(self, request):
+        target = self.target_of(request)
+        value = self.brightness_of((await self.body(request)).get("value"))
+        return await self.respond(target, self.engine.set_brightness(value, target=target))
+
+    async def temp(self, request):
+        target = self.target_of(request)
+        value = self.color_temp_of((await self.body(request)).get("value"))
+        return await self.respond(target, self.engine.set_color_temp(value, target=target))
+
+    async def rgb(self, request):
+        target = self.target_of(request)
+        rgb = self.rgb_of(await self.body(request))
+        return await self.respond(target, self.engine.set_rgb(rgb, target=target))
+
+    async def scene(self, request):
+        target = self.target_of(request)
+        body = await self.body(request)
+        if "preset" in body:
+            scene = self.engine.presets.get(str(body["preset"]).lower())
+            if scene is None:
+                raise web.HTTPNotFound(text=f"Unknown preset: {body['preset']}")
+        else:
+            if "brightness" not in body:
+                raise web.HTTPBadRequest(text="Expected a preset name or a brightness")
+            scene = {"brightness": self.brightness_of(body["brightness"])}
+            if "rgb" in body or "hex" in body:
+                scene["rgb"] = self.rgb_of(body)
+            elif "color_temp" in body:
+                scene["color_temp"] = self.color_temp_of(body["color_temp"])
+        return await self.respond(target, self.engine.apply_scene(target, **scene))
+
+    async def effect(self, request):
+        target = self.target_of(request)
+        body = await self.body(request)
+        name = body.get("name")
+        if name == "stop":
+            return await self.respond(target, self.engine.stop_effect(target))
+        params = body.get("params", {})
+        if not isinstance(params, dict):
+            raise web.HTTPBadRequest(text="Expected params as an object")
+        try:
+            native = compile_effect(name, **params).native
+        except KeyError:
+            raise web.HTTPNotFound(text=f"Unknown effect: {name}")
+        except (TypeError, ValueError) as e:
+            raise web.HTTPBadRequest(text=f"Invalid effect parameters: {e}")
+        future = self.engine.play_effect(name, target, **params)
+        if native:
+            return await self.respond(target, future)
+        # Client-side effects play until they end; answer once they are started
+        return web.json_response({"state": self.target_state(target), "errors": {}}, status=202)
+
+    # Validation, shared by the endpoints; invalid values answer 400
+
+    @staticmethod
+    def number(value, low, high):
+        try:
+            if isinstance(value, bool):
+                raise TypeError(value)
+            value = int(float(value))
+        except (TypeError, ValueError, OverflowError):
+            raise web.HTTPBadRequest(text=f"Expected a number from {low} to {high}")
+        if not low <= value <= high:
+            raise web.HTTPBadRequest(text=f"Expected a number from {low} to {high}")
+        return value
+
+    def brightness_of(self, value):
+        return self.number(value, 1, 100)
+
+    def color_temp_of(self, value):
+        return self.number(value, 1700, 6500)
+
+    def rgb_of(self, body):
+        """
+        (r, g, b) from body["rgb"] as [r, g, b] or body["hex"] as "#rrggbb".
+        """
+        rgb = body.get("rgb")
+        if isinstance(body.get("hex"), str):
+            try:
+                rgb = list(bytes.fromhex(body["hex"].lstrip("#")))
+            except ValueError:
+                rgb = None
+        if not isinstance(rgb, (list, tuple)) or len(rgb) != 3:
+            raise web.HTTPBadRequest(text="Expected rgb [r, g, b] or hex \"#rrggbb\"")
+        return tuple(self.number(value, 0, 255) for value in rgb)
+
+    async def metrics(self, request):
+        return web.Response(text=METRICS.prometheus(), content_type="text/plain")
+
+    # State push
+
+    async def websocket(self, request):
+        ws = web.WebSocketResponse(heartbeat=30)
+        await ws.prepare(request)
+        self.sockets.add(ws)
+        try:
+            for name in self.engine.registry.devices:
+                await ws.send_json({"device": name, "state": self.snapshot(name)})
+            async for message in ws:
+                if message.type == WSMsgType.ERROR:
+                    break
+        finally:
+            self.sockets.discard(ws)
+        return ws
+
+    def on_outcome(self, outcome):
+        for name in list(outcome.results) + list(outcome.errors):
+            self.push(name)
+
+    def push(self, name):
+        snapshot = self.snapshot(name)
+        if self._last.get(name) == snapshot:
+            return
+        self._last[name] = snapshot
+        message = {"device": name, "state": snapshot}
+        for ws in list(self.sockets):
+            self.loop.create_task(self._send(ws, message))
+
+    async def _send(self, ws, message):
+        try:
+            await ws.send_json(message)
+        except ConnectionError:
+            self.sockets.discard(ws)
+
+
+async def serve(engine, host=None, port=None):
+    """
+    Starts the engine and the API server; runs until cancelled.
+    """
+    host = host or engine.config.get("API_HOST", API_HOST)
+    port = int(port or engine.config.get("API_PORT", API_PORT))
+    api = LampApi(engine, asyncio.get_running_loop())
+    app = web.Application()
+    app.add_routes(api.routes())
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    engine.start()
+    print(f"Lamp API listening on http://{host}:{port}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        engine.stop()
+        await runner.cleanup()
+
+
+if __name__ == "__main__":
+    # Usage: python api_server.py [host] [port]
+    args = sys.argv[1:]
+    try:
+        asyncio.run(serve(LampEngine(), *args[:2]))
+    except KeyboardInterrupt:
+        pass
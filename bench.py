@@ -0,0 +1,197 @@
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+from device_executor import CommandQuota
+from lamp_engine import LampEngine
+from miio_emulator import MiioEmulator
+from throttle import CoalescingThrottle
+
+TOKEN = "00112233445566778899aabbccddeeff"
+MODEL = "yeelink.light.color2"
+REGRESSION_TOLERANCE = 0.2  # Allowed p99 growth over the baseline
+DRAG_RATE = 60  # Slider events per second during a simulated drag
+UNLIMITED = 10 ** 9
+
+
+def percentile(samples, p):
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+
+def summarize(name, samples, elapsed, commands):
+    """
+    Latencies in ms, operations per second and the number of commands the bulbs received.
+    """
+    return {
+        "scenario": name,
+        "ops": len(samples),
+        "p50_ms": round(percentile(samples, 50) * 1000, 2),
+        "p99_ms": round(percentile(samples, 99) * 1000, 2),
+        "ops_per_s": round(len(samples) / elapsed, 1) if elapsed else 0.0,
+        "commands": commands,
+    }
+
+
+class Bench:
+    """
+    Drives LampEngine against emulated bulbs on 127.0.0.2, 127.0.0.3, ... (grouped as "all").
+
+    names and groups replace the generated bulb names, e.g. to mirror a real config.
+    """
+    def __init__(self, bulbs=1, latency=0.0, loss=0.0, rate_limit=None, quota=False, names=None, groups=None):
+        names = list(names or [f"bulb{i}" for i in range(bulbs)])
+        self.emulators = [
+            MiioEmulator(TOKEN, did=0x1000 + i, host=f"127.0.0.{i + 2}", latency=latency, loss=loss,
+                         rate_limit=rate_limit).start()
+            for i in range(len(names))
+        ]
+        config = {
+            "DEVICES": {
+                name: {"DEVICE_IP": e.address[0], "DEVICE_TOKEN": TOKEN, "MODEL": MODEL}
+                for name, e in zip(names, self.emulators)
+            },
+            "GROUPS": dict(groups) if groups is not None else {"all": names},
+            "DISCOVERY": False,
+        }
+        self._dir = tempfile.TemporaryDirectory()
+        path = os.path.join(self._dir.name, "config.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(config, f)
+        self.engine = LampEngine(config_file=path)
+        if not quota:
+            # Measure the code path, not the bulb's 60 commands per minute
+            for executor in self.engine.fleet.executors.values():
+                executor.quota = CommandQuota(limit=UNLIMITED)
+        self.engine.connect().result()
+        for name in names:
+            self.engine.update_status(target=name).result()
+        self.engine.target = names[0]
+
+    def close(self):
+        self.engine.stop()
+        for executor in self.engine.fleet.executors.values():
+            executor.shutdown()
+        for emulator in self.emulators:
+            emulator.stop()
+        self._dir.cleanup()
+
+    def command_count(self):
+        return sum(sum(e.commands.values()) for e in self.emulators)
+
+    def measure(self, name, operations):
+        """
+        Runs each operation (returning a future) to completion, timing them one by one.
+        """
+        before = self.command_count()
+        samples = []
+        start = time.perf_counter()
+        for operation in operations:
+            began = time.perf_counter()
+            operation().result()
+            samples.append(time.perf_counter() - began)
+        elapsed = time.perf_counter() - start
+        return summarize(name, samples, elapsed, self.command_count() - before)
+
+    def toggle_power(self, count):
+        return self.measure("toggle_power", [self.engine.toggle_power] * count)
+
+    def preset(self, count):
+        names = list(self.engine.presets) or ["ночь"]
+        return self.measure("preset", [
+            lambda name=names[i % len(names)]: self.engine.activate_preset({"preset": name})
+            for i in range(count)
+        ])
+
+    def fan_out(self, count):
+        return self.measure("fan_out", [
+            lambda value=10 + i % 90: self.engine.set_brightness(value, target="all")
+            for i in range(count)
+        ])
+
+    def slider_drag(self, drags):
+        """
+        One-second drags at DRAG_RATE events per second through the app's slider throttle.
+
+        Latency is measured from the last event to the bulb holding the final value.
+        """
+        before = self.command_count()
+        throttle = CoalescingThrottle()
+        settle = []
+        start = time.perf_counter()
+        for drag in range(drags):
+            values = [1 + (i * 7 + drag * 13) % 100 for i in range(DRAG_RATE)]
+            for i, value in enumerate(values):
+                if i:
+                    time.sleep(1 / DRAG_RATE)
+                throttle.push(self.engine.set_brightness, value)
+            # Right after the last event; a pause here would hide the trailing write's latency
+            released = time.perf_counter()
+            final = str(values[-1])
+            while self.emulators[0].props["bright"] != final:
+                if time.perf_counter() - released > 5:
+                    raise RuntimeError("slider value never reached the bulb")
+                time.sleep(0.001)
+            settle.append(time.perf_counter() - released)
+        elapsed = time.perf_counter() - start
+        return summarize("slider_drag", settle, elapsed, self.command_count() - before)
+
+
+def compare(results, baseline):
+    """
+    Returns the scenarios whose p99 grew by more than REGRESSION_TOLERANCE.
+    """
+    previous = {r["scenario"]: r for r in baseline}
+    regressions = []
+    for result in results:
+        old = previous.get(result["scenario"])
+        if old and old["p99_ms"] and result["p99_ms"] > old["p99_ms"] * (1 + REGRESSION_TOLERANCE):
+            regressions.append(f"{result['scenario']}: p99 {old['p99_ms']} -> {result['p99_ms']} ms")
+    return regressions
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Latency benchmarks against emulated miio bulbs")
+    parser.add_argument("--ops", type=int, default=200, help="operations per scenario")
+    parser.add_argument("--bulbs", type=int, default=4, help="bulbs in the fan-out group")
+    parser.add_argument("--latency", type=float, default=0.0, help="emulated reply delay in seconds")
+    parser.add_argument("--loss", type=float, default=0.0, help="fraction of packets dropped")
+    parser.add_argument("--rate-limit", type=int, help="emulated commands per minute per client")
+    parser.add_argument("--quota", action="store_true", help="keep the app's own 60/min command quota")
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--baseline", help="fail when p99 regresses against this results file")
+    args = parser.parse_args(argv)
+
+    bench = Bench(args.bulbs, args.latency, args.loss, args.rate_limit, args.quota)
+    try:
+        results = [
+            bench.toggle_power(args.ops),
+            bench.slider_drag(max(3, args.ops // 50)),
+            bench.preset(args.ops),
+            bench.fan_out(args.ops),
+        ]
+    finally:
+        bench.close()
+
+    for r in results:
+        print(f"{r['scenario']:<14} {r['ops']:>5} ops  p50 {r['p50_ms']:>8.2f} ms  p99 {r['p99_ms']:>8.2f} ms  "
+              f"{r['ops_per_s']:>8.1f} ops/s  {r['commands']} commands")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=4)
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            regressions = compare(results, json.load(f))
+        for line in regressions:
+            print(f"Regression: {line}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
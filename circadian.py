@@ -0,0 +1,156 @@
+import bisect
+import time
+
+from device_executor import BACKGROUND, CommandDropped, DeviceNotConnected
+from scenes import scene_job
+from scheduler import parse_time_of_day
+
+DAY = 24 * 3600
+PLAN_STEP = 60.0  # Seconds between evaluated points of the curve
+PLAN_HORIZON = 3600.0  # Seconds of updates scheduled ahead at once
+MIRED_THRESHOLD = 10  # Smallest color temperature change worth a command, in mired (1e6 / K)
+BRIGHTNESS_THRESHOLD = 5  # Smallest brightness change worth a command, in percent
+
+# Used when config.json sets "CIRCADIAN": true
+DEFAULT_CURVE = [
+    {"at": "06:30", "temp": 2700, "brightness": 40},
+    {"at": "09:00", "temp": 5000, "brightness": 100},
+    {"at": "17:00", "temp": 4500, "brightness": 90},
+    {"at": "21:00", "temp": 2700, "brightness": 50},
+    {"at": "23:00", "temp": 1900, "brightness": 20},
+]
+
+
+def mired(kelvin):
+    return 1e6 / kelvin
+
+
+def perceptible(state, color_temp, brightness):
+    """
+    Returns the part of (color_temp, brightness) that differs visibly from the cached state.
+    """
+    wanted = {}
+    if state.color_temp is None or abs(mired(state.color_temp) - mired(color_temp)) >= MIRED_THRESHOLD:
+        wanted["color_temp"] = color_temp
+    if state.brightness is None or abs(state.brightness - brightness) >= BRIGHTNESS_THRESHOLD:
+        wanted["brightness"] = brightness
+    return wanted
+
+
+class CircadianCurve:
+    """
+    Color temperature and brightness over the day, interpolated between points.
+
+    Temperature is interpolated in mired, where equal steps look equally large, and
+    the last point of the day blends into the first one of the next.
+    """
+    def __init__(self, points):
+        if not points:
+            raise ValueError("A circadian curve needs at least one point")
+        self.points = sorted(
+            (parse_time_of_day(point["at"]), mired(int(point["temp"])), int(point["brightness"]))
+            for point in points
+        )
+        self._times = [p[0] for p in self.points]
+
+    @classmethod
+    def from_config(cls, config):
+        """
+        Curve from config["CIRCADIAN"] (true for DEFAULT_CURVE), or None when not configured.
+        """
+        section = config.get("CIRCADIAN")
+        if not section:
+            return None
+        points = section.get("curve", DEFAULT_CURVE) if isinstance(section, dict) else DEFAULT_CURVE
+        return cls(points)
+
+    def at(self, seconds_of_day):
+        """
+        (color_temp in K, brightness) at a time of day.
+        """
+        index = bisect.bisect_right(self._times, seconds_of_day)
+        before = self.points[index - 1]  # index 0 wraps to the last point of the previous day
+        after = self.points[index % len(self.points)]
+        span = (after[0] - before[0]) % DAY or DAY
+        t = ((seconds_of_day - before[0]) % DAY) / span
+        temp_mired = before[1] + (after[1] - before[1]) * t
+        brightness = before[2] + (after[2] - before[2]) * t
+        return int(round(1e6 / temp_mired)), int(round(brightness))
+
+    def plan(self, start, horizon=PLAN_HORIZON, step=PLAN_STEP):
+        """
+        Precomputes [(timestamp, color_temp, brightness)] from start to start + horizon.
+
+        A point is kept only when it differs perceptibly from the previous kept one, so a
+        slow evening fade costs a few dozen commands a day instead of one a minute.
+        """
+        steps = []
+        last = None
+        when = start
+        while when < start + horizon:
+            local = time.localtime(when)
+            temp, brightness = self.at(local.tm_hour * 3600 + local.tm_min * 60 + local.tm_sec)
+            if (last is None or abs(mired(last[1]) - mired(temp)) >= MIRED_THRESHOLD
+                    or abs(last[2] - brightness) >= BRIGHTNESS_THRESHOLD):
+                last = (when, temp, brightness)
+                steps.append(last)
+            when += step
+        return steps
+
+
+def circadian_job(state, color_temp, brightness):
+    """
+    Returns an executor job following the curve on a bulb that is on and in white mode.
+
+    Bulbs that are off stay off, a color the user picked is left alone, and changes
+    below the perceptual thresholds are not sent.
+    """
+    def job(device):
+        if device is None:
+            raise DeviceNotConnected("Device is not connected")
+        if not state.known:
+            state.update_from_status(device.status())
+        if not state.power or state.rgb is not None:
+            return state
+        wanted = perceptible(state, color_temp, brightness)
+        if not wanted:
+            return state
+        return scene_job(state, **wanted)(device)
+    return job
+
+
+class Circadian:
+    """
+    Drives the curve on a target through the scheduler, one horizon of updates at a time.
+    """
+    def __init__(self, engine, scheduler, curve, target=None):
+        self.engine = engine
+        self.scheduler = scheduler
+        self.curve = curve
+        self.target = target
+        self._timers = []
+
+    def start(self):
+        self.replan()
+
+    def stop(self):
+        for timer in self._timers:
+            timer.cancel()
+        self._timers = []
+
+    def replan(self):
+        now = time.time()
+        steps = self.curve.plan(now)
+        self._timers = [self.scheduler.at(when, self.apply, temp, brightness) for when, temp, brightness in steps]
+        self._timers.append(self.scheduler.at(now + PLAN_HORIZON, self.replan))
+
+    def apply(self, color_temp, brightness):
+        return self.engine.send(
+            lambda state: circadian_job(state, color_temp, brightness), on_error=self.on_error,
+            priority=BACKGROUND, key="circadian", target=self.target,
+        )
+
+    def on_error(self, name, e):
+        # Skipped when the quota runs low or the bulb is away; the next step catches up
+        if not isinstance(e, (CommandDropped, DeviceNotConnected)):
+            print(f"Circadian error [{name}]: {e}")
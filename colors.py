@@ -0,0 +1,288 @@
+import difflib
+import functools
+
+from intent_parser import normalize
+
+# Canonical names, Russian in the nominative masculine form; values are sRGB
+COLORS = {
+    # The original twelve keep their values
+    "белый": (255, 255, 255),
+    "черный": (0, 0, 0),
+    "красный": (255, 0, 0),
+    "зеленый": (0, 255, 0),
+    "синий": (0, 0, 255),
+    "желтый": (255, 255, 0),
+    "голубой": (0, 255, 255),
+    "фиолетовый": (128, 0, 128),
+    "розовый": (255, 192, 203),
+    "оранжевый": (255, 165, 0),
+    "коричневый": (165, 42, 42),
+    "серый": (128, 128, 128),
+    "алый": (255, 36, 0),
+    "багровый": (153, 0, 0),
+    "бордовый": (128, 0, 32),
+    "вишневый": (145, 30, 66),
+    "малиновый": (220, 20, 60),
+    "рубиновый": (224, 17, 95),
+    "гранатовый": (160, 20, 40),
+    "томатный": (255, 99, 71),
+    "коралловый": (255, 127, 80),
+    "лососевый": (250, 128, 114),
+    "персиковый": (255, 203, 164),
+    "абрикосовый": (251, 206, 177),
+    "морковный": (237, 145, 33),
+    "терракотовый": (204, 78, 92),
+    "медный": (184, 115, 51),
+    "бронзовый": (205, 127, 50),
+    "янтарный": (255, 191, 0),
+    "золотой": (255, 215, 0),
+    "золотистый": (255, 200, 60),
+    "горчичный": (255, 219, 88),
+    "лимонный": (253, 233, 16),
+    "песочный": (244, 164, 96),
+    "бежевый": (245, 245, 220),
+    "кремовый": (255, 253, 208),
+    "молочный": (254, 252, 240),
+    "жемчужный": (234, 224, 200),
+    "шоколадный": (123, 63, 0),
+    "кофейный": (111, 78, 55),
+    "каштановый": (205, 92, 92),
+    "салатовый": (153, 255, 153),
+    "фисташковый": (190, 245, 116),
+    "оливковый": (128, 128, 0),
+    "травяной": (93, 161, 48),
+    "хвойный": (34, 95, 50),
+    "болотный": (172, 183, 142),
+    "изумрудный": (80, 200, 120),
+    "мятный": (62, 180, 137),
+    "бирюзовый": (48, 213, 200),
+    "аквамариновый": (127, 255, 212),
+    "лазурный": (0, 127, 255),
+    "небесный": (135, 206, 235),
+    "васильковый": (100, 149, 237),
+    "сапфировый": (15, 82, 186),
+    "ультрамариновый": (18, 10, 143),
+    "индиговый": (75, 0, 130),
+    "морской": (0, 105, 148),
+    "лиловый": (200, 162, 200),
+    "сиреневый": (200, 162, 200),
+    "лавандовый": (230, 230, 250),
+    "пурпурный": (128, 0, 128),
+    "сливовый": (142, 69, 133),
+    "баклажанный": (97, 64, 81),
+    "пепельный": (178, 190, 181),
+    "серебряный": (192, 192, 192),
+    "серебристый": (192, 192, 192),
+    "графитовый": (56, 56, 56),
+    # Indeclinable nouns
+    "фуксия": (255, 0, 255),
+    "маджента": (255, 0, 255),
+    "индиго": (75, 0, 130),
+    "хаки": (195, 176, 145),
+    "циан": (0, 255, 255),
+    "лайм": (191, 255, 0),
+    "аква": (0, 255, 255),
+    "беж": (245, 245, 220),
+    # English
+    "white": (255, 255, 255),
+    "black": (0, 0, 0),
+    "red": (255, 0, 0),
+    "green": (0, 255, 0),
+    "blue": (0, 0, 255),
+    "yellow": (255, 255, 0),
+    "cyan": (0, 255, 255),
+    "magenta": (255, 0, 255),
+    "purple": (128, 0, 128),
+    "violet": (238, 130, 238),
+    "pink": (255, 192, 203),
+    "orange": (255, 165, 0),
+    "brown": (165, 42, 42),
+    "gray": (128, 128, 128),
+    "grey": (128, 128, 128),
+    "crimson": (220, 20, 60),
+    "scarlet": (255, 36, 0),
+    "maroon": (128, 0, 0),
+    "coral": (255, 127, 80),
+    "salmon": (250, 128, 114),
+    "peach": (255, 203, 164),
+    "amber": (255, 191, 0),
+    "gold": (255, 215, 0),
+    "lemon": (253, 233, 16),
+    "beige": (245, 245, 220),
+    "cream": (255, 253, 208),
+    "ivory": (255, 255, 240),
+    "chocolate": (123, 63, 0),
+    "lime": (191, 255, 0),
+    "olive": (128, 128, 0),
+    "mint": (62, 180, 137),
+    "emerald": (80, 200, 120),
+    "turquoise": (48, 213, 200),
+    "teal": (0, 128, 128),
+    "aqua": (0, 255, 255),
+    "aquamarine": (127, 255, 212),
+    "azure": (0, 127, 255),
+    "sky": (135, 206, 235),
+    "navy": (0, 0, 128),
+    "indigo": (75, 0, 130),
+    "lavender": (230, 230, 250),
+    "lilac": (200, 162, 200),
+    "plum": (142, 69, 133),
+    "fuchsia": (255, 0, 255),
+    "khaki": (195, 176, 145),
+    "silver": (192, 192, 192),
+}
+
+# Compound prefixes and words: (color mixed in, its share, saturation boost)
+MODIFIERS = {
+    "светло": ((255, 255, 255), 0.4, 0.0),
+    "темно": ((0, 0, 0), 0.4, 0.0),
+    "бледно": ((255, 255, 255), 0.6, -0.3),
+    "ярко": (None, 0.0, 0.4),
+    "глубоко": ((0, 0, 0), 0.25, 0.3),
+    "light": ((255, 255, 255), 0.4, 0.0),
+    "dark": ((0, 0, 0), 0.4, 0.0),
+    "pale": ((255, 255, 255), 0.6, -0.3),
+    "bright": (None, 0.0, 0.4),
+    "deep": ((0, 0, 0), 0.25, 0.3),
+}
+
+# Adjective endings, longest first, stripped to reach the stem
+_ENDINGS = tuple(sorted((
+    "ыми", "ими", "ого", "его", "ому", "ему", "ая", "яя", "ое", "ее", "ую", "юю",
+    "ый", "ий", "ой", "ым", "им", "ом", "ем", "ых", "их", "ые", "ие",
+), key=len, reverse=True))
+_NOUN_ENDINGS = ("у", "ю", "ы", "и", "е", "ой", "ей")  # Case endings replacing -а/-я: фуксию, маджентой
+_APPROXIMATE = ("оват", "еват")  # красноватый, синеватый
+FUZZY_CUTOFF = 0.8  # difflib ratio needed to accept a misheard stem
+
+
+def stem(word):
+    for ending in _ENDINGS:
+        if word.endswith(ending) and len(word) - len(ending) >= 2:
+            return word[:-len(ending)]
+    return word
+
+
+# sRGB -> CIE L*a*b* (D65), the space nearest() measures distances in
+
+def _to_linear(c):
+    c /= 255
+    return c / 12.92 if c <= 0.04045 else ((c + 0.055) / 1.055) ** 2.4
+
+
+def _f(t):
+    return t ** (1 / 3) if t > 216 / 24389 else (24389 / 27 * t + 16) / 116
+
+
+_WHITE = (0.95047, 1.0, 1.08883)
+
+
+def rgb_to_lab(rgb):
+    r, g, b = (_to_linear(c) for c in rgb)
+    x = (0.4124 * r + 0.3576 * g + 0.1805 * b) / _WHITE[0]
+    y = (0.2126 * r + 0.7152 * g + 0.0722 * b) / _WHITE[1]
+    z = (0.0193 * r + 0.1192 * g + 0.9505 * b) / _WHITE[2]
+    fx, fy, fz = _f(x), _f(y), _f(z)
+    return 116 * fy - 16, 500 * (fx - fy), 200 * (fy - fz)
+
+
+def modify(rgb, modifier):
+    """
+    Lightens or darkens by mixing with white or black, then moves away from (or towards) gray.
+    """
+    mix, share, saturation = MODIFIERS[modifier]
+    if mix is not None:
+        rgb = [c + (m - c) * share for c, m in zip(rgb, mix)]
+    gray = sum(rgb) / 3
+    return tuple(int(round(max(0, min(255, c + (c - gray) * saturation)))) for c in rgb)
+
+
+# Built once at import: every inflected form -> canonical name, and L*a*b* values for nearest()
+_FORMS = {}
+for _name in COLORS:
+    _FORMS.setdefault(_name, _name)
+for _name in COLORS:
+    _stem = stem(_name)
+    if _stem != _name:
+        for _ending in _ENDINGS:
+            _FORMS.setdefault(_stem + _ending, _name)
+    elif _name[-1] in "ая":
+        for _ending in _NOUN_ENDINGS:
+            _FORMS.setdefault(_name[:-1] + _ending, _name)
+_STEMS = {stem(name): name for name in reversed(COLORS)}  # First name wins on a shared stem
+_STEM_LIST = list(_STEMS)
+_LAB = [(name, rgb_to_lab(rgb)) for name, rgb in COLORS.items()]
+
+
+def nearest(rgb):
+    """
+    Name of the vocabulary color closest to rgb in L*a*b* (CIE76 distance).
+    """
+    lightness, a, b = rgb_to_lab(rgb)
+    best, best_distance = None, float("inf")
+    for name, (l2, a2, b2) in _LAB:
+        distance = (lightness - l2) ** 2 + (a - a2) ** 2 + (b - b2) ** 2
+        if distance < best_distance:
+            best, best_distance = name, distance
+    return best
+
+
+def _base(word):
+    """
+    Canonical name for one word, or None; tries the form table, "-оват-" and near misses.
+    """
+    name = _FORMS.get(word)
+    if name is not None:
+        return name
+    word_stem = stem(word)
+    for suffix in _APPROXIMATE:
+        if word_stem.endswith(suffix) and word_stem[:-len(suffix)] in _STEMS:
+            return _STEMS[word_stem[:-len(suffix)]]
+    close = difflib.get_close_matches(word_stem, _STEM_LIST, n=1, cutoff=FUZZY_CUTOFF)
+    return _STEMS[close[0]] if close else None
+
+
+def lookup_color(text):
+    """
+    Color for a spoken name in any case form, e.g. "красную", "тёмно-зелёный", "light blue".
+
+    Returns {"name", "hex", "rgb"} or None. Modified colors are named after their nearest
+    vocabulary color. Each call returns a new dict, so callers may change it.
+    """
+    found = _lookup(text)
+    if found is None:
+        return None
+    name, rgb = found
+    return {"name": name, "hex": "#{:02X}{:02X}{:02X}".format(*rgb), "rgb": rgb}
+
+
+@functools.lru_cache(maxsize=1024)
+def _lookup(text):
+    """
+    Cached (name, rgb) behind lookup_color; immutable, as every caller shares it.
+    """
+    words = normalize(text or "").replace("-", " ").split()
+    if not words:
+        return None
+    modifiers = []
+    for word in words[:-1]:
+        if word not in MODIFIERS:
+            return None
+        modifiers.append(word)
+    word = words[-1]
+    if not modifiers and word not in _FORMS:
+        # Written together: "темнозеленый", "lightblue"
+        for modifier in MODIFIERS:
+            if word.startswith(modifier) and _base(word[len(modifier):]) is not None:
+                modifiers.append(modifier)
+                word = word[len(modifier):]
+                break
+    name = _base(word)
+    if name is None:
+        return None
+    rgb = COLORS[name]
+    for modifier in modifiers:
+        rgb = modify(rgb, modifier)
+    if modifiers:
+        name = nearest(rgb)
+    return name, tuple(rgb)
@@ -0,0 +1,147 @@
+import functools
+import inspect
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+_local = threading.local()  # Per thread: command source and call depth
+
+
+def set_source(name):
+    """
+    Tags commands issued from the calling thread, e.g. "voice" on the voice execution thread.
+    """
+    _local.source = name
+
+
+@contextmanager
+def source(name):
+    previous = getattr(_local, "source", None)
+    _local.source = name
+    try:
+        yield
+    finally:
+        _local.source = previous
+
+
+def _plain(value):
+    if isinstance(value, (list, tuple)):
+        return [_plain(item) for item in value]
+    if isinstance(value, dict):
+        return {str(k): _plain(v) for k, v in value.items()}
+    return value
+
+
+class TraceRecorder:
+    """
+    Appends one compact JSON line per engine command to a trace file.
+
+    A line holds the offset in seconds from the start of recording ("t"), the source
+    ("src"), the engine method ("cmd") with its arguments ("kw"), the resolved target,
+    the latency until the bulbs answered ("ms") and the failed bulbs ("err").
+    """
+    def __init__(self, path, default_source="gui"):
+        self.path = path
+        self.default_source = default_source
+        self._started = time.monotonic()
+        self._lock = threading.Lock()
+        self._file = open(path, "a", encoding="utf-8")
+        self._write({"start": time.time()})
+
+    def _write(self, record):
+        line = json.dumps(record, separators=(",", ":"), ensure_ascii=False) + "\n"
+        with self._lock:
+            if self._file is not None:
+                self._file.write(line)
+                self._file.flush()
+
+    def record(self, command, kwargs, target, future, started):
+        record = {
+            "t": round(started - self._started, 4),
+            "src": getattr(_local, "source", None) or self.default_source,
+            "cmd": command,
+            "kw": _plain(kwargs),
+            "target": target,
+        }
+        if future is None:
+            record["ms"] = None
+            self._write(record)
+            return
+
+        def done(f):
+            record["ms"] = round((time.monotonic() - started) * 1000, 2)
+            error = f.exception()
+            if error is not None:
+                record["err"] = {"*": f"{type(error).__name__}: {error}"}
+            elif f.result().errors:
+                record["err"] = {name: f"{type(e).__name__}: {e}" for name, e in f.result().errors.items()}
+            self._write(record)
+
+        future.add_done_callback(done)
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+def recorded(method):
+    """
+    Records calls of a LampEngine command method when engine.recorder is set.
+
+    Only the outermost command is recorded, so an intent is one line rather than one
+    per command it issues; callables such as on_success are left out.
+    """
+    signature = inspect.signature(method)
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if self.recorder is None or getattr(_local, "depth", 0):
+            return method(self, *args, **kwargs)
+        bound = signature.bind(self, *args, **kwargs)
+        arguments = {}
+        for name, value in list(bound.arguments.items())[1:]:
+            if signature.parameters[name].kind is inspect.Parameter.VAR_KEYWORD:
+                arguments.update(value)
+            elif not callable(value):
+                arguments[name] = value
+        target = arguments.get("target") or self.target
+        started = time.monotonic()
+        _local.depth = 1
+        try:
+            future = method(self, *args, **kwargs)
+        finally:
+            _local.depth = 0
+        self.recorder.record(method.__name__, arguments, target, future, started)
+        return future
+
+    return wrapper
+
+
+def load(path):
+    """
+    Reads a trace file into command records ordered by "at", the wall-clock time of each command.
+
+    A file appended by several sessions holds one start marker per session.
+    """
+    records = []
+    start = 0.0
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                print(f"Skipping a damaged trace line: {line[:60]}")
+                continue
+            if "start" in record:
+                start = record["start"]
+            elif "cmd" in record:
+                record["at"] = start + record["t"]
+                records.append(record)
+    records.sort(key=lambda record: record["at"])
+    return records
@@ -0,0 +1,295 @@
+import itertools
+import threading
+import time
+from concurrent.futures import Future
+
+from metrics import METRICS
+
+# Command priorities, lower runs first
+USER = 0
+BACKGROUND = 1
+
+# Yeelight bulbs accept about 60 LAN commands per minute per client
+QUOTA_LIMIT = 60
+QUOTA_PERIOD = 60.0
+BACKGROUND_RESERVE = 10  # Background commands are dropped when fewer tokens are left
+QUOTA_ERROR_CODE = -1  # miio error code of the bulb's "client quota exceeded" answer
+
+
+class DeviceNotConnected(Exception):
+    """
+    Raised for commands queued while no device is connected.
+    """
+
+
+class CommandDropped(Exception):
+    """
+    Raised for background commands dropped to save the command quota for user actions.
+    """
+
+
+class ExecutorClosed(Exception):
+    """
+    Raised for commands still queued, or submitted, after the executor shut down.
+    """
+
+
+def is_quota_error(e):
+    """
+    True for the bulb's answer that the per-client command quota is exceeded.
+    """
+    from miio.exceptions import DeviceError
+
+    return isinstance(e, DeviceError) and e.code == QUOTA_ERROR_CODE
+
+
+class CommandQuota:
+    """
+    Token bucket mirroring the bulb's per-minute command budget.
+    """
+    def __init__(self, limit=QUOTA_LIMIT, period=QUOTA_PERIOD):
+        self.limit = limit
+        self.rate = limit / period
+        self.tokens = float(limit)
+        self._stamp = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.limit, self.tokens + (now - self._stamp) * self.rate)
+        self._stamp = now
+
+    def available(self):
+        with self._lock:
+            self._refill()
+            return self.tokens
+
+    def delay(self, cost=1):
+        """
+        Seconds until cost commands can be sent without exceeding the budget.
+        """
+        with self._lock:
+            self._refill()
+            cost = min(cost, self.limit)
+            return 0.0 if self.tokens >= cost else (cost - self.tokens) / self.rate
+
+    def spend(self, cost=1):
+        with self._lock:
+            self._refill()
+            self.tokens -= cost
+
+    def refund(self, cost):
+        """
+        Returns tokens reserved for a job that sent fewer commands.
+        """
+        if not cost:
+            return
+        with self._lock:
+            self._refill()
+            self.tokens = min(self.limit, self.tokens + cost)
+
+    def exhaust(self):
+        """
+        Empties the bucket after the bulb reported that the quota was exceeded.
+        """
+        with self._lock:
+            self._refill()
+            self.tokens = min(self.tokens, 0.0)
+
+
+class _Command:
+    def __init__(self, seq, priority, key, func, args, cost):
+        self.seq = seq
+        self.priority = priority
+        self.key = key
+        self.func = func
+        self.args = args
+        self.cost = cost
+        self.futures = []
+        self.queued_at = time.perf_counter()
+
+
+class _MeteredDevice:
+    """
+    Device proxy that charges every method call to the command quota and times it when metrics are on.
+
+    Calls are taken from the reserved tokens first; reserved is what the job left unused.
+    """
+    def __init__(self, device, quota, name, reserved=0):
+        self._device = device
+        self._quota = quota
+        self._name = name
+        self.reserved = reserved
+
+    def __getattr__(self, name):
+        attr = getattr(self._device, name)
+        if not callable(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            if self.reserved > 0:
+                self.reserved -= 1
+            else:
+                self._quota.spend()
+            if not METRICS.enabled:
+                return attr(*args, **kwargs)
+            with METRICS.timer("device_call_seconds", errors="device_errors_total", device=self._name, method=name):
+                return attr(*args, **kwargs)
+        return call
+
+
+class DeviceExecutor:
+    """
+    Owns the device instance and runs every command on a single worker thread.
+
+    Commands are ordered by priority, pending commands with the same key are merged
+    so only the latest one runs, and sending is paced by the bulb's command quota:
+    a job waits until its whole cost, the commands it may send, is available.
+    """
+    def __init__(self, name="device-executor", quota=None):
+        self.name = name
+        self.device = None
+        self.quota = quota or CommandQuota()
+        self.merged = 0
+        self.dropped = 0
+        self.executed = 0
+        self._pending = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def submit(self, func, *args, priority=USER, key=None, cost=1):
+        """
+        Queues func(device, *args) and returns a Future with its result.
+
+        A pending command with the same key is superseded: it leaves the queue, the new
+        command is queued after everything already pending, and both futures receive its
+        result. cost is the most commands func may send.
+        """
+        future = Future()
+        with self._cond:
+            if self._closed:
+                future.set_exception(ExecutorClosed("Executor is shut down"))
+                return future
+            command = _Command(next(self._seq), priority, key, func, args, cost)
+            if key is not None:
+                superseded = next((c for c in self._pending if c.key == key), None)
+                if superseded is not None:
+                    self._pending.remove(superseded)
+                    command.priority = min(superseded.priority, priority)
+                    command.futures = superseded.futures
+                    command.queued_at = superseded.queued_at
+                    self.merged += 1
+            self._pending.append(command)
+            command.futures.append(future)
+            self._cond.notify()
+        return future
+
+    def call(self, method, *args, priority=USER, key=None):
+        """
+        Queues a call of a device method by name, e.g. call("set_brightness", 50).
+        """
+        return self.submit(self._call_method, method, args, priority=priority, key=key)
+
+    def connect(self, factory):
+        """
+        Replaces the owned device with factory() on the worker thread.
+        """
+        return self.submit(self._connect, factory, cost=0)
+
+    def disconnect(self):
+        """
+        Drops the owned device, so queued commands fail fast until reconnect.
+        """
+        return self.submit(self._disconnect, cost=0)
+
+    def shutdown(self):
+        """
+        Stops the worker after the running command; pending commands fail with ExecutorClosed.
+        """
+        with self._cond:
+            self._closed = True
+            pending, self._pending = self._pending, []
+            self._cond.notify()
+        for command in pending:
+            for future in command.futures:
+                if future.set_running_or_notify_cancel():
+                    future.set_exception(ExecutorClosed("Executor is shut down"))
+
+    def stats(self):
+        with self._cond:
+            return {
+                "depth": len(self._pending),
+                "merged": self.merged,
+                "dropped": self.dropped,
+                "executed": self.executed,
+                "quota_tokens": round(self.quota.available(), 1),
+            }
+
+    def _call_method(self, device, method, args):
+        if device is None:
+            raise DeviceNotConnected("Device is not connected")
+        return getattr(device, method)(*args)
+
+    def _connect(self, device, factory):
+        self.device = None
+        self.device = factory()
+        return self.device
+
+    def _disconnect(self, device):
+        self.device = None
+
+    def _next_command(self):
+        with self._cond:
+            while not self._closed:
+                if not self._pending:
+                    self._cond.wait()
+                    continue
+                command = min(self._pending, key=lambda c: (c.priority, c.seq))
+                if command.cost and self.device is not None:
+                    if command.priority > USER and self.quota.available() < BACKGROUND_RESERVE:
+                        self._pending.remove(command)
+                        self.dropped += 1
+                        for future in command.futures:
+                            if future.set_running_or_notify_cancel():
+                                future.set_exception(CommandDropped("Command quota is low"))
+                        continue
+                    delay = self.quota.delay(command.cost)
+                    if delay > 0:
+                        self._cond.wait(delay)
+                        continue
+                self._pending.remove(command)
+                return command
+            return None
+
+    def _run(self):
+        while True:
+            command = self._next_command()
+            if command is None:
+                break
+            futures = [f for f in command.futures if f.set_running_or_notify_cancel()]
+            if not futures:
+                continue
+            METRICS.observe("executor_wait_seconds", time.perf_counter() - command.queued_at, device=self.name)
+            device = self.device
+            if device is not None and command.cost:
+                # Reserved up front, so a job sending several commands cannot overdraw the budget
+                self.quota.spend(command.cost)
+                device = _MeteredDevice(device, self.quota, self.name, reserved=command.cost)
+            try:
+                result = command.func(device, *command.args)
+            except BaseException as e:
+                if is_quota_error(e):
+                    self.quota.exhaust()  # Unused reserved tokens are forfeited too
+                elif isinstance(device, _MeteredDevice):
+                    self.quota.refund(device.reserved)
+                for future in futures:
+                    future.set_exception(e)
+            else:
+                if isinstance(device, _MeteredDevice):
+                    self.quota.refund(device.reserved)
+                for future in futures:
+                    future.set_result(result)
+            self.executed += 1
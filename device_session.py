@@ -0,0 +1,157 @@
+import random
+import socket
+import threading
+import time
+
+from device_executor import DeviceNotConnected
+
+RETRY_ATTEMPTS = 3       # Tries per command before a timeout counts as a failure
+RETRY_BASE = 0.2         # Seconds before the first retry, doubled for every further one
+RETRY_CAP = 2.0          # Longest single backoff
+BREAKER_THRESHOLD = 3    # Consecutive failed commands that open the circuit
+BREAKER_COOLDOWN = 5.0   # Seconds the circuit stays open before a probe, doubled while the bulb stays dead
+BREAKER_COOLDOWN_CAP = 120.0
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half-open"
+
+
+def is_transient(e):
+    """
+    Timeouts, socket errors and failed handshakes are retried; errors reported by the bulb itself are not.
+    """
+    if isinstance(e, (socket.timeout, TimeoutError, OSError)):
+        return True
+    from miio.exceptions import DeviceError, DeviceException
+
+    if isinstance(e, DeviceError) or not isinstance(e, DeviceException):
+        return False
+    text = str(e).lower()
+    return isinstance(e.__cause__, OSError) or "no response" in text or "unable to discover" in text
+
+
+def backoff(attempt, base=RETRY_BASE, cap=RETRY_CAP):
+    """
+    Full-jitter exponential backoff: a random delay up to base * 2**attempt.
+    """
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+class ManagedSession:
+    """
+    Long-lived miio device with retries and a circuit breaker.
+
+    The wrapped Yeelight is kept between commands, so its handshake and message
+    counter stay warm. Transient timeouts are retried with jittered backoff; after
+    BREAKER_THRESHOLD failed commands the circuit opens and commands fail fast with
+    DeviceNotConnected until a probe succeeds. Each opening drops the device, so the
+    probe starts with a fresh handshake.
+    """
+    def __init__(self, factory, sleep=time.sleep):
+        self.factory = factory
+        self._sleep = sleep
+        self._device = None
+        self._lock = threading.Lock()
+        self.state = CLOSED
+        self.failures = 0  # Consecutive failed commands
+        self.cooldown = BREAKER_COOLDOWN
+        self.opened_at = None  # Start of the current cooldown
+        self.down_since = None  # Time the circuit first opened
+        self.calls = 0
+        self.errors = 0
+        self.retries = 0
+        self.trips = 0
+        self.reconnects = 0
+        self.reconnect_time = 0.0  # Seconds from opening to recovery, summed over reconnects
+        self.last_reconnect = None
+
+    @property
+    def device(self):
+        if self._device is None:
+            self._device = self.factory()
+        return self._device
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        # Methods are resolved per call, so an open circuit does not rebuild the device
+        return lambda *args, **kwargs: self.call(name, *args, **kwargs)
+
+    def probe_due(self):
+        """
+        True when the circuit is open and its cooldown has passed.
+        """
+        with self._lock:
+            return self.state == OPEN and time.monotonic() - self.opened_at >= self.cooldown
+
+    def call(self, method, *args, **kwargs):
+        self._admit()
+        self.calls += 1
+        for attempt in range(RETRY_ATTEMPTS):
+            try:
+                result = getattr(self.device, method)(*args, **kwargs)
+            except Exception as e:
+                if not is_transient(e):
+                    # The bulb answered, so the session itself is healthy
+                    self._succeeded()
+                    raise
+                if self.state == HALF_OPEN or attempt + 1 == RETRY_ATTEMPTS:
+                    self.errors += 1
+                    self._failed()
+                    raise
+                self.retries += 1
+                self._sleep(backoff(attempt))
+            else:
+                self._succeeded()
+                return result
+
+    def _admit(self):
+        with self._lock:
+            if self.state == CLOSED:
+                return
+            if self.state == OPEN and time.monotonic() - self.opened_at >= self.cooldown:
+                self.state = HALF_OPEN  # One trial command decides
+                return
+            raise DeviceNotConnected(f"Circuit open, next probe in {self._next_probe():.0f} s")
+
+    def _next_probe(self):
+        return max(0.0, self.opened_at + self.cooldown - time.monotonic())
+
+    def _succeeded(self):
+        with self._lock:
+            if self.state != CLOSED:
+                self.last_reconnect = time.monotonic() - self.down_since
+                self.reconnect_time += self.last_reconnect
+                self.reconnects += 1
+                self.cooldown = BREAKER_COOLDOWN
+                self.state = CLOSED
+            self.failures = 0
+
+    def _failed(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == HALF_OPEN:
+                self.cooldown = min(self.cooldown * 2, BREAKER_COOLDOWN_CAP)
+            elif self.failures < BREAKER_THRESHOLD:
+                return
+            else:
+                self.trips += 1
+                self.down_since = time.monotonic()
+            self.opened_at = time.monotonic()
+            self.state = OPEN
+            self._device = None
+
+    def stats(self):
+        with self._lock:
+            return {
+                "circuit": self.state,
+                "calls": self.calls,
+                "errors": self.errors,
+                "retries": self.retries,
+                "failure_rate": round(self.errors / self.calls, 3) if self.calls else 0.0,
+                "trips": self.trips,
+                "reconnects": self.reconnects,
+                "last_reconnect_s": round(self.last_reconnect, 2) if self.last_reconnect is not None else None,
+                "avg_reconnect_s": round(self.reconnect_time / self.reconnects, 2) if self.reconnects else None,
+            }
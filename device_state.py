@@ -0,0 +1,142 @@
+import threading
+import time
+
+from device_executor import DeviceNotConnected
+
+PROPERTIES = ("power", "brightness", "color_temp", "rgb")
+
+
+class DeviceState:
+    """
+    Cached bulb state, updated optimistically after commands and reconciled by status polls.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.power = None
+        self.brightness = None
+        self.color_temp = None
+        self.rgb = None
+        self.updated_at = 0.0  # Time the device last confirmed the cache
+
+    def update_from_status(self, status):
+        """
+        Replaces the cache with a status read from the device.
+        """
+        with self._lock:
+            self.power = status.is_on
+            self.brightness = int(status.brightness)
+            self.color_temp = status.color_temp
+            self.rgb = tuple(status.rgb) if status.rgb is not None else None
+            self.updated_at = time.monotonic()
+
+    def apply(self, **values):
+        """
+        Records the values of a successful command.
+        """
+        with self._lock:
+            for prop, value in values.items():
+                if prop not in PROPERTIES:
+                    raise KeyError(prop)
+                setattr(self, prop, value)
+            # The bulb is either in color temperature or in RGB mode
+            if values.get("color_temp") is not None and "rgb" not in values:
+                self.rgb = None
+            if values.get("rgb") is not None and "color_temp" not in values:
+                self.color_temp = None
+
+    def matches(self, prop, value):
+        with self._lock:
+            return self.power is not None and getattr(self, prop) == value
+
+    def touch(self):
+        """
+        Marks the cache as confirmed by the device, e.g. by a live LAN notification channel.
+        """
+        with self._lock:
+            self.updated_at = time.monotonic()
+
+    def clear(self):
+        with self._lock:
+            for prop in PROPERTIES:
+                setattr(self, prop, None)
+            self.updated_at = 0.0
+
+    @property
+    def known(self):
+        return self.power is not None
+
+    def age(self):
+        return time.monotonic() - self.updated_at
+
+    def is_fresh(self, max_age):
+        return self.known and self.age() <= max_age
+
+    def snapshot(self):
+        with self._lock:
+            return {prop: getattr(self, prop) for prop in PROPERTIES}
+
+
+def refresh_job(state):
+    """
+    Returns an executor job that reads status() into the cache.
+    """
+    def job(device):
+        if device is None:
+            raise DeviceNotConnected("Device is not connected")
+        state.update_from_status(device.status())
+        return state
+    return job
+
+
+def write_job(state, prop, value, method, *args):
+    """
+    Returns an executor job that writes one property, skipping it if the cache already matches.
+    """
+    if not args:
+        args = (value,)
+
+    def job(device):
+        if state.matches(prop, value):
+            return state
+        if device is None:
+            raise DeviceNotConnected("Device is not connected")
+        getattr(device, method)(*args)
+        state.apply(**{prop: value})
+        return state
+    return job
+
+
+def toggle_job(state):
+    """
+    Returns an executor job that flips power using the cached state when it is known.
+    """
+    def job(device):
+        if device is None:
+            raise DeviceNotConnected("Device is not connected")
+        if not state.known:
+            state.update_from_status(device.status())
+        if state.power:
+            device.off()
+        else:
+            device.on()
+        state.apply(power=not state.power)
+        return state
+    return job
+
+
+def power_job(state, on):
+    """
+    Returns an executor job that switches power to a given value, e.g. for a whole group.
+    """
+    def job(device):
+        if state.matches("power", on):
+            return state
+        if device is None:
+            raise DeviceNotConnected("Device is not connected")
+        if on:
+            device.on()
+        else:
+            device.off()
+        state.apply(power=on)
+        return state
+    return job
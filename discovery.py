@@ -0,0 +1,220 @@
+import json
+import os
+import socket
+import struct
+import sys
+import threading
+import time
+
+SSDP_ADDRESS = ("239.255.255.250", 1982)  # Yeelight's SSDP-like multicast search
+MIIO_PORT = 54321
+DISCOVERY_TIMEOUT = 1.5  # Seconds a full discovery pass listens for answers
+PROBE_TIMEOUT = 0.5  # Seconds to wait for known bulbs to answer a unicast hello
+DEVICE_INDEX_FILE = "device_index.json"
+
+SSDP_SEARCH = (
+    "M-SEARCH * HTTP/1.1\r\n"
+    "HOST: 239.255.255.250:1982\r\n"
+    "MAN: \"ssdp:discover\"\r\n"
+    "ST: wifi_bulb\r\n"
+).encode()
+MIIO_HELLO = bytes.fromhex("21310020" + "ff" * 28)
+
+
+def parse_ssdp(data):
+    """
+    Parses a Yeelight search answer into a device record, or returns None.
+    """
+    headers = {}
+    for line in data.decode(errors="replace").split("\r\n")[1:]:
+        key, sep, value = line.partition(":")
+        if sep:
+            headers[key.strip().lower()] = value.strip()
+    location = headers.get("location", "")
+    if not location.startswith("yeelight://") or "id" not in headers:
+        return None
+    ip = location[len("yeelight://"):].split(":")[0]
+    return {
+        # The Yeelight id is the miio device id in hex
+        "did": str(int(headers["id"], 16) & 0xFFFFFFFF),
+        "ip": ip,
+        "model": headers.get("model"),
+        "support": headers.get("support", "").split(),
+        "fw_ver": headers.get("fw_ver"),
+    }
+
+
+def parse_hello(data, ip):
+    """
+    Parses a miio hello answer into a device record, or returns None.
+    """
+    if len(data) < 32:
+        return None
+    magic, length, _, did, stamp, checksum = struct.unpack(">HHIII16s", data[:32])
+    if magic != 0x2131 or did == 0xFFFFFFFF:
+        return None
+    record = {"did": str(did), "ip": ip}
+    if checksum not in (b"\x00" * 16, b"\xff" * 16):
+        record["token"] = checksum.hex()  # Only unprovisioned devices reveal their token
+    return record
+
+
+def _collect(sock, parse, timeout, found, expected=None):
+    deadline = time.monotonic() + timeout
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0 or (expected is not None and expected <= {r["ip"] for r in found}):
+            return
+        sock.settimeout(remaining)
+        try:
+            data, (ip, _) = sock.recvfrom(4096)
+        except (socket.timeout, OSError):
+            return
+        record = parse(data, ip)
+        if record:
+            found.append(record)
+
+
+def search_yeelight(timeout=DISCOVERY_TIMEOUT):
+    found = []
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, 2)
+        try:
+            sock.sendto(SSDP_SEARCH, SSDP_ADDRESS)
+        except OSError as e:
+            print(f"Yeelight search failed: {e}")
+            return found
+        _collect(sock, lambda data, ip: parse_ssdp(data), timeout, found)
+    return found
+
+
+def miio_hello(ips=None, timeout=DISCOVERY_TIMEOUT, port=MIIO_PORT):
+    """
+    Sends the miio hello to the given IPs, or broadcasts it when ips is None.
+    """
+    found = []
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+        try:
+            for ip in ips if ips is not None else ["255.255.255.255"]:
+                sock.sendto(MIIO_HELLO, (ip, port))
+        except OSError as e:
+            print(f"miio hello failed: {e}")
+            return found
+        _collect(sock, parse_hello, timeout, found, set(ips) if ips is not None else None)
+    return found
+
+
+def discover(timeout=DISCOVERY_TIMEOUT):
+    """
+    Runs the Yeelight search and the miio hello broadcast in parallel; returns records merged by device id.
+    """
+    results = {}
+    threads = [
+        threading.Thread(target=lambda: results.__setitem__("ssdp", search_yeelight(timeout)), daemon=True),
+        threading.Thread(target=lambda: results.__setitem__("hello", miio_hello(None, timeout)), daemon=True),
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout + 1)
+    merged = {}
+    for record in results.get("hello", []) + results.get("ssdp", []):
+        merged.setdefault(record["did"], {}).update(record)
+    return list(merged.values())
+
+
+class DeviceIndex:
+    """
+    On-disk map of device id to last IP, model and capabilities (device_index.json).
+
+    Entries also remember the config name a bulb was matched to, which is how a
+    configured bulb is found again after DHCP gave it a new address.
+    """
+    def __init__(self, path=DEVICE_INDEX_FILE):
+        self.path = path
+        self.devices = {}
+        self.load()
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.devices = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"Device index not loaded: {e}")
+
+    def save(self):
+        tmp = self.path + ".tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(self.devices, f, indent=4, ensure_ascii=False)
+            os.replace(tmp, self.path)
+        except OSError as e:
+            print(f"Device index not saved: {e}")
+
+    def update(self, record, name=None):
+        entry = self.devices.setdefault(record["did"], {})
+        entry.update({key: value for key, value in record.items() if key != "did" and value})
+        entry["seen"] = time.time()
+        if name:
+            for other in self.devices.values():
+                if other.get("name") == name and other is not entry:
+                    del other["name"]
+            entry["name"] = name
+        return entry
+
+    def did_for(self, name, ip):
+        """
+        Device id of a configured bulb: matched by name first, then by its last IP.
+        """
+        by_ip = None
+        for did, entry in self.devices.items():
+            if entry.get("name") == name:
+                return did
+            if entry.get("ip") == ip:
+                by_ip = did
+        return by_ip
+
+
+def resolve(registry, index, timeout=DISCOVERY_TIMEOUT):
+    """
+    Revalidates configured bulbs and finds moved ones; returns {name: new_ip}.
+
+    Known IPs get a unicast hello first; the full discovery pass only runs when
+    some bulb did not answer at its configured address.
+    """
+    addresses = {name: entry["ip"] for name, entry in registry.devices.items() if entry.get("ip")}
+    answered = {record["ip"]: record for record in miio_hello(list(set(addresses.values())), PROBE_TIMEOUT)}
+    missing = []
+    for name, ip in addresses.items():
+        known = index.did_for(name, ip)
+        # Another bulb may have been given the old address
+        if ip in answered and known in (None, answered[ip]["did"]):
+            index.update(answered[ip], name)
+        else:
+            missing.append(name)
+
+    moved = {}
+    if missing:
+        found = {record["did"]: record for record in discover(timeout)}
+        for record in found.values():
+            index.update(record)
+        for name in missing:
+            did = index.did_for(name, addresses[name])
+            if did in found and found[did]["ip"] != addresses[name]:
+                moved[name] = found[did]["ip"]
+                index.update(found[did], name)
+    index.save()
+    return moved
+
+
+if __name__ == "__main__":
+    # Usage: python discovery.py [timeout]
+    timeout = float(sys.argv[1]) if len(sys.argv) > 1 else DISCOVERY_TIMEOUT
+    index = DeviceIndex()
+    for record in discover(timeout):
+        index.update(record)
+        print(f"{record['did']}: {record['ip']} {record.get('model') or ''} {' '.join(record.get('support', []))}")
+    index.save()
@@ -0,0 +1,255 @@
+import functools
+import itertools
+import math
+import threading
+import time
+from concurrent.futures import Future
+
+from device_executor import DeviceNotConnected
+from scenes import rgb_to_int
+
+# Flow tuple modes and end actions of Yeelight's start_cf
+COLOR, TEMP, SLEEP = 1, 2, 7
+RECOVER, STAY, OFF = 0, 1, 2
+KEEP = -1  # Brightness of a flow tuple that leaves brightness unchanged
+MIN_DURATION = 50  # Shortest flow step the bulb accepts, in ms
+MAX_FLOW_STEPS = 64  # Longer expressions are played client-side instead
+FRAME_FPS = 30  # Frame rate of the client-side fallback
+EFFECT_CACHE = 128  # Compiled flows kept by effect parameters
+
+
+def kelvin_to_rgb(kelvin):
+    """
+    Approximate RGB of a black body, for playing temperature steps as frames.
+    """
+    t = max(1000, min(40000, kelvin)) / 100
+    if t <= 66:
+        r = 255
+        g = 99.4708025861 * math.log(t) - 161.1195681661
+        b = 0 if t <= 19 else 138.5177312231 * math.log(t - 10) - 305.0447927307
+    else:
+        r = 329.698727446 * (t - 60) ** -0.1332047592
+        g = 288.1221695283 * (t - 60) ** -0.0755148492
+        b = 255
+    return tuple(int(max(0, min(255, c))) for c in (r, g, b))
+
+
+def int_to_rgb(value):
+    return (value >> 16) & 0xFF, (value >> 8) & 0xFF, value & 0xFF
+
+
+class Flow:
+    """
+    A compiled effect: (duration_ms, mode, value, brightness) steps repeated count times (0 forever).
+
+    Native flows run on the bulb with one start_cf command; the rest are played as
+    frames over music mode.
+    """
+    __slots__ = ("steps", "count", "action")
+
+    def __init__(self, steps, count=1, action=STAY):
+        self.steps = tuple(steps)
+        self.count = count
+        self.action = action
+
+    @property
+    def native(self):
+        return (len(self.steps) <= MAX_FLOW_STEPS
+                and all(step[0] >= MIN_DURATION or step[1] == SLEEP for step in self.steps))
+
+    def expression(self):
+        return ",".join(f"{duration},{mode},{value},{brightness}" for duration, mode, value, brightness in self.steps)
+
+    def params(self):
+        """
+        start_cf params; the bulb counts single steps, not loops.
+        """
+        return [self.count * len(self.steps), self.action, self.expression()]
+
+    def final(self):
+        """
+        State values the bulb keeps after a finite flow ending with STAY, else {}.
+        """
+        if not self.count or self.action != STAY:
+            return {}
+        values = {}
+        for duration, mode, value, brightness in self.steps:
+            if mode == COLOR:
+                values["rgb"] = int_to_rgb(value)
+                values.pop("color_temp", None)
+            elif mode == TEMP:
+                values["color_temp"] = value
+                values.pop("rgb", None)
+            if mode != SLEEP and brightness != KEEP:
+                values["brightness"] = brightness
+        return values
+
+    def frames(self, start, fps=FRAME_FPS):
+        """
+        (rgb, brightness) frames interpolating the steps from start = (rgb, brightness).
+        """
+        rgb, brightness = start
+        loops = itertools.count() if not self.count else range(self.count)
+        for _ in loops:
+            for duration, mode, value, step_brightness in self.steps:
+                frames = max(1, round(duration * fps / 1000))
+                if mode == SLEEP:
+                    for _ in range(frames):
+                        yield rgb, brightness
+                    continue
+                target = kelvin_to_rgb(value) if mode == TEMP else int_to_rgb(value)
+                target_brightness = brightness if step_brightness == KEEP else step_brightness
+                for i in range(1, frames + 1):
+                    t = i / frames
+                    yield (tuple(round(a + (b - a) * t) for a, b in zip(rgb, target)),
+                           max(1, round(brightness + (target_brightness - brightness) * t)))
+                rgb, brightness = target, target_brightness
+
+
+# Effects; colors are (r, g, b), temperatures in K, durations in ms
+
+def fade(rgb=None, temp=None, brightness=100, duration=1000):
+    if rgb is not None:
+        return Flow([(duration, COLOR, rgb_to_int(rgb), brightness)])
+    return Flow([(duration, TEMP, int(temp or 4000), brightness)])
+
+
+def breathe(rgb=(255, 255, 255), low=1, high=100, period=2000, count=0):
+    half = period // 2
+    color = rgb_to_int(rgb)
+    return Flow([(half, COLOR, color, high), (half, COLOR, color, low)], count, RECOVER)
+
+
+def sunrise(duration=600000, brightness=100):
+    """
+    Deep red to warm orange to daylight, staying at the end.
+    """
+    third = duration // 3
+    return Flow([
+        (MIN_DURATION, COLOR, rgb_to_int((255, 32, 0)), 1),
+        (third, COLOR, rgb_to_int((255, 120, 0)), max(1, brightness // 10)),
+        (third, TEMP, 2700, max(1, brightness // 2)),
+        (third, TEMP, 5000, brightness),
+    ])
+
+
+def strobe(rgb=(255, 255, 255), hz=5, count=20):
+    """
+    Flashes between full and minimal brightness; faster than 10 Hz needs the frame fallback.
+    """
+    half = max(1, int(500 / hz))
+    color = rgb_to_int(rgb)
+    return Flow([(half, COLOR, color, 100), (half, COLOR, color, 1)], count, RECOVER)
+
+
+def sequence(colors=((255, 0, 0), (0, 255, 0), (0, 0, 255)), hold=1000, transition=500, brightness=100, count=0):
+    steps = []
+    for rgb in colors:
+        steps.append((transition, COLOR, rgb_to_int(rgb), brightness))
+        if hold:
+            steps.append((hold, SLEEP, 0, KEEP))
+    return Flow(steps, count, RECOVER if count == 0 else STAY)
+
+
+EFFECTS = {
+    "fade": fade,
+    "breathe": breathe,
+    "sunrise": sunrise,
+    "strobe": strobe,
+    "sequence": sequence,
+}
+
+
+def _hashable(value):
+    if isinstance(value, (list, tuple)):
+        return tuple(_hashable(item) for item in value)
+    return value
+
+
+@functools.lru_cache(maxsize=EFFECT_CACHE)
+def _compile(name, params):
+    return EFFECTS[name](**dict(params))
+
+
+def compile_effect(name, **params):
+    """
+    Returns the Flow of a named effect; equal parameters reuse the cached compilation.
+
+    Raises KeyError for unknown effects and TypeError for unknown parameters.
+    """
+    if name not in EFFECTS:
+        raise KeyError(name)
+    return _compile(name, tuple(sorted((key, _hashable(value)) for key, value in params.items())))
+
+
+def flow_job(state, flow):
+    """
+    Returns an executor job starting a native flow with one start_cf command.
+    """
+    def job(device):
+        if device is None:
+            raise DeviceNotConnected("Device is not connected")
+        device.send("start_cf", flow.params())
+        # A running flow wins over the cache; only a finite flow that stays has a known end
+        state.apply(power=True, **flow.final())
+        return state
+    return job
+
+
+def stop_job(state):
+    def job(device):
+        if device is None:
+            raise DeviceNotConnected("Device is not connected")
+        device.send("stop_cf", [])
+        state.update_from_status(device.status())
+        return state
+    return job
+
+
+class FramePlayer:
+    """
+    Plays a flow the bulb cannot run natively as frames over music mode, on its own thread.
+    """
+    def __init__(self, fleet, name, flow, fps=FRAME_FPS):
+        self.fleet = fleet
+        self.name = name
+        self.flow = flow
+        self.fps = fps
+        self.future = Future()
+        self._stopped = threading.Event()
+
+    def start(self):
+        threading.Thread(target=self._run, name=f"effect-{self.name}", daemon=True).start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+
+    def _frames(self, start):
+        for frame in self.flow.frames(start, self.fps):
+            if self._stopped.is_set():
+                return
+            yield frame
+
+    def _run(self):
+        state = self.fleet.states[self.name]
+        if self._stopped.is_set():
+            self.future.set_result(state)  # Replaced before it started
+            return
+        start = (state.rgb or (255, 255, 255), state.brightness or 100)
+        try:
+            stream = self.fleet.music(self.name, self.fps).start()
+            stream.play(self._frames(start))
+            if self.flow.action == RECOVER and not self._stopped.is_set():
+                stream.push(*start)
+            time.sleep(1 / self.fps)  # Let the last frame go out
+            stream.stop().result()
+            if self.flow.action == OFF and not self._stopped.is_set():
+                self.fleet.executors[self.name].call("off").result()
+                state.apply(power=False)
+            elif self.flow.action == STAY and self.flow.count:
+                state.apply(power=True, **self.flow.final())
+            self.future.set_result(state)
+        except Exception as e:
+            print(f"Effect error [{self.name}]: {e}")
+            self.future.set_exception(e)
@@ -0,0 +1,85 @@
+import json
+import sys
+import time
+from concurrent import futures
+
+import grpc
+from google.cloud import dialogflow_v2 as df
+from google.protobuf import struct_pb2
+
+SERVICE = "google.cloud.dialogflow.v2.Sessions"
+
+
+class FakeSessions:
+    """
+    Local fake of the Dialogflow Sessions service for testing VoiceProcessor against "DIALOGFLOW_ENDPOINT".
+
+    Every DetectIntent or StreamingDetectIntent call answers with the configured
+    transcript and intent after consuming the whole request stream.
+    """
+    def __init__(self, transcript, intent, parameters, latency=0.0):
+        self.transcript = transcript
+        self.intent = intent
+        self.parameters = parameters
+        self.latency = latency
+        self.calls = 0
+        self.audio_bytes = 0
+
+    def query_result(self, text):
+        parameters = struct_pb2.Struct()
+        parameters.update(self.parameters)
+        result = df.QueryResult(
+            query_text=text,
+            language_code="ru-RU",
+            intent=df.Intent(display_name=self.intent),
+            intent_detection_confidence=1.0,
+        )
+        result._pb.parameters.CopyFrom(parameters)
+        return result
+
+    def detect_intent(self, request, context):
+        self.calls += 1
+        time.sleep(self.latency)
+        return df.DetectIntentResponse(query_result=self.query_result(request.query_input.text.text))
+
+    def streaming_detect_intent(self, requests, context):
+        self.calls += 1
+        for request in requests:
+            self.audio_bytes += len(request.input_audio)
+        time.sleep(self.latency)
+        yield df.StreamingDetectIntentResponse(
+            recognition_result=df.StreamingRecognitionResult(transcript=self.transcript, is_final=True)
+        )
+        yield df.StreamingDetectIntentResponse(query_result=self.query_result(self.transcript))
+
+
+def serve(sessions, port=50051):
+    handler = grpc.method_handlers_generic_handler(SERVICE, {
+        "DetectIntent": grpc.unary_unary_rpc_method_handler(
+            sessions.detect_intent,
+            request_deserializer=df.DetectIntentRequest.deserialize,
+            response_serializer=df.DetectIntentResponse.serialize,
+        ),
+        "StreamingDetectIntent": grpc.stream_stream_rpc_method_handler(
+            sessions.streaming_detect_intent,
+            request_deserializer=df.StreamingDetectIntentRequest.deserialize,
+            response_serializer=df.StreamingDetectIntentResponse.serialize,
+        ),
+    })
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=4))
+    server.add_generic_rpc_handlers((handler,))
+    server.add_insecure_port(f"localhost:{port}")
+    server.start()
+    return server
+
+
+if __name__ == "__main__":
+    # Usage: python fake_dialogflow.py [port] [transcript] [intent] [json parameters]
+    args = sys.argv[1:]
+    port = int(args[0]) if args else 50051
+    transcript = args[1] if len(args) > 1 else "лампа красный"
+    intent = args[2] if len(args) > 2 else "color.set"
+    parameters = json.loads(args[3]) if len(args) > 3 else {"color": "красный"}
+    server = serve(FakeSessions(transcript, intent, parameters), port)
+    print(f"Fake Dialogflow listening on localhost:{port}")
+    server.wait_for_termination()
@@ -0,0 +1,204 @@
+import threading
+from concurrent.futures import Future
+
+from device_executor import USER, DeviceExecutor
+from device_session import ManagedSession
+from device_state import DeviceState
+from lan_events import NotificationListener
+from music_mode import MusicStream
+
+DEFAULT_DEVICE = "lamp"  # Name of the bulb described by the top-level DEVICE_IP/DEVICE_TOKEN/MODEL
+
+
+class DeviceRegistry:
+    """
+    Named bulbs and groups (rooms) loaded from config.json.
+
+    Besides the single-bulb DEVICE_IP/DEVICE_TOKEN/MODEL keys the config may hold
+    "DEVICES": {name: {"DEVICE_IP": ..., "DEVICE_TOKEN": ..., "MODEL": ...}} and
+    "GROUPS": {group: [device names]}.
+    """
+    def __init__(self, devices=None, groups=None):
+        self.devices = dict(devices or {})
+        self.groups = dict(groups or {})
+
+    @classmethod
+    def from_config(cls, config):
+        registry = cls()
+        if config.get("DEVICE_IP"):
+            registry.add(DEFAULT_DEVICE, config.get("DEVICE_IP"), config.get("DEVICE_TOKEN"), config.get("MODEL"))
+        for name, entry in config.get("DEVICES", {}).items():
+            registry.add(name, entry.get("DEVICE_IP"), entry.get("DEVICE_TOKEN"), entry.get("MODEL"))
+        for group, members in config.get("GROUPS", {}).items():
+            unknown = [name for name in members if name not in registry.devices]
+            if unknown:
+                print(f"Unknown devices in group {group}: {', '.join(unknown)}")
+            registry.groups[group] = [name for name in members if name in registry.devices]
+        return registry
+
+    def to_config(self, config):
+        """
+        Writes the registry back into a config dict, keeping unrelated keys.
+        """
+        default = self.devices.get(DEFAULT_DEVICE)
+        if default:
+            config["DEVICE_IP"] = default["ip"]
+            config["DEVICE_TOKEN"] = default["token"]
+            config["MODEL"] = default["model"]
+        others = {
+            name: {"DEVICE_IP": d["ip"], "DEVICE_TOKEN": d["token"], "MODEL": d["model"]}
+            for name, d in self.devices.items() if name != DEFAULT_DEVICE
+        }
+        if others:
+            config["DEVICES"] = others
+        if self.groups:
+            config["GROUPS"] = self.groups
+        return config
+
+    def add(self, name, ip, token, model):
+        self.devices[name] = {"ip": ip, "token": token, "model": model}
+
+    def targets(self):
+        """
+        Names that can be addressed by commands: every bulb and every group.
+        """
+        return list(self.devices) + [group for group in self.groups if group not in self.devices]
+
+    def members(self, target=None):
+        """
+        Resolves a device or group name to device names; None means every bulb.
+        """
+        if target is None:
+            return list(self.devices)
+        if target in self.devices:
+            return [target]
+        if target in self.groups:
+            return list(self.groups[target])
+        raise KeyError(f"Unknown device or group: {target}")
+
+
+class FanOutResult:
+    """
+    Per-device outcome of a fleet command.
+    """
+    def __init__(self):
+        self.results = {}
+        self.errors = {}
+
+    def __repr__(self):
+        return f"FanOutResult(results={self.results!r}, errors={self.errors!r})"
+
+
+def gather(futures):
+    """
+    Combines {name: Future} into one Future resolving to a FanOutResult once all are done.
+    """
+    combined = Future()
+    outcome = FanOutResult()
+    remaining = [len(futures)]
+    lock = threading.Lock()
+
+    def done(name, future):
+        error = future.exception()
+        with lock:
+            if error is None:
+                outcome.results[name] = future.result()
+            else:
+                outcome.errors[name] = error
+            remaining[0] -= 1
+            finished = remaining[0] == 0
+        if finished:
+            combined.set_result(outcome)
+
+    if not futures:
+        combined.set_result(outcome)
+    for name, future in futures.items():
+        future.add_done_callback(lambda f, name=name: done(name, f))
+    return combined
+
+
+class Fleet:
+    """
+    One executor thread and state cache per bulb; group commands fan out to all members at once.
+    """
+    def __init__(self, registry):
+        self.registry = registry
+        self.executors = {}
+        self.states = {}
+        self.listeners = {}
+        self._on_props = None
+        for name in registry.devices:
+            self._ensure(name)
+
+    def _ensure(self, name):
+        if name not in self.executors:
+            self.executors[name] = DeviceExecutor(name=f"device-{name}")
+            self.states[name] = DeviceState()
+
+    def connect(self, factory, target=None):
+        """
+        (Re)creates the device of every member with factory(ip=..., token=..., model=...).
+        """
+        futures = {}
+        for name in self.registry.members(target):
+            self._ensure(name)
+            entry = self.registry.devices[name]
+            self.states[name].clear()
+            futures[name] = self.executors[name].connect(
+                lambda entry=entry: factory(ip=entry["ip"], token=entry["token"], model=entry["model"])
+            )
+            if self._on_props is not None:
+                self._listen(name)
+        return gather(futures)
+
+    def listen(self, on_props):
+        """
+        Subscribes to LAN "props" notifications of every bulb; on_props(name, props) runs on listener threads.
+        """
+        self._on_props = on_props
+        for name in self.registry.devices:
+            self._listen(name)
+
+    def _listen(self, name):
+        ip = self.registry.devices[name]["ip"]
+        listener = self.listeners.get(name)
+        if listener is not None:
+            if listener.ip == ip:
+                return
+            listener.stop()
+        self.listeners[name] = NotificationListener(
+            ip, self.states[name], lambda props: self._on_props(name, props)
+        ).start()
+
+    def submit(self, target, make_job, priority=USER, key=None, cost=1):
+        """
+        Queues make_job(state) on the executor of every member of target concurrently.
+        """
+        return gather({
+            name: self.executors[name].submit(make_job(self.states[name]), priority=priority, key=key, cost=cost)
+            for name in self.registry.members(target)
+        })
+
+    def music(self, name, fps=30):
+        """
+        Returns a MusicStream for one bulb; call start() before pushing frames.
+        """
+        return MusicStream(self.executors[name], self.registry.devices[name]["ip"], fps)
+
+    def disconnect(self, name):
+        self.states[name].clear()
+        return self.executors[name].disconnect()
+
+    def stats(self):
+        """
+        Queue depth, merged and dropped command counts per bulb, with session health when managed.
+        """
+        stats = {}
+        for name, executor in self.executors.items():
+            stats[name] = executor.stats()
+            if isinstance(executor.device, ManagedSession):
+                stats[name]["session"] = executor.device.stats()
+        return stats
+
+    def is_connected(self, name):
+        return self.executors[name].device is not None
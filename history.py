@@ -0,0 +1,316 @@
+import array
+import sqlite3
+import threading
+import time
+
+from scenes import rgb_to_int
+
+BUFFER_SIZE = 4096  # Samples held in memory between flushes; the oldest are overwritten when full
+FLUSH_INTERVAL = 30.0  # Seconds between batched inserts
+RAW_RETENTION = 7 * 24 * 3600  # Seconds of full-resolution samples kept; older ones live on as hourly rows
+HOUR = 3600
+
+UNKNOWN = -1  # Stored for a property the cache does not know
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS devices (id INTEGER PRIMARY KEY, name TEXT UNIQUE NOT NULL);
+CREATE TABLE IF NOT EXISTS samples (
+    ts INTEGER NOT NULL, device INTEGER NOT NULL,
+    power INTEGER, brightness INTEGER, color_temp INTEGER, rgb INTEGER
+);
+CREATE INDEX IF NOT EXISTS samples_device_ts ON samples (device, ts);
+CREATE TABLE IF NOT EXISTS hourly (
+    device INTEGER NOT NULL, hour INTEGER NOT NULL,
+    on_seconds INTEGER, brightness_seconds INTEGER, changes INTEGER,
+    PRIMARY KEY (device, hour)
+);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER);
+"""
+
+
+def encode(snapshot):
+    """
+    DeviceState.snapshot() -> (power, brightness, color_temp, rgb) integers.
+    """
+    power = snapshot["power"]
+    return (
+        UNKNOWN if power is None else int(power),
+        UNKNOWN if snapshot["brightness"] is None else int(snapshot["brightness"]),
+        UNKNOWN if snapshot["color_temp"] is None else int(snapshot["color_temp"]),
+        UNKNOWN if snapshot["rgb"] is None else rgb_to_int(snapshot["rgb"]),
+    )
+
+
+class SampleBuffer:
+    """
+    Fixed-size ring of samples in typed arrays: about 20 bytes per sample, however long the app runs.
+    """
+    def __init__(self, size=BUFFER_SIZE):
+        self.size = size
+        self.ts = array.array("d", bytes(8 * size))
+        self.device = array.array("H", bytes(2 * size))
+        self.power = array.array("b", bytes(size))
+        self.brightness = array.array("b", bytes(size))
+        self.color_temp = array.array("h", bytes(2 * size))
+        self.rgb = array.array("i", bytes(4 * size))
+        self.start = 0
+        self.count = 0
+        self.overwritten = 0
+
+    def append(self, ts, device, values):
+        index = (self.start + self.count) % self.size
+        if self.count == self.size:
+            self.start = (self.start + 1) % self.size
+            self.overwritten += 1
+        else:
+            self.count += 1
+        self.ts[index] = ts
+        self.device[index] = device
+        self.power[index], self.brightness[index], self.color_temp[index], self.rgb[index] = values
+
+    def rows(self):
+        """
+        Buffered samples as (ts, device, power, brightness, color_temp, rgb), oldest first.
+        """
+        return [
+            (int(self.ts[i]), self.device[i], self.power[i], self.brightness[i], self.color_temp[i], self.rgb[i])
+            for i in ((self.start + n) % self.size for n in range(self.count))
+        ]
+
+    def drain(self):
+        rows = self.rows()
+        self.start = 0
+        self.count = 0
+        return rows
+
+
+def summarize(rows, anchor, start, end):
+    """
+    On-time, brightness-seconds and change count over [start, end) from ts-ordered (ts, power, brightness) rows.
+
+    anchor is the (power, brightness) in effect at start, or None when unknown.
+    """
+    on_seconds = brightness_seconds = changes = 0
+    power, brightness = anchor if anchor else (UNKNOWN, UNKNOWN)
+    since = start
+    for ts, new_power, new_brightness in rows:
+        if ts >= end:
+            break
+        if ts > since:
+            if power == 1:
+                on_seconds += ts - since
+                brightness_seconds += (ts - since) * max(brightness, 0)
+            since = ts
+        if ts >= start:
+            changes += 1
+        power, brightness = new_power, new_brightness
+    if power == 1 and end > since:
+        on_seconds += end - since
+        brightness_seconds += (end - since) * max(brightness, 0)
+    return on_seconds, brightness_seconds, changes
+
+
+class History:
+    """
+    Per-bulb history of power, brightness and color.
+
+    State changes go into a SampleBuffer and are written to SQLite in one transaction
+    every FLUSH_INTERVAL. Samples older than RAW_RETENTION are rolled up into hourly
+    rows of on-time, brightness and change count, and then deleted. Memory stays fixed
+    and the database grows by one row per bulb per hour.
+    """
+    def __init__(self, path, fleet):
+        self.path = path
+        self.fleet = fleet
+        self.buffer = SampleBuffer()
+        self._last = {}  # Device -> last recorded values, so unchanged states are not stored
+        self._ids = {}
+        self._lock = threading.Lock()  # Guards the buffer
+        self._db_lock = threading.Lock()  # Held across a flush or rollup, and across the reads of usage()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def open(self):
+        """
+        Creates the tables and registers the bulbs; enough for queries without sampling.
+        """
+        db = self._connect()
+        try:
+            with db:
+                db.executescript(SCHEMA)
+                for name in self.fleet.states:
+                    db.execute("INSERT OR IGNORE INTO devices (name) VALUES (?)", (name,))
+            self._ids = {name: id for id, name in db.execute("SELECT id, name FROM devices")}
+        finally:
+            db.close()
+        return self
+
+    def start(self):
+        self.open()
+        self._thread = threading.Thread(target=self._run, name="history", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=10)
+
+    # Sampling
+
+    def sample(self, names=None):
+        """
+        Records the cached state of the given bulbs (all by default) if it changed.
+        """
+        now = time.time()
+        with self._lock:
+            for name in names if names is not None else list(self.fleet.states):
+                device = self._ids.get(name)
+                if device is None:
+                    continue
+                values = encode(self.fleet.states[name].snapshot())
+                if self._last.get(name) == values:
+                    continue
+                self._last[name] = values
+                self.buffer.append(now, device, values)
+            if self.buffer.count >= self.buffer.size // 2:
+                self._wake.set()
+
+    def on_outcome(self, outcome):
+        self.sample(list(outcome.results) + list(outcome.errors))
+
+    def on_props(self, name, props):
+        self.sample([name])
+
+    # Storage
+
+    def _run(self):
+        db = self._connect()
+        last_rollup = 0.0
+        while True:
+            stopping = self._stop.is_set()
+            try:
+                self.sample()  # Catches changes that arrived without a command outcome
+                self.flush(db)
+                if time.time() - last_rollup >= HOUR:
+                    self.downsample(db)
+                    last_rollup = time.time()
+            except sqlite3.Error as e:
+                print(f"History error: {e}")
+            if stopping:
+                break
+            self._wake.wait(FLUSH_INTERVAL)
+            self._wake.clear()
+        db.close()
+
+    def flush(self, db):
+        with self._db_lock:
+            with self._lock:
+                rows = self.buffer.drain()
+            if rows:
+                with db:
+                    db.executemany("INSERT INTO samples VALUES (?, ?, ?, ?, ?, ?)", rows)
+
+    def downsample(self, db, now=None):
+        """
+        Rolls complete hours of samples into hourly rows and deletes samples past RAW_RETENTION.
+        """
+        with self._db_lock:
+            self._downsample(db, time.time() if now is None else now)
+
+    def _downsample(self, db, now):
+        until = int(now // HOUR * HOUR)
+        row = db.execute("SELECT value FROM meta WHERE key = 'rolled_until'").fetchone()
+        rolled = row[0] if row else None
+        if rolled is None:
+            first = db.execute("SELECT min(ts) FROM samples").fetchone()[0]
+            if first is None:
+                return
+            rolled = int(first // HOUR * HOUR)
+        with db:
+            for device in self._ids.values():
+                anchor = db.execute(
+                    "SELECT power, brightness FROM samples WHERE device = ? AND ts < ? ORDER BY ts DESC LIMIT 1",
+                    (device, rolled),
+                ).fetchone()
+                rows = db.execute(
+                    "SELECT ts, power, brightness FROM samples WHERE device = ? AND ts >= ? AND ts < ? ORDER BY ts",
+                    (device, rolled, until),
+                ).fetchall()
+                if anchor is None and not rows:
+                    continue
+                hourly = []
+                first = 0
+                for hour in range(rolled, until, HOUR):
+                    last = first
+                    while last < len(rows) and rows[last][0] < hour + HOUR:
+                        last += 1
+                    hourly.append((device, hour) + summarize(rows[first:last], anchor, hour, hour + HOUR))
+                    if last > first:
+                        anchor = rows[last - 1][1:]
+                    first = last
+                db.executemany("INSERT OR REPLACE INTO hourly VALUES (?, ?, ?, ?, ?)", hourly)
+            db.execute("INSERT OR REPLACE INTO meta VALUES ('rolled_until', ?)", (until,))
+            # Keep the newest expired sample of each bulb: it is the state the retained ones start from
+            cutoff = now - RAW_RETENTION
+            db.execute(
+                "DELETE FROM samples WHERE ts < ? AND rowid NOT IN "
+                "(SELECT max(rowid) FROM samples WHERE ts < ? GROUP BY device)",
+                (cutoff, cutoff),
+            )
+
+    # Queries
+
+    def usage(self, name, start, end=None):
+        """
+        {"on_seconds", "on_ratio", "avg_brightness", "changes"} for a bulb over [start, end).
+
+        Spans before the last rollup are answered from hourly rows, so their edges are
+        rounded to whole hours.
+        """
+        end = time.time() if end is None else end
+        device = self._ids.get(name)
+        if device is None:
+            raise KeyError(name)
+        db = self._connect()
+        # Held across the buffer and database reads: a flush in between would count its samples twice
+        with self._db_lock:
+            try:
+                with self._lock:
+                    # Pending samples count too, without waiting for the next flush
+                    pending = [row for row in self.buffer.rows() if row[1] == device]
+                row = db.execute("SELECT value FROM meta WHERE key = 'rolled_until'").fetchone()
+                rolled = row[0] if row else start
+                on_seconds, brightness_seconds, changes = db.execute(
+                    "SELECT coalesce(sum(on_seconds), 0), coalesce(sum(brightness_seconds), 0), "
+                    "coalesce(sum(changes), 0) FROM hourly WHERE device = ? AND hour >= ? AND hour < ?",
+                    (device, int(start // HOUR * HOUR), min(rolled, end)),
+                ).fetchone()
+                raw_start = max(start, rolled)
+                if raw_start < end:
+                    anchor = db.execute(
+                        "SELECT power, brightness FROM samples WHERE device = ? AND ts < ? ORDER BY ts DESC LIMIT 1",
+                        (device, raw_start),
+                    ).fetchone()
+                    rows = db.execute(
+                        "SELECT ts, power, brightness FROM samples WHERE device = ? AND ts >= ? AND ts < ? "
+                        "ORDER BY ts",
+                        (device, raw_start, end),
+                    ).fetchall()
+                    rows += [(ts, power, brightness) for ts, _, power, brightness, _, _ in pending if ts < end]
+                    raw = summarize(rows, anchor, raw_start, end)
+                    on_seconds += raw[0]
+                    brightness_seconds += raw[1]
+                    changes += raw[2]
+            finally:
+                db.close()
+        span = max(end - start, 1)
+        return {
+            "on_seconds": int(on_seconds),
+            "on_ratio": round(on_seconds / span, 3),
+            "avg_brightness": round(brightness_seconds / on_seconds, 1) if on_seconds else None,
+            "changes": int(changes),
+        }
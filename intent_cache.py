@@ -0,0 +1,121 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from intent_parser import normalize
+
+INTENT_CACHE_FILE = "intent_cache.json"
+CACHE_SIZE = 256
+CACHE_TTL = 7 * 24 * 3600  # Seconds before a cached Dialogflow answer is asked again
+SAVE_DELAY = 5.0  # Seconds new entries are collected before one write of the file
+
+
+class IntentCache:
+    """
+    Bounded LRU cache of Dialogflow results keyed on the normalized utterance, persisted between runs.
+
+    Puts are written SAVE_DELAY later in one batch; call flush() before exiting.
+    """
+    def __init__(self, path=INTENT_CACHE_FILE, max_size=CACHE_SIZE, ttl=CACHE_TTL):
+        self.path = path
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # key -> (stored_at, result)
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._timer = None
+        self.load()
+
+    def get(self, text):
+        key = normalize(text)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.time() - entry[0] > self.ttl:
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, text, result):
+        with self._lock:
+            key = normalize(text)
+            self._entries[key] = (time.time(), result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+            self._dirty = True
+            if self._timer is None and self.path:
+                self._timer = threading.Timer(SAVE_DELAY, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def flush(self):
+        """
+        Writes entries put since the last save, if any.
+        """
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if not self._dirty:
+                return
+            self._dirty = False
+        self.save()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+        }
+
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                entries = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Error reading {self.path}: {e}")
+            return
+        if not isinstance(entries, list):
+            print(f"Ignoring {self.path}: expected a list of entries")
+            return
+        now = time.time()
+        skipped = 0
+        with self._lock:
+            for entry in entries[-self.max_size:]:
+                try:
+                    key, stored_at, result = entry
+                    if not isinstance(key, str) or not isinstance(result, dict) or "intent" not in result:
+                        raise ValueError(entry)
+                    if now - float(stored_at) <= self.ttl:
+                        self._entries[key] = (float(stored_at), result)
+                except (TypeError, ValueError):
+                    skipped += 1
+        if skipped:
+            print(f"Skipped {skipped} malformed entries in {self.path}")
+
+    def save(self):
+        if not self.path:
+            return
+        with self._lock:
+            entries = [[key, stored_at, result] for key, (stored_at, result) in self._entries.items()]
+        tmp = self.path + ".tmp"
+        try:
+            # Written aside and swapped in, so a crash never leaves a truncated file
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(entries, f, ensure_ascii=False)
+            os.replace(tmp, self.path)
+        except OSError as e:
+            print(f"Error saving {self.path}: {e}")
@@ -0,0 +1,144 @@
+import re
+
+LOCAL_CONFIDENCE = 0.8  # Below this the phrase goes to Dialogflow
+AMBIGUOUS_CONFIDENCE = 0.5  # Phrases matching several commands, e.g. a color and a brightness
+
+WAKE_WORD = "лампа"  # Also what wake_word.py spots in audio; defined only here
+
+_ADJECTIVE_ENDINGS = (
+    "ыми", "ими", "ого", "его", "ому", "ему",
+    "ый", "ий", "ой", "ая", "яя", "ое", "ее", "ую", "юю", "ым", "им", "ом", "ем", "ых", "их",
+)
+_NOMINATIVE_ENDINGS = ("ый", "ий", "ой")
+
+BRIGHTER = ("ярче", "поярче", "светлее", "посветлее", "прибавь", "увеличь", "повысь", "выше")
+DIMMER = ("темнее", "потемнее", "тусклее", "потусклее", "приглуши", "убавь", "уменьши", "понизь", "ниже")
+RAISE = ("выше", "повысь", "увеличь", "прибавь")  # Directions that follow "температура" when it is named
+LOWER = ("ниже", "понизь", "уменьши", "убавь")
+WARMER = ("теплее", "потеплее")
+COOLER = ("холоднее", "похолоднее")
+BRIGHTNESS_WORDS = ("яркость", "яркости", "процент", "процентов", "процента")
+TEMPERATURE_WORDS = ("температура", "температуру", "температуры", "кельвин", "кельвинов", "кельвина")
+NAMED_TEMPERATURES = {"теплый": 2700, "нейтральный": 4000, "холодный": 6500, "дневной": 6500}
+PRESET_WORDS = ("режим", "пресет", "сцена", "сцену")
+MAXIMUM = ("максимум", "максимальную", "полную")
+MINIMUM = ("минимум", "минимальную")
+
+
+def normalize(text):
+    """
+    Lowercases, replaces ё with е, strips punctuation and collapses whitespace.
+    """
+    text = text.lower().replace("ё", "е")
+    text = re.sub(r"[^\w\s-]", " ", text)
+    return " ".join(text.split())
+
+
+def adjective_forms(word):
+    """
+    The word itself followed by its likely nominative masculine forms, e.g. "красную" -> "красный".
+    """
+    forms = [word]
+    for ending in _ADJECTIVE_ENDINGS:
+        if word.endswith(ending) and len(word) > len(ending) + 2:
+            stem = word[:-len(ending)]
+            forms.extend(stem + nominative for nominative in _NOMINATIVE_ENDINGS)
+            break
+    return forms
+
+
+class LocalIntentParser:
+    """
+    Keyword matcher for the intents handled by MiHomeApp.advanced_commands.
+
+    Returns the same {"intent", "parameters", "confidence"} dict as VoiceProcessor.process_query,
+    or None when nothing matched. A phrase matching more than one command gets
+    AMBIGUOUS_CONFIDENCE, so it goes to Dialogflow instead of running half of it.
+    """
+    def __init__(self, color_lookup=None, presets=()):
+        self.color_lookup = color_lookup
+        self.presets = {normalize(name) for name in presets}
+
+    def parse(self, text):
+        words = normalize(text).split()
+        if WAKE_WORD in words:
+            words.remove(WAKE_WORD)
+        if not words:
+            return None
+        results = [
+            result for result in (matcher(words) for matcher in (self._preset, self._temperature,
+                                                                  self._brightness, self._color))
+            if result is not None
+        ]
+        if not results:
+            return None
+        intent, parameters, confidence = results[0]
+        if len(results) > 1:
+            confidence = min(confidence, AMBIGUOUS_CONFIDENCE)
+        return {"intent": intent, "parameters": parameters, "confidence": confidence}
+
+    @staticmethod
+    def _number(words, low, high):
+        """
+        First number in [low, high], so "температура 4000 яркость 50" yields both values.
+        """
+        for word in words:
+            if word.isdigit() and low <= int(word) <= high:
+                return int(word)
+        return None
+
+    def _preset(self, words):
+        found = [word for word in words if word in self.presets]
+        if not found:
+            return None
+        confidence = 1.0 if any(w in PRESET_WORDS for w in words) else 0.9
+        if len(set(found)) > 1:
+            confidence = AMBIGUOUS_CONFIDENCE  # "день и ночь"
+        return "preset.activate", {"preset": found[0]}, confidence
+
+    def _temperature(self, words):
+        named = any(w in TEMPERATURE_WORDS for w in words)
+        value = self._number(words, 1700, 6500)
+        if named and value is not None:
+            return "temperature.set", {"temp": value}, 1.0
+        if any(w in COOLER for w in words) or named and any(w in RAISE for w in words):
+            return "temperature.set", {"operation": "выше"}, 0.9
+        if any(w in WARMER for w in words) or named and any(w in LOWER for w in words):
+            return "temperature.set", {"operation": "ниже"}, 0.9
+        for word in words:
+            for form in adjective_forms(word):
+                if form in NAMED_TEMPERATURES:
+                    return "temperature.set", {"temp": NAMED_TEMPERATURES[form]}, 0.9
+        return None
+
+    def _brightness(self, words):
+        # With "температура" in the phrase, "выше" and "ниже" belong to the temperature
+        directions = not any(w in TEMPERATURE_WORDS for w in words)
+        if directions and any(w in BRIGHTER for w in words):
+            return "brightness.adjust", {"operation": "выше"}, 0.9
+        if directions and any(w in DIMMER for w in words):
+            return "brightness.adjust", {"operation": "ниже"}, 0.9
+        if any(w in BRIGHTNESS_WORDS for w in words):
+            value = self._number(words, 1, 100)
+            if value is None and any(w in MAXIMUM for w in words):
+                value = 100
+            if value is None and any(w in MINIMUM for w in words):
+                value = 1
+            if value is not None:
+                return "brightness.adjust", {"operation": "value", "value": value}, 1.0
+        return None
+
+    def _color(self, words):
+        if self.color_lookup is None:
+            return None
+        # Two-word compounds first, e.g. "темно зеленый"
+        phrases = [f"{a} {b}" for a, b in zip(words, words[1:])] + words
+        for phrase in phrases:
+            code = self.color_lookup(phrase)
+            if code is not None:
+                confidence = 1.0 if code["name"] == phrase else 0.9
+                used = phrase.split()
+                if any(self.color_lookup(word) is not None for word in words if word not in used):
+                    confidence = AMBIGUOUS_CONFIDENCE  # Two colors, e.g. "красный и синий"
+                return "color.set", {"color": phrase}, confidence
+        return None
@@ -0,0 +1,566 @@
+import json
+import os
+import socket
+import threading
+from concurrent.futures import Future, wait
+
+from device_executor import BACKGROUND, USER, CommandDropped, DeviceNotConnected, ExecutorClosed
+from device_session import ManagedSession
+from device_state import DeviceState, power_job, refresh_job, toggle_job, write_job
+from circadian import Circadian, CircadianCurve
+from colors import lookup_color
+from command_trace import TraceRecorder, recorded, source
+from effects import FramePlayer, compile_effect, flow_job, stop_job
+from fleet import DEFAULT_DEVICE, DeviceRegistry, Fleet, gather
+from history import History
+from metrics import METRICS
+from scenes import load_presets, preset_to_scene, scene_job
+from scheduler import Scheduler
+
+CONFIG_FILE = "config.json"
+POLL_INTERVAL = 30.0  # Seconds between background reconciliations of the cached state
+PROBE_INTERVAL = 1.0  # Seconds between checks for bulbs whose circuit is due for a health probe
+MIIO_TIMEOUT = 2  # Seconds per miio request and per handshake
+MIIO_RETRIES = 1  # miio's own resends (each with a fresh handshake); backoff is left to the managed session
+# A bulb that is away fails each session attempt at the handshake, after MIIO_TIMEOUT, so a command
+# to it fails after about 7 s (three attempts plus backoff) and three such commands open the circuit.
+TEMP_STEP = 500  # Kelvin per "температура выше"/"ниже"
+MIN_TEMP = 1700
+MAX_TEMP = 6500
+NEUTRAL_TEMP = 4000
+PLAYER_STOP_TIMEOUT = 10.0  # Seconds a new effect waits for the frame players it replaces
+
+_yeelight_class = None
+
+
+def yeelight_class():
+    """
+    Yeelight with a short request timeout; python-miio is imported on first use, off the UI thread.
+    """
+    global _yeelight_class
+    if _yeelight_class is None:
+        from miio import Yeelight
+        from miio.exceptions import DeviceException
+        from miio.miioprotocol import MiIOProtocol
+
+        class BoundedProtocol(MiIOProtocol):
+            def send_handshake(self, *, retry_count=0):
+                # miio's handshake waits a fixed 5 s; this one waits the request timeout
+                m = MiIOProtocol.discover(self.ip, timeout=self._timeout)
+                if m is None:
+                    raise DeviceException(f"Unable to discover the device {self.ip}") from socket.timeout()
+                header = m.header.value
+                self._device_id = header.device_id
+                self._device_ts = header.ts
+                self._discovered = True
+                return m
+
+        def __init__(self, *args, **kwargs):
+            Yeelight.__init__(self, *args, **kwargs)
+            self._protocol.__class__ = BoundedProtocol
+
+        # Yeelight.__init__ takes no timeout; Device reads both from class attributes
+        _yeelight_class = type("ManagedYeelight", (Yeelight,), {
+            "timeout": MIIO_TIMEOUT, "retry_count": MIIO_RETRIES, "__init__": __init__,
+        })
+    return _yeelight_class
+
+
+def create_yeelight(ip, token, model):
+    """
+    A managed session that builds the Yeelight lazily and rebuilds it after an outage.
+    """
+    return ManagedSession(lambda: yeelight_class()(ip=ip, token=token, model=model))
+
+
+def device_errors():
+    """
+    Exceptions expected from bulbs and the network, as opposed to bugs in a job.
+    """
+    from miio.exceptions import DeviceException
+
+    return (DeviceException, DeviceNotConnected, CommandDropped, ExecutorClosed, OSError)
+
+
+class LampEngine:
+    """
+    UI-free core shared by the Tk apps and the headless daemon: config, bulbs, commands and intents.
+
+    Results are delivered through dispatch(func, *args), e.g. a root.after wrapper in
+    the Tk apps; by default callbacks run on the executor threads.
+    """
+    def __init__(self, config_file=CONFIG_FILE, dispatch=None):
+        self.config_file = config_file
+        self.dispatch = dispatch or (lambda func, *args: func(*args))
+        self.state_listeners = []  # Called with the outcome after every command
+        self.props_listeners = []  # Called with (name, props) for LAN notifications
+        self.load_config()
+
+        self.fleet = Fleet(self.registry)
+        targets = self.registry.targets()
+        self.target = targets[0] if targets else DEFAULT_DEVICE
+        self._stop = threading.Event()
+        self.scheduler = None  # Created by start_automation() when config.json has a schedule
+        self.circadian = None
+        self._players = {}  # Client-side effects playing, per bulb
+        self.history = None  # Created by start() when config.json sets "HISTORY_DB"
+        trace_file = self.config.get("TRACE_FILE")
+        self.recorder = TraceRecorder(trace_file) if trace_file else None  # Opt-in command trace for replay.py
+
+        self.setup_advanced_commands()
+
+    def load_config(self):
+        self.config = {}
+        if os.path.exists(self.config_file):
+            try:
+                with open(self.config_file, "r", encoding="utf-8") as f:
+                    self.config = json.load(f)
+            except json.JSONDecodeError:
+                print(f"Error reading {self.config_file}.")
+        else:
+            print(f"{self.config_file} not found.")
+        self.DEVICE_IP = self.config.get("DEVICE_IP")
+        self.DEVICE_TOKEN = self.config.get("DEVICE_TOKEN")
+        self.MODEL = self.config.get("MODEL")
+        self.registry = DeviceRegistry.from_config(self.config)
+        self.presets = load_presets(self.config)
+
+    def save_config(self):
+        self.registry.add(DEFAULT_DEVICE, self.DEVICE_IP, self.DEVICE_TOKEN, self.MODEL)
+        self.config = self.registry.to_config(dict(self.config))
+        try:
+            with open(self.config_file, "w", encoding="utf-8") as f:
+                json.dump(self.config, f, indent=4, ensure_ascii=False)
+            print("Settings saved successfully.")
+        except Exception as e:
+            print(f"Error saving settings: {e}")
+
+    def update_default_device(self, ip, token, model):
+        """
+        Stores new settings for the default bulb and reconnects it.
+        """
+        self.DEVICE_IP = ip
+        self.DEVICE_TOKEN = token
+        self.MODEL = model
+        self.save_config()
+        return self.connect(DEFAULT_DEVICE)
+
+    def start(self):
+        """
+        Connects every bulb and starts background polling and health probes, plus LAN notifications,
+        automation and the state history when configured.
+        """
+        self.start_metrics()
+        self.connect()
+        if self.config.get("DISCOVERY", True):
+            threading.Thread(target=self._resolve_devices, name="discovery", daemon=True).start()
+        threading.Thread(target=self._poll_loop, name="state-poll", daemon=True).start()
+        threading.Thread(target=self._probe_loop, name="health-probe", daemon=True).start()
+        if self.config.get("LAN_EVENTS"):
+            self.fleet.listen(self._on_props)
+        self.start_automation()
+        if self.config.get("HISTORY_DB"):
+            self.history = History(self.config["HISTORY_DB"], self.fleet).start()
+            self.state_listeners.append(self.history.on_outcome)
+            self.props_listeners.append(self.history.on_props)
+
+    def stop(self):
+        self._stop.set()
+        if self.scheduler:
+            self.scheduler.stop()
+        if self.recorder:
+            self.recorder.close()
+        if self.history:
+            self.history.stop()
+
+    def start_automation(self):
+        """
+        Schedules the "SCHEDULE" entries and the "CIRCADIAN" curve on one scheduler thread.
+
+        A schedule entry holds "at": "HH:MM", an optional "target" and either a "preset"
+        name, scene values ("brightness" with "rgb" or "temp") or "power": true/false.
+        """
+        entries = self.config.get("SCHEDULE", [])
+        try:
+            curve = CircadianCurve.from_config(self.config)
+        except (KeyError, TypeError, ValueError) as e:
+            print(f"Invalid circadian curve: {e}")
+            curve = None
+        if not entries and curve is None:
+            return
+        self.scheduler = Scheduler()
+        for entry in entries:
+            try:
+                self.scheduler.daily(entry["at"], self.run_scheduled, entry)
+            except (KeyError, TypeError, ValueError) as e:
+                print(f"Invalid schedule entry {entry}: {e}")
+        if curve is not None:
+            section = self.config["CIRCADIAN"]
+            target = section.get("target") if isinstance(section, dict) else None
+            self.circadian = Circadian(self, self.scheduler, curve, target)
+            self.circadian.start()
+
+    def run_scheduled(self, entry):
+        target = entry.get("target")
+        if "power" in entry:
+            with source("schedule"):
+                return self.set_power(bool(entry["power"]), target)
+        if "preset" in entry:
+            scene = self.presets.get(str(entry["preset"]).lower())
+            if scene is None:
+                print(f"Unknown preset: {entry['preset']}")
+                return None
+        else:
+            scene = preset_to_scene(entry)
+        with source("schedule"):
+            return self.apply_scene(target, **scene)
+
+    def start_metrics(self):
+        """
+        Enables METRICS when config.json sets "METRICS_PORT" (Prometheus /metrics) or "METRICS_DUMP" (JSON file).
+        """
+        port = self.config.get("METRICS_PORT")
+        dump = self.config.get("METRICS_DUMP")
+        if not port and not dump:
+            return
+        METRICS.enabled = True
+        METRICS.gauge("executor_queue_depth", lambda: {
+            (("device", executor.name),): executor.stats()["depth"] for executor in self.fleet.executors.values()
+        })
+        METRICS.gauge("quota_tokens", lambda: {
+            (("device", executor.name),): executor.quota.available() for executor in self.fleet.executors.values()
+        })
+        METRICS.gauge("circuit_open", lambda: {
+            (("device", self.fleet.executors[name].name),): int(stats["session"]["circuit"] != "closed")
+            for name, stats in self.fleet.stats().items() if "session" in stats
+        })
+        if port:
+            METRICS.serve(int(port))
+        if dump:
+            METRICS.start_dump(dump, float(self.config.get("METRICS_INTERVAL", 60)))
+
+    @property
+    def state(self):
+        """
+        Cached state of the first bulb of the selected device or group.
+        """
+        members = self.registry.members(self.target) if self.registry.devices else []
+        return self.fleet.states[members[0]] if members else DeviceState()
+
+    def select_target(self, target):
+        self.registry.members(target)  # Raises KeyError for unknown names
+        self.target = target
+        return self.update_status()
+
+    # Plumbing
+
+    def run(self, future, on_success=None, on_error=None):
+        future.add_done_callback(lambda f: self.dispatch(self.finish, f, on_success, on_error))
+        return future
+
+    def finish(self, future, on_success, on_error):
+        """
+        Reports an outcome; runs in dispatch, e.g. a Tk after callback, so it never raises.
+        """
+        outcome = future.result()
+        for name, e in outcome.errors.items():
+            METRICS.error("command_errors_total", e, device=self.fleet.executors[name].name)
+            if on_error:
+                on_error(name, e)
+            elif isinstance(e, device_errors()):
+                print(f"Error [{name}]: {e}")
+            else:
+                print(f"Unexpected error [{name}]: {type(e).__name__}: {e}")
+        if on_success and outcome.results:
+            on_success(outcome)
+        for listener in self.state_listeners:
+            listener(outcome)
+
+    def send(self, make_job, on_success=None, on_error=None, priority=USER, key=None, target=None, cost=1):
+        """
+        Fans make_job(state) out to every bulb of the target (the selected one by default).
+
+        cost is the most commands one job may send, e.g. 2 for a status read and a write.
+        """
+        future = self.fleet.submit(target or self.target, make_job, priority, key, cost)
+        return self.run(future, on_success, on_error)
+
+    def connect(self, target=None):
+        """
+        Rebuilds the Yeelight instances on their device executor threads.
+        """
+        return self.run(self.fleet.connect(create_yeelight, target), self.on_connected, self.on_connect_error)
+
+    def on_connected(self, outcome):
+        print(f"Connected: {', '.join(outcome.results)}")
+        self.update_status()
+
+    def on_connect_error(self, name, e):
+        print(f"Connection error [{name}]: {e}")
+
+    def update_status(self, priority=USER, target=None):
+        return self.send(refresh_job, on_error=self.on_status_error, priority=priority, key="status", target=target)
+
+    def on_status_error(self, name, e):
+        if isinstance(e, CommandDropped):
+            return
+        if not isinstance(e, DeviceNotConnected):
+            print(f"Status error [{name}]: {e}")
+        # The session stays; the health probe restores the state once the bulb answers again
+        self.fleet.states[name].clear()
+
+    def _resolve_devices(self):
+        """
+        Checks the configured IPs and follows bulbs that DHCP moved, using device_index.json.
+        """
+        from discovery import DeviceIndex, resolve
+
+        moved = resolve(self.registry, DeviceIndex())
+        if moved:
+            self.dispatch(self.apply_moves, moved)
+
+    def apply_moves(self, moved):
+        for name, ip in moved.items():
+            print(f"Device {name} moved to {ip}")
+            self.registry.devices[name]["ip"] = ip
+            if name == DEFAULT_DEVICE:
+                self.DEVICE_IP = ip
+            self.connect(name)
+        self.save_config()
+
+    def _poll_loop(self):
+        while not self._stop.wait(POLL_INTERVAL):
+            self.poll_stale()
+
+    def poll_stale(self, max_age=POLL_INTERVAL):
+        """
+        Refreshes every bulb whose cached state is older than max_age, not only the selected one.
+
+        Returns {name: future} of the refreshes sent.
+        """
+        return {
+            name: self.update_status(BACKGROUND, target=name)
+            for name, state in list(self.fleet.states.items())
+            if name in self.registry.devices and not state.is_fresh(max_age)
+        }
+
+    def _probe_loop(self):
+        while not self._stop.wait(PROBE_INTERVAL):
+            for name, executor in list(self.fleet.executors.items()):
+                session = executor.device
+                if isinstance(session, ManagedSession) and session.probe_due():
+                    self.update_status(BACKGROUND, target=name)
+
+    def _on_props(self, name, props):
+        for listener in self.props_listeners:
+            self.dispatch(listener, name, props)
+
+    # Commands; target defaults to the selected device or group
+
+    @recorded
+    def toggle_power(self, target=None):
+        members = self.registry.members(target or self.target) if self.registry.devices else []
+        power = self.fleet.states[members[0]].power if members else None
+        if power is None:
+            return self.send(toggle_job, target=target, cost=2)
+        # A whole group follows its first bulb
+        return self.set_power(not power, target)
+
+    @recorded
+    def set_power(self, on, target=None):
+        return self.send(lambda state: power_job(state, on), key="power", target=target)
+
+    @recorded
+    def set_brightness(self, value, on_success=None, target=None):
+        value = int(float(value))
+        return self.send(lambda state: write_job(state, "brightness", value, "set_brightness"), on_success,
+                         key="brightness", target=target)
+
+    @recorded
+    def set_color_temp(self, value, on_success=None, target=None):
+        value = int(float(value))
+        return self.send(lambda state: write_job(state, "color_temp", value, "set_color_temp"), on_success,
+                         key="color", target=target)
+
+    @recorded
+    def set_rgb(self, rgb, on_success=None, target=None):
+        rgb = tuple(rgb)
+        return self.send(lambda state: write_job(state, "rgb", rgb, "set_rgb"), on_success, key="color", target=target)
+
+    @recorded
+    def apply_scene(self, target=None, **scene):
+        # Brightness alone on a bulb that is off may take on() and set_brightness
+        cost = 1 if "rgb" in scene or "color_temp" in scene else 2
+        return self.send(lambda state: scene_job(state, **scene), key="scene", target=target, cost=cost)
+
+    @recorded
+    def play_effect(self, name, target=None, **params):
+        """
+        Runs a named effect from effects.EFFECTS, as one start_cf command when the bulb can play it itself.
+
+        Raises KeyError for unknown effects and TypeError for unknown parameters.
+        """
+        flow = compile_effect(name, **params)
+        members = self.registry.members(target or self.target)
+        previous = self._stop_players(members)
+        if flow.native:
+            return self._after(previous, lambda: self.send(lambda state: flow_job(state, flow), key="effect",
+                                                           target=target))
+        players = {member: FramePlayer(self.fleet, member, flow) for member in members}
+        self._players.update(players)
+        return self._after(previous, lambda: self.run(gather({
+            member: player.start().future for member, player in players.items()
+        })))
+
+    @recorded
+    def stop_effect(self, target=None):
+        previous = self._stop_players(self.registry.members(target or self.target))
+        return self._after(previous, lambda: self.send(stop_job, key="effect", target=target, cost=2))
+
+    def _stop_players(self, members):
+        players = [self._players.pop(member) for member in members if member in self._players]
+        for player in players:
+            player.stop()
+        return players
+
+    def _after(self, players, start):
+        """
+        Calls start() once the stopped players have shut down and returns a future of its result.
+
+        A player's last frames and its set_music [0] would otherwise land after the next
+        effect started and end it. The wait runs off the caller's thread.
+        """
+        if not players:
+            return start()
+        result = Future()
+
+        def run():
+            wait([player.future for player in players], timeout=PLAYER_STOP_TIMEOUT)
+            try:
+                future = start()
+            except Exception as e:
+                result.set_exception(e)
+                return
+            future.add_done_callback(
+                lambda f: result.set_exception(f.exception()) if f.exception() else result.set_result(f.result())
+            )
+
+        threading.Thread(target=run, name="effect-handover", daemon=True).start()
+        return result
+
+    # Intents, shared by voice control and the daemon
+
+    def setup_advanced_commands(self):
+        """
+        Maps intents to advanced command methods.
+        """
+        self.advanced_commands = {
+            'brightness.adjust': self.adjust_brightness,
+            'color.set': self.set_advanced_color,
+            'preset.activate': self.activate_preset,
+            'temperature.set': self.advanced_set_temp,
+        }
+
+    @recorded
+    def adjust_brightness(self, params):
+        """
+        Adjusts brightness based on the provided parameters.
+        """
+        operation = params.get('operation', 'value')
+        value = None
+        if operation not in ('выше', 'ниже'):
+            # Parsed here: a bad value raised inside the job would only surface on the executor
+            try:
+                value = int(float(params.get('value', 0)))
+            except (TypeError, ValueError, OverflowError):
+                value = 0
+            if not 1 <= value <= 100:
+                print(f"Unknown brightness: {params.get('value')}")
+                return None
+
+        def make_job(state):
+            def adjust(device):
+                if device is None:
+                    raise DeviceNotConnected("Device is not connected")
+                if not state.known:
+                    state.update_from_status(device.status())
+                current = state.brightness
+                if operation == 'выше':
+                    new_value = min(current + 10, 100)
+                elif operation == 'ниже':
+                    new_value = max(current - 10, 1)
+                else:
+                    new_value = value
+                if new_value and new_value != current:
+                    device.set_brightness(new_value)
+                    state.apply(brightness=new_value)
+                    print(f"Brightness set to: {new_value}")
+                return state
+            return adjust
+
+        return self.send(make_job, cost=2)
+
+    @recorded
+    def set_advanced_color(self, params):
+        """
+        Sets the device color using a provided color name.
+        """
+        color = params.get('color')
+        code = lookup_color(color) if isinstance(color, str) else None
+        if code is None:
+            print(f"Unknown color format: {color}")
+            return None
+        rgb = code['rgb']
+        print(f"Color set to: {color} ({code['name']}), RGB={rgb}")
+        return self.send(lambda state: scene_job(state, rgb=rgb), key="color")
+
+    @recorded
+    def activate_preset(self, params):
+        """
+        Activates a preset from config.json as a single set_scene command.
+        """
+        preset_name = params.get('preset')
+        scene = self.presets.get((preset_name or '').lower())
+        if scene:
+            return self.apply_scene(**scene)
+        print(f"Unknown preset: {preset_name}")
+        return None
+
+    @recorded
+    def advanced_set_temp(self, params):
+        """
+        Sets the color temperature using voice command parameters; "выше"/"ниже" step it by TEMP_STEP.
+        """
+        operation = params.get('operation', 'value')
+        if operation in ('выше', 'ниже'):
+            step = TEMP_STEP if operation == 'выше' else -TEMP_STEP
+
+            def make_job(state):
+                def adjust(device):
+                    if device is None:
+                        raise DeviceNotConnected("Device is not connected")
+                    if not state.known:
+                        state.update_from_status(device.status())
+                    # A bulb in RGB mode starts from neutral white
+                    new_value = max(MIN_TEMP, min(MAX_TEMP, (state.color_temp or NEUTRAL_TEMP) + step))
+                    print(f"Temperature set to: {new_value}K")
+                    return scene_job(state, color_temp=new_value)(device)
+                return adjust
+
+            return self.send(make_job, key="color", cost=2)
+        temp = params.get('temp')
+        try:
+            temp = int(float(temp))
+        except (TypeError, ValueError):
+            print(f"Unknown temperature: {temp}")
+            return None
+        print(f"Temperature set to: {temp}K")
+        return self.send(lambda state: scene_job(state, color_temp=temp), key="color")
+
+    @recorded
+    def run_intent(self, intent, params):
+        """
+        Runs an intent handler; returns its future, or None if the intent is unknown or invalid.
+        """
+        handler = self.advanced_commands.get(intent)
+        return handler(params) if handler else None
@@ -0,0 +1,200 @@
+import time
+
+STARTED = time.perf_counter()
+
+import json
+import sys
+
+from command_trace import set_source
+from lamp_engine import LampEngine
+
+COMMAND_TIMEOUT = 10  # Seconds a one-shot command waits for the bulbs
+REQUIRED_ARGS = {"brightness": 1, "temp": 1, "rgb": 3, "preset": 1, "effect": 1, "say": 1}
+COMMANDS = ("status", "on", "off", "toggle", *REQUIRED_ARGS, "history", "discover", "daemon", "serve")
+
+USAGE = """Usage: python lampd.py [--target NAME] COMMAND
+  status | on | off | toggle
+  brightness 1-100 | temp 1700-6500 | rgb R G B | preset NAME
+  effect NAME [KEY=VALUE...] | effect stop
+                       e.g. effect breathe rgb=[255,0,0] period=3000
+  say TEXT...          run a Russian voice phrase through the intent parser
+  history [HOURS]      on-time, average brightness and changes per bulb (needs HISTORY_DB)
+  discover             list bulbs on the LAN and follow configured ones that moved
+  daemon [--voice]     keep the bulbs connected and polled, optionally with voice control
+  serve [HOST] [PORT]  daemon with the local HTTP/WebSocket API (needs aiohttp)"""
+
+
+def wait(future):
+    """
+    Waits for a fleet command; returns False when any bulb failed.
+    """
+    if future is None:
+        return False
+    outcome = future.result(timeout=COMMAND_TIMEOUT)
+    return not outcome.errors
+
+
+def print_status(engine):
+    for name in engine.registry.members(engine.target):
+        state = engine.fleet.states[name]
+        values = ", ".join(f"{prop}={value}" for prop, value in state.snapshot().items())
+        print(f"{name}: {values}" if state.known else f"{name}: unknown")
+
+
+def print_history(engine, hours):
+    from history import History
+
+    path = engine.config.get("HISTORY_DB")
+    if not path:
+        print("Set \"HISTORY_DB\" in config.json to record the state history.")
+        return 1
+    history = History(path, engine.fleet).open()
+    start = time.time() - hours * 3600
+    for name in engine.registry.members(engine.target):
+        usage = history.usage(name, start)
+        brightness = usage["avg_brightness"] if usage["avg_brightness"] is not None else "-"
+        print(f"{name}: on {usage['on_seconds'] / 3600:.1f} h ({usage['on_ratio']:.0%}), "
+              f"average brightness {brightness}, {usage['changes']} changes in {hours:g} h")
+    return 0
+
+
+def run_command(engine, command, args):
+    if command == "status":
+        return wait(engine.update_status())
+    if command in ("on", "off"):
+        return wait(engine.set_power(command == "on"))
+    if command == "toggle":
+        wait(engine.update_status())
+        return wait(engine.toggle_power())
+    if command == "brightness":
+        return wait(engine.set_brightness(args[0]))
+    if command == "temp":
+        return wait(engine.set_color_temp(args[0]))
+    if command == "rgb":
+        return wait(engine.set_rgb([int(value) for value in args[:3]]))
+    if command == "preset":
+        return wait(engine.activate_preset({"preset": " ".join(args)}))
+    if command == "effect":
+        if args[:1] == ["stop"]:
+            return wait(engine.stop_effect())
+        params = {}
+        for arg in args[1:]:
+            key, _, value = arg.partition("=")
+            try:
+                params[key] = json.loads(value)
+            except json.JSONDecodeError:
+                params[key] = value
+        future = engine.play_effect(args[0], **params)
+        # Effects the bulb cannot run itself play from here until they end
+        return not future.result().errors
+    if command == "say":
+        from colors import lookup_color
+        from intent_parser import LocalIntentParser
+        from voice_engine import VoiceProcessor
+
+        processor = VoiceProcessor(LocalIntentParser(lookup_color, engine.presets),
+                                   endpoint=engine.config.get("DIALOGFLOW_ENDPOINT"))
+        result = processor.process_query(" ".join(args))
+        processor.cache.flush()
+        if not result:
+            print("No intent recognized.")
+            return False
+        print(f"Intent: {result['intent']}, Params: {result['parameters']}, Conf: {result['confidence']}")
+        return wait(engine.run_intent(result["intent"], result["parameters"]))
+    raise ValueError(f"Unknown command: {command}")
+
+
+def daemon(engine, voice=False):
+    engine.start()
+    control = None
+    if voice:
+        from voice_engine import VoiceControl
+
+        control = VoiceControl(engine)
+        control.start()
+    print(f"Engine ready in {(time.perf_counter() - STARTED) * 1000:.0f} ms")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if control:
+            control.stop()
+        engine.stop()
+
+
+def usage_error(message):
+    print(message)
+    print(USAGE)
+    return 2
+
+
+def main(args):
+    if args[:1] == ["--target"]:
+        if len(args) < 2:
+            return usage_error("--target needs a device or group name")
+        target, args = args[1], args[2:]
+    else:
+        target = None
+    if not args or args[0] in ("-h", "--help"):
+        print(USAGE)
+        return 0
+    if args[0] not in COMMANDS:
+        return usage_error(f"Unknown command: {args[0]}")
+    if len(args) - 1 < REQUIRED_ARGS.get(args[0], 0):
+        return usage_error(f"{args[0]} needs {REQUIRED_ARGS[args[0]]} argument(s)")
+    set_source("cli")
+    engine = LampEngine()
+    if target:
+        if target not in engine.registry.targets():
+            print(f"Unknown device or group: {target}")
+            return 2
+        engine.target = target
+    command, args = args[0], args[1:]
+    if command == "discover":
+        from discovery import DeviceIndex, discover, resolve
+
+        index = DeviceIndex()
+        for record in discover():
+            index.update(record)
+            print(f"{record['did']}: {record['ip']} {record.get('model') or ''}")
+        moved = resolve(engine.registry, index)
+        if moved:
+            engine.apply_moves(moved)
+        return 0
+    if command == "history":
+        try:
+            hours = float(args[0]) if args else 24
+        except ValueError:
+            return usage_error(f"Expected hours as a number: {args[0]}")
+        return print_history(engine, hours)
+    if command == "daemon":
+        daemon(engine, voice="--voice" in args)
+        return 0
+    if command == "serve":
+        import asyncio
+
+        from api_server import serve
+
+        try:
+            asyncio.run(serve(engine, *args[:2]))
+        except KeyboardInterrupt:
+            pass
+        return 0
+    if not wait(engine.connect(engine.target)):
+        return 1
+    try:
+        ok = run_command(engine, command, args)
+    except (KeyError, TypeError, ValueError) as e:
+        # Non-numeric values, or an unknown effect or effect parameter
+        return usage_error(f"Invalid argument: {e}")
+    if ok and command != "status":
+        wait(engine.update_status())
+    print_status(engine)
+    print(f"Done in {(time.perf_counter() - STARTED) * 1000:.0f} ms")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,127 @@
+import json
+import socket
+import threading
+import time
+
+LAN_PORT = 55443  # Yeelight LAN control port, needs "LAN Control" enabled in the Yeelight app
+RECONNECT_DELAY = 5.0
+READ_TIMEOUT = 1.0
+CHECK_INTERVAL = 20.0  # Seconds of silence before get_prop checks the connection; below the engine's POLL_INTERVAL
+CHECK_TIMEOUT = 5.0  # Seconds to wait for that answer before reconnecting
+STATUS_PROPS = ("power", "bright", "ct", "rgb", "color_mode")
+
+COLOR_MODE_RGB = 1
+COLOR_MODE_CT = 2
+
+
+def parse_props(params):
+    """
+    Converts a Yeelight "props" notification into DeviceState properties.
+    """
+    props = {}
+    if "power" in params:
+        props["power"] = params["power"] == "on"
+    if "bright" in params:
+        props["brightness"] = int(params["bright"])
+    mode = int(params.get("color_mode", 0))
+    if "rgb" in params and mode in (0, COLOR_MODE_RGB):
+        value = int(params["rgb"])
+        props["rgb"] = ((value >> 16) & 0xFF, (value >> 8) & 0xFF, value & 0xFF)
+    if "ct" in params and mode in (0, COLOR_MODE_CT):
+        props["color_temp"] = int(params["ct"])
+    return props
+
+
+class NotificationListener:
+    """
+    Keeps the bulb's LAN control TCP connection open and feeds "props" notifications into a DeviceState.
+
+    Each connection starts with a get_prop over the same channel, which refreshes a
+    cache that may have gone stale while disconnected. The cache only counts as fresh
+    after a notification or an answered get_prop; a quiet connection is checked every
+    CHECK_INTERVAL and dropped when the check goes unanswered. While it answers,
+    status() polling is not needed.
+    """
+    def __init__(self, ip, state, on_change=None, port=LAN_PORT):
+        self.ip = ip
+        self.port = port
+        self.state = state
+        self.on_change = on_change
+        self.connected = False
+        self._check_id = 0
+        self._check_sent = None  # Time of the unanswered get_prop, if any
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"lan-events-{ip}", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                with socket.create_connection((self.ip, self.port), timeout=RECONNECT_DELAY) as sock:
+                    sock.settimeout(READ_TIMEOUT)
+                    self.connected = True
+                    self._listen(sock)
+            except OSError as e:
+                if not self._stop.is_set():
+                    print(f"LAN events error [{self.ip}]: {e}")
+            finally:
+                self.connected = False
+            self._stop.wait(RECONNECT_DELAY)
+
+    def _listen(self, sock):
+        buffer = b""
+        self._check(sock)
+        last_message = time.monotonic()
+        while not self._stop.is_set():
+            try:
+                chunk = sock.recv(4096)
+            except socket.timeout:
+                now = time.monotonic()
+                if self._check_sent is not None:
+                    if now - self._check_sent > CHECK_TIMEOUT:
+                        raise ConnectionError("No answer to get_prop")
+                elif now - last_message >= CHECK_INTERVAL:
+                    self._check(sock)
+                continue
+            last_message = time.monotonic()
+            if not chunk:
+                raise ConnectionError("Connection closed by the bulb")
+            buffer += chunk
+            *lines, buffer = buffer.split(b"\r\n")
+            for line in lines:
+                self._handle(line)
+
+    def _check(self, sock):
+        self._check_id += 1
+        request = {"id": self._check_id, "method": "get_prop", "params": list(STATUS_PROPS)}
+        sock.sendall(json.dumps(request).encode() + b"\r\n")
+        self._check_sent = time.monotonic()
+
+    def _handle(self, line):
+        try:
+            message = json.loads(line)
+        except ValueError:
+            return
+        if message.get("id") == self._check_id:
+            self._check_sent = None  # Answered, even with an error: the connection is alive
+            if not isinstance(message.get("result"), list):
+                return
+            # Properties a model lacks read as ""
+            params = {name: value for name, value in zip(STATUS_PROPS, message["result"]) if value != ""}
+        elif message.get("method") == "props":
+            params = message.get("params", {})
+        else:
+            return
+        props = parse_props(params)
+        if not props:
+            return
+        self.state.apply(**props)
+        self.state.touch()
+        if self.on_change:
+            self.on_change(props)
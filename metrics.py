@@ -0,0 +1,224 @@
+import bisect
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Upper bounds in seconds, from a LAN round trip to a slow cloud call
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+DUMP_INTERVAL = 60.0
+
+
+class Histogram:
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # The last slot is +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q):
+        """
+        Upper bound of the bucket holding the q-quantile.
+        """
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            seen += count
+            if seen >= rank and count:
+                return bound
+        return 0.0
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{str(v)}"' for k, v in pairs) + "}"
+
+
+class Metrics:
+    """
+    Latency histograms, error counters and gauges, exported as Prometheus text or JSON.
+
+    Disabled by default: observe() and error() return at once, and timer() only
+    checks the flag, so instrumented code costs next to nothing until metrics are
+    switched on with "METRICS_PORT" or "METRICS_DUMP" in config.json.
+    """
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.histograms = {}
+        self.counters = {}
+        self.gauges = {}  # name -> callable returning {labels tuple: value}
+        self._lock = threading.Lock()
+
+    def observe(self, name, seconds, **labels):
+        if not self.enabled:
+            return
+        key = _key(name, labels)
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(seconds)
+
+    def count(self, name, amount=1, **labels):
+        if not self.enabled:
+            return
+        key = _key(name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def error(self, name, exception, **labels):
+        """
+        Counts an exception by its type.
+        """
+        self.count(name, error=type(exception).__name__, **labels)
+
+    @contextmanager
+    def timer(self, name, errors=None, **labels):
+        """
+        Times the block into histogram name; exceptions are counted into errors if given.
+        """
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            if errors:
+                self.error(errors, e, **labels)
+            raise
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def gauge(self, name, read):
+        """
+        Registers read() -> {((label, value), ...): number}, evaluated at export time.
+        """
+        self.gauges[name] = read
+
+    def _read_gauges(self):
+        values = {}
+        for name, read in list(self.gauges.items()):
+            try:
+                values[name] = read()
+            except Exception as e:
+                print(f"Metrics gauge {name} failed: {e}")
+        return values
+
+    def prometheus(self):
+        """
+        Prometheus text exposition format.
+        """
+        lines = []
+        with self._lock:
+            histograms = sorted(self.histograms.items())
+            counters = sorted(self.counters.items())
+            typed = set()
+            for (name, labels), h in histograms:
+                if name not in typed:
+                    lines.append(f"# TYPE {name} histogram")
+                    typed.add(name)
+                cumulative = 0
+                for bound, count in zip(h.buckets + (float("inf"),), h.counts):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f"{name}_bucket{_format_labels(labels, [('le', le)])} {cumulative}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {h.sum:.6f}")
+                lines.append(f"{name}_count{_format_labels(labels)} {h.count}")
+            for (name, labels), value in counters:
+                if name not in typed:
+                    lines.append(f"# TYPE {name} counter")
+                    typed.add(name)
+                lines.append(f"{name}{_format_labels(labels)} {value}")
+        for name, values in sorted(self._read_gauges().items()):
+            lines.append(f"# TYPE {name} gauge")
+            for labels, value in values.items():
+                lines.append(f"{name}{_format_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self):
+        """
+        JSON-friendly summary: count, mean and approximate p50/p99 per histogram.
+        """
+        def label_text(labels):
+            return ",".join(f"{k}={v}" for k, v in labels)
+
+        with self._lock:
+            result = {
+                "histograms": {
+                    f"{name}{{{label_text(labels)}}}": {
+                        "count": h.count,
+                        "mean_ms": round(h.sum / h.count * 1000, 2) if h.count else 0.0,
+                        "p50_ms": h.quantile(0.5) * 1000,
+                        "p99_ms": h.quantile(0.99) * 1000,
+                    }
+                    for (name, labels), h in self.histograms.items()
+                },
+                "counters": {
+                    f"{name}{{{label_text(labels)}}}": value for (name, labels), value in self.counters.items()
+                },
+            }
+        result["gauges"] = {
+            f"{name}{{{label_text(labels)}}}": value
+            for name, values in self._read_gauges().items() for labels, value in values.items()
+        }
+        return result
+
+    def start_dump(self, path, interval=DUMP_INTERVAL):
+        """
+        Writes snapshot() to path every interval seconds on a daemon thread.
+        """
+        def run():
+            while True:
+                time.sleep(interval)
+                tmp = path + ".tmp"
+                try:
+                    with open(tmp, "w", encoding="utf-8") as f:
+                        json.dump(self.snapshot(), f, indent=4)
+                    os.replace(tmp, path)
+                except OSError as e:
+                    print(f"Metrics dump failed: {e}")
+
+        threading.Thread(target=run, name="metrics-dump", daemon=True).start()
+
+    def serve(self, port, host="127.0.0.1"):
+        """
+        Serves /metrics in Prometheus text format from a daemon thread.
+        """
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path != "/metrics":
+                    self.send_error(404)
+                    return
+                body = metrics.prometheus().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+        return server
+
+
+METRICS = Metrics()  # Shared by the engine, executors and the voice pipeline
@@ -0,0 +1,237 @@
+import hashlib
+import json
+import random
+import socket
+import struct
+import sys
+import threading
+import time
+
+from cryptography.hazmat.primitives import padding
+from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+
+MIIO_PORT = 54321
+HEADER = struct.Struct(">HHIII")  # magic, length, unknown, device id, stamp
+MAGIC = 0x2131
+
+# get_prop values of a powered-on color bulb in white mode; unknown properties read as ""
+DEFAULT_PROPS = {
+    "power": "on", "bright": "50", "ct": "4000", "rgb": "16777215", "hue": "0", "sat": "0",
+    "color_mode": "2", "flowing": "0", "delayoff": "0", "music_on": "0", "name": "",
+    "save_state": "0", "nl_br": "0", "active_mode": "0", "lan_ctrl": "1",
+}
+
+
+class MiioCipher:
+    """
+    miio payload encryption: AES-128-CBC with key = md5(token), iv = md5(key + token).
+    """
+    def __init__(self, token):
+        self.token = token
+        key = hashlib.md5(token).digest()
+        iv = hashlib.md5(key + token).digest()
+        self._cipher = Cipher(algorithms.AES(key), modes.CBC(iv))
+
+    def encrypt(self, plaintext):
+        padder = padding.PKCS7(128).padder()
+        padded = padder.update(plaintext) + padder.finalize()
+        encryptor = self._cipher.encryptor()
+        return encryptor.update(padded) + encryptor.finalize()
+
+    def decrypt(self, ciphertext):
+        decryptor = self._cipher.decryptor()
+        padded = decryptor.update(ciphertext) + decryptor.finalize()
+        unpadder = padding.PKCS7(128).unpadder()
+        return unpadder.update(padded) + unpadder.finalize()
+
+
+class QuotaBucket:
+    """
+    Per-client command budget like the real bulb's, refilled continuously.
+    """
+    def __init__(self, limit, period=60.0):
+        self.limit = limit
+        self.rate = limit / period
+        self.tokens = float(limit)
+        self._stamp = time.monotonic()
+
+    def take(self):
+        now = time.monotonic()
+        self.tokens = min(self.limit, self.tokens + (now - self._stamp) * self.rate)
+        self._stamp = now
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+class MiioEmulator:
+    """
+    Emulated Yeelight speaking the miio UDP protocol, for benchmarks without a physical bulb.
+
+    Answers the hello handshake and encrypted get_prop, set_power, toggle, set_bright,
+    set_rgb, set_ct_abx and set_scene commands. latency delays every answer, loss drops
+    that fraction of packets and rate_limit (commands per minute per client) answers
+    with the bulb's quota error once exceeded.
+    """
+    def __init__(self, token, did=0x1234, host="127.0.0.1", port=MIIO_PORT,
+                 latency=0.0, loss=0.0, rate_limit=None):
+        self.token = bytes.fromhex(token) if isinstance(token, str) else token
+        self.did = did
+        self.latency = latency
+        self.loss = loss
+        self.rate_limit = rate_limit
+        self.props = dict(DEFAULT_PROPS)
+        self.commands = {}  # Count per method
+        self.received = 0
+        self.dropped = 0
+        self.rejected = 0
+        self.malformed = 0
+        self._stopping = False
+        self._cipher = MiioCipher(self.token)
+        self._buckets = {}
+        self._started = time.time()
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._sock.bind((host, port))
+        self.address = self._sock.getsockname()
+        self._thread = threading.Thread(target=self._serve, name=f"miio-emulator-{host}", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """
+        Stops serving and frees the port; a socket closed under a blocked recvfrom would keep it bound.
+        """
+        self._stopping = True
+        if self._thread.is_alive():
+            with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as wake:
+                wake.sendto(b"", self.address)
+            self._thread.join()
+        self._sock.close()
+
+    def _stamp(self):
+        return int(time.time() - self._started) + 1
+
+    def _packet(self, payload=b"", checksum=None):
+        header = HEADER.pack(MAGIC, 32 + len(payload), 0, self.did, self._stamp())
+        if checksum is None:
+            checksum = hashlib.md5(header + self.token + payload).digest()
+        return header + checksum + payload
+
+    def _serve(self):
+        while True:
+            try:
+                data, client = self._sock.recvfrom(4096)
+            except OSError:
+                return
+            if self._stopping:
+                return
+            self.received += 1
+            if self.loss and random.random() < self.loss:
+                self.dropped += 1
+                continue
+            try:
+                reply = self.handle(data, client)
+            except Exception as e:
+                # A malformed packet costs its answer, not the emulator
+                self.malformed += 1
+                print(f"Emulator error [{client[0]}]: {type(e).__name__}: {e}")
+                continue
+            if reply is None:
+                continue
+            if self.latency:
+                time.sleep(self.latency)
+            try:
+                self._sock.sendto(reply, client)
+            except OSError:
+                return
+
+    def handle(self, data, client):
+        if len(data) < 32:
+            return None
+        magic, length, _, _, _ = HEADER.unpack(data[:16])
+        if magic != MAGIC:
+            return None
+        if length == 32:
+            # Handshake: device id and stamp, token withheld like a provisioned bulb
+            return self._packet(checksum=b"\xff" * 16)
+        payload = data[32:length]
+        if hashlib.md5(data[:16] + self.token + payload).digest() != data[16:32]:
+            return None  # Wrong token; real bulbs stay silent
+        request = json.loads(self._cipher.decrypt(payload).rstrip(b"\x00"))
+        response = {"id": request["id"]}
+        if self.rate_limit and not self._bucket(client[0]).take():
+            self.rejected += 1
+            response["error"] = {"code": -1, "message": "client quota exceeded"}
+        else:
+            try:
+                response["result"] = self.execute(request["method"], request.get("params") or [])
+            except (KeyError, ValueError, IndexError) as e:
+                response["error"] = {"code": -5001, "message": f"invalid params: {e}"}
+        return self._packet(self._cipher.encrypt(json.dumps(response).encode()))
+
+    def _bucket(self, host):
+        if host not in self._buckets:
+            self._buckets[host] = QuotaBucket(self.rate_limit)
+        return self._buckets[host]
+
+    def execute(self, method, params):
+        self.commands[method] = self.commands.get(method, 0) + 1
+        props = self.props
+        if method == "get_prop":
+            return [props.get(name, "") for name in params]
+        if method == "set_power":
+            props["power"] = params[0]
+        elif method == "toggle":
+            props["power"] = "off" if props["power"] == "on" else "on"
+        elif method == "set_bright":
+            props["bright"] = str(int(params[0]))
+        elif method == "set_rgb":
+            props["rgb"], props["color_mode"] = str(int(params[0])), "1"
+        elif method == "set_ct_abx":
+            props["ct"], props["color_mode"] = str(int(params[0])), "2"
+        elif method == "set_scene":
+            kind = params[0]
+            if kind == "color":
+                props["rgb"], props["color_mode"] = str(int(params[1])), "1"
+            elif kind == "ct":
+                props["ct"], props["color_mode"] = str(int(params[1])), "2"
+            elif kind != "cf":
+                raise ValueError(f"unsupported scene {kind}")
+            if kind != "cf":
+                props["bright"] = str(int(params[2]))
+            props["power"] = "on"
+        elif method == "set_music":
+            props["music_on"] = "1" if params[0] else "0"
+        elif method not in ("start_cf", "stop_cf", "set_default"):
+            raise KeyError(method)
+        return ["ok"]
+
+    def stats(self):
+        return {
+            "received": self.received,
+            "dropped": self.dropped,
+            "rejected": self.rejected,
+            "malformed": self.malformed,
+            "commands": dict(self.commands),
+        }
+
+
+if __name__ == "__main__":
+    # Usage: python miio_emulator.py TOKEN [host] [latency_s] [loss] [rate_limit_per_min]
+    args = sys.argv[1:]
+    emulator = MiioEmulator(
+        args[0],
+        host=args[1] if len(args) > 1 else "127.0.0.1",
+        latency=float(args[2]) if len(args) > 2 else 0.0,
+        loss=float(args[3]) if len(args) > 3 else 0.0,
+        rate_limit=int(args[4]) if len(args) > 4 else None,
+    ).start()
+    print(f"Emulated bulb on {emulator.address[0]}:{emulator.address[1]}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        emulator.stop()
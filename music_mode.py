@@ -0,0 +1,142 @@
+import json
+import socket
+import threading
+import time
+
+from scenes import rgb_to_int
+
+ACCEPT_TIMEOUT = 5.0
+MAX_FPS = 60
+
+
+def local_ip_for(ip):
+    """
+    Address of the interface that routes to the bulb, which it will connect back to.
+    """
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as probe:
+        probe.connect((ip, 55443))
+        return probe.getsockname()[0]
+
+
+def encode_frame(command_id, rgb=None, brightness=None):
+    """
+    Encodes one frame as a single LAN command line.
+    """
+    if rgb is not None and brightness is not None:
+        method, params = "set_scene", ["color", rgb_to_int(rgb), int(brightness)]
+    elif rgb is not None:
+        method, params = "set_rgb", [rgb_to_int(rgb), "sudden", 0]
+    elif brightness is not None:
+        method, params = "set_bright", [int(brightness), "sudden", 0]
+    else:
+        raise ValueError("A frame needs rgb or brightness")
+    message = {"id": command_id, "method": method, "params": params}
+    return json.dumps(message, separators=(",", ":")).encode() + b"\r\n"
+
+
+class MusicStream:
+    """
+    Streams color frames over Yeelight music mode.
+
+    The bulb is told with one set_music command to connect back to a local TCP server;
+    commands on that connection are not rate limited. Frames are sent at most fps times
+    per second and only the newest pending frame is kept, so a slow link drops frames
+    instead of building latency.
+    """
+    def __init__(self, executor, ip, fps=30):
+        self.executor = executor
+        self.ip = ip
+        self.fps = min(fps, MAX_FPS)
+        self.sent = 0
+        self.dropped = 0
+        self._frame = None
+        self._cond = threading.Condition()
+        self._conn = None
+        self._thread = None
+        self._running = False
+
+    def start(self):
+        host = local_ip_for(self.ip)
+        server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        try:
+            server.bind((host, 0))
+            server.listen(1)
+            server.settimeout(ACCEPT_TIMEOUT)
+            port = server.getsockname()[1]
+            self.executor.call("send", "set_music", [1, host, port]).result()
+            try:
+                self._conn, _ = server.accept()
+            except OSError:
+                # The bulb is in music mode now and would ignore normal commands until told otherwise
+                self.executor.call("send", "set_music", [0]).exception()
+                raise
+        finally:
+            server.close()
+        self._conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name=f"music-{self.ip}", daemon=True)
+        self._thread.start()
+        return self
+
+    def push(self, rgb=None, brightness=None):
+        """
+        Offers a frame; an unsent older frame is replaced.
+        """
+        with self._cond:
+            if self._frame is not None:
+                self.dropped += 1
+            self._frame = (rgb, brightness)
+            self._cond.notify()
+
+    def play(self, frames, fps=None):
+        """
+        Feeds an iterable of (rgb, brightness) frames at the given rate; blocks until it is exhausted.
+        """
+        interval = 1.0 / (fps or self.fps)
+        deadline = time.monotonic()
+        for rgb, brightness in frames:
+            if not self._running:
+                break
+            self.push(rgb, brightness)
+            deadline += interval
+            delay = deadline - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                deadline = time.monotonic()
+
+    def stop(self):
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+        return self.executor.call("send", "set_music", [0])
+
+    def stats(self):
+        return {"sent": self.sent, "dropped": self.dropped}
+
+    def _run(self):
+        interval = 1.0 / self.fps
+        next_send = 0.0
+        while True:
+            with self._cond:
+                while self._running and self._frame is None:
+                    self._cond.wait()
+                if not self._running:
+                    return
+                delay = next_send - time.monotonic()
+                if delay > 0:
+                    self._cond.wait(delay)
+                    continue
+                rgb, brightness = self._frame
+                self._frame = None
+            try:
+                self._conn.sendall(encode_frame(self.sent + 1, rgb, brightness))
+            except (OSError, AttributeError) as e:
+                print(f"Music mode error: {e}")
+                self._running = False
+                return
+            self.sent += 1
+            next_send = time.monotonic() + interval
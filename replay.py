@@ -0,0 +1,206 @@
+import argparse
+import json
+import sys
+import threading
+import time
+
+from bench import percentile
+from command_trace import load, set_source
+from device_executor import CommandDropped, is_quota_error
+from fleet import DeviceRegistry
+from lamp_engine import CONFIG_FILE, LampEngine
+
+MAX_GAP = 5.0  # Idle stretches of the trace longer than this are cut to it, in trace seconds
+REPLAY_TIMEOUT = 30.0  # Seconds to wait for the last commands after the trace ends
+
+
+def latency_summary(samples):
+    return {
+        "p50_ms": round(percentile(samples, 50) * 1000, 2),
+        "p99_ms": round(percentile(samples, 99) * 1000, 2),
+    }
+
+
+class Replay:
+    """
+    Re-issues a recorded trace against a LampEngine, keeping the recorded timing at a chosen speed.
+    """
+    def __init__(self, engine, records, speed=1.0, max_gap=MAX_GAP):
+        self.engine = engine
+        self.records = records
+        self.speed = speed
+        self.max_gap = max_gap
+        self.latencies = {}  # Command -> seconds until the bulbs answered
+        self.dropped = 0
+        self.quota_rejected = 0
+        self.errors = {}
+        self.skipped = 0
+        self._pending = []
+        self._lock = threading.Lock()
+
+    def schedule(self):
+        """
+        Replay offsets in seconds, with long idle gaps cut to max_gap.
+        """
+        offsets = []
+        offset = 0.0
+        for previous, record in zip([None] + self.records, self.records):
+            if previous is not None:
+                offset += min(record["at"] - previous["at"], self.max_gap)
+            offsets.append(offset / self.speed)
+        return offsets
+
+    def run(self):
+        targets = set(self.engine.registry.targets())
+        start = time.monotonic()
+        for offset, record in zip(self.schedule(), self.records):
+            delay = start + offset - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            if record["target"] not in targets:
+                self.skipped += 1
+                continue
+            self.engine.target = record["target"]
+            command = getattr(self.engine, record["cmd"], None)
+            if command is None:
+                self.skipped += 1
+                continue
+            issued = time.monotonic()
+            try:
+                future = command(**record["kw"])
+            except (KeyError, TypeError, ValueError) as e:
+                self._error(f"{type(e).__name__}: {e}")
+                continue
+            if future is not None:
+                self._pending.append(future)
+                future.add_done_callback(lambda f, cmd=record["cmd"], issued=issued: self._done(cmd, issued, f))
+        deadline = time.monotonic() + REPLAY_TIMEOUT
+        for future in self._pending:
+            try:
+                future.result(timeout=max(0.0, deadline - time.monotonic()))
+            except Exception:
+                pass
+        return time.monotonic() - start
+
+    def _error(self, text):
+        with self._lock:
+            self.errors[text] = self.errors.get(text, 0) + 1
+
+    def _done(self, command, issued, future):
+        elapsed = time.monotonic() - issued
+        with self._lock:
+            self.latencies.setdefault(command, []).append(elapsed)
+        error = future.exception()
+        errors = [error] if error is not None else list(future.result().errors.values())
+        for e in errors:
+            if isinstance(e, CommandDropped):
+                with self._lock:
+                    self.dropped += 1
+            elif is_quota_error(e):
+                with self._lock:
+                    self.quota_rejected += 1
+            else:
+                self._error(f"{type(e).__name__}: {e}")
+
+    def report(self, elapsed):
+        recorded = {}
+        for record in self.records:
+            if record.get("ms") is not None:
+                recorded.setdefault(record["cmd"], []).append(record["ms"] / 1000)
+        every = [sample for samples in self.latencies.values() for sample in samples]
+        return {
+            "commands": len(self.records),
+            "replayed": len(every),
+            "skipped": self.skipped,
+            "elapsed_s": round(elapsed, 2),
+            "speed": self.speed,
+            "latency": latency_summary(every),
+            "recorded_latency": latency_summary([s for samples in recorded.values() for s in samples]),
+            "by_command": {
+                command: dict(count=len(samples), **latency_summary(samples),
+                              recorded=latency_summary(recorded.get(command, [])))
+                for command, samples in sorted(self.latencies.items())
+            },
+            "dropped": self.dropped,
+            "quota_rejected": self.quota_rejected,
+            "errors": self.errors,
+        }
+
+
+def emulated_engine(config_file, args):
+    """
+    A Bench whose emulated bulbs carry the device and group names of config_file.
+    """
+    from bench import Bench
+
+    try:
+        with open(config_file, "r", encoding="utf-8") as f:
+            registry = DeviceRegistry.from_config(json.load(f))
+    except (OSError, json.JSONDecodeError):
+        registry = DeviceRegistry()
+    names = list(registry.devices) or ["lamp"]
+    return Bench(latency=args.latency, loss=args.loss, rate_limit=args.rate_limit, quota=True,
+                 names=names, groups=registry.groups)
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Replay a command trace recorded with TRACE_FILE")
+    parser.add_argument("trace", help="trace file")
+    parser.add_argument("--speed", type=float, default=1.0, help="replay speed, e.g. 10 for 10x")
+    parser.add_argument("--max-gap", type=float, default=MAX_GAP, help="longest idle stretch kept, in seconds")
+    parser.add_argument("--config", default=CONFIG_FILE, help="config with the bulbs and groups of the trace")
+    parser.add_argument("--emulate", action="store_true", help="replay against emulated bulbs instead of real ones")
+    parser.add_argument("--latency", type=float, default=0.0, help="emulated reply delay in seconds")
+    parser.add_argument("--loss", type=float, default=0.0, help="fraction of emulated packets dropped")
+    parser.add_argument("--rate-limit", type=int, default=60, help="emulated commands per minute per client")
+    parser.add_argument("--json", help="write the report to this file")
+    args = parser.parse_args(argv)
+
+    records = load(args.trace)
+    if not records:
+        print("The trace holds no commands.")
+        return 1
+    set_source("replay")
+    bench = None
+    if args.emulate:
+        bench = emulated_engine(args.config, args)
+        engine = bench.engine
+    else:
+        engine = LampEngine(args.config)
+        if not engine.registry.devices:
+            print(f"No bulbs in {args.config}; add DEVICES or replay against emulated bulbs with --emulate.")
+            return 1
+        engine.connect().result()
+        engine.update_status(target=engine.registry.targets()[0]).result()
+    if engine.recorder:
+        engine.recorder.close()
+        engine.recorder = None  # Never record the replay into the trace
+
+    replay = Replay(engine, records, args.speed, args.max_gap)
+    try:
+        elapsed = replay.run()
+    finally:
+        if bench:
+            rejected = {e.address[0]: e.stats()["rejected"] for e in bench.emulators}
+            bench.close()
+    report = replay.report(elapsed)
+    if bench:
+        report["emulator_rejected"] = rejected
+
+    print(f"Replayed {report['replayed']} of {report['commands']} commands in {report['elapsed_s']} s "
+          f"at {report['speed']}x")
+    print(f"Latency p50 {report['latency']['p50_ms']} ms, p99 {report['latency']['p99_ms']} ms "
+          f"(recorded p50 {report['recorded_latency']['p50_ms']} ms, p99 {report['recorded_latency']['p99_ms']} ms)")
+    for command, stats in report["by_command"].items():
+        print(f"  {command:<20} {stats['count']:>5}  p50 {stats['p50_ms']:>8.2f} ms  p99 {stats['p99_ms']:>8.2f} ms")
+    print(f"Dropped by the quota guard: {report['dropped']}, rejected by the bulb quota: {report['quota_rejected']}")
+    for error, count in report["errors"].items():
+        print(f"  {count} x {error}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=4, ensure_ascii=False)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,101 @@
+from device_executor import DeviceNotConnected
+from device_state import write_job
+
+# Used when config.json has no "PRESETS" section
+DEFAULT_PRESETS = {
+    'ночь': {'brightness': 30, 'rgb': [255, 0, 0]},
+    'день': {'brightness': 100, 'temp': 6500},
+}
+
+
+def rgb_to_int(rgb):
+    r, g, b = rgb
+    return (int(r) << 16) | (int(g) << 8) | int(b)
+
+
+def load_presets(config):
+    """
+    Returns user presets from config["PRESETS"] as scene keyword arguments.
+
+    Each preset holds a brightness and either "rgb": [r, g, b] or "temp" in Kelvin.
+    """
+    presets = {}
+    for name, preset in config.get("PRESETS", DEFAULT_PRESETS).items():
+        try:
+            presets[name.lower()] = preset_to_scene(preset)
+        except (TypeError, ValueError) as e:
+            print(f"Invalid preset {name}: {e}")
+    return presets
+
+
+def preset_to_scene(preset):
+    scene = {}
+    if preset.get('brightness') is not None:
+        scene['brightness'] = int(preset['brightness'])
+    if preset.get('rgb') is not None:
+        scene['rgb'] = tuple(int(c) for c in preset['rgb'])
+        if len(scene['rgb']) != 3:
+            raise ValueError("rgb needs three components")
+    elif preset.get('temp', preset.get('color_temp')) is not None:
+        scene['color_temp'] = int(preset.get('temp', preset.get('color_temp')))
+    if not scene:
+        raise ValueError("empty preset")
+    return scene
+
+
+def compile_scene(brightness, rgb=None, color_temp=None):
+    """
+    Builds set_scene params setting color (or temperature) and brightness in one command.
+    """
+    if rgb is not None:
+        return ["color", rgb_to_int(rgb), brightness]
+    if color_temp is not None:
+        return ["ct", int(color_temp), brightness]
+    raise ValueError("A scene needs rgb or color_temp")
+
+
+def scene_job(state, brightness=None, rgb=None, color_temp=None):
+    """
+    Returns an executor job applying several properties with a single set_scene call.
+
+    set_scene also switches the bulb on. Properties already matching the cache are
+    dropped, and a lone brightness change falls back to set_brightness.
+    """
+    def job(device):
+        wanted = {}
+        if brightness is not None and not state.matches("brightness", brightness):
+            wanted["brightness"] = brightness
+        if rgb is not None and not state.matches("rgb", tuple(rgb)):
+            wanted["rgb"] = tuple(rgb)
+        elif color_temp is not None and not state.matches("color_temp", color_temp):
+            wanted["color_temp"] = color_temp
+        if not wanted and state.matches("power", True):
+            return state
+        if set(wanted) == {"brightness"} and state.matches("power", True):
+            return write_job(state, "brightness", brightness, "set_brightness")(device)
+        if device is None:
+            raise DeviceNotConnected("Device is not connected")
+
+        level = brightness if brightness is not None else (state.brightness or 100)
+        if rgb is None and color_temp is None:
+            # Only brightness on a bulb that is off: keep its current color mode
+            if state.rgb is not None:
+                params = compile_scene(level, rgb=state.rgb)
+            elif state.color_temp is not None:
+                params = compile_scene(level, color_temp=state.color_temp)
+            else:
+                device.on()
+                state.apply(power=True)
+                return write_job(state, "brightness", brightness, "set_brightness")(device)
+        else:
+            params = compile_scene(level, rgb=rgb, color_temp=color_temp)
+
+        device.send("set_scene", params)
+        applied = {"power": True, "brightness": level}
+        if rgb is not None:
+            applied["rgb"] = tuple(rgb)
+        elif color_temp is not None:
+            applied["color_temp"] = color_temp
+        state.apply(**applied)
+        return state
+    return job
@@ -0,0 +1,128 @@
+import datetime
+import heapq
+import itertools
+import threading
+import time
+
+MAX_SLEEP = 60.0  # Longest single wait, so wall clock jumps (suspend, NTP) are noticed within a minute
+
+
+def parse_time_of_day(text):
+    """
+    "HH:MM" or "HH:MM:SS" -> seconds since midnight.
+    """
+    parts = [int(part) for part in str(text).split(":")]
+    if not 2 <= len(parts) <= 3:
+        raise ValueError(f"Expected HH:MM, got {text!r}")
+    hours, minutes, seconds = (parts + [0])[:3]
+    if not (0 <= hours < 24 and 0 <= minutes < 60 and 0 <= seconds < 60):
+        raise ValueError(f"Expected HH:MM, got {text!r}")
+    return hours * 3600 + minutes * 60 + seconds
+
+
+def next_daily(seconds_of_day, now=None):
+    """
+    Timestamp of the next local time seconds_of_day strictly after now.
+    """
+    now = time.time() if now is None else now
+    midnight = datetime.datetime.fromtimestamp(now).replace(hour=0, minute=0, second=0, microsecond=0)
+    for days in (0, 1):
+        when = (midnight + datetime.timedelta(days=days, seconds=seconds_of_day)).timestamp()
+        if when > now:
+            return when
+    return (midnight + datetime.timedelta(days=2, seconds=seconds_of_day)).timestamp()
+
+
+class Timer:
+    """
+    Handle of one scheduled call; cancel() stops it (and, for daily timers, every later run).
+    """
+    __slots__ = ("when", "func", "args", "cancelled")
+
+    def __init__(self, when, func, args):
+        self.when = when
+        self.func = func
+        self.args = args
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class Scheduler:
+    """
+    Every timer of the app on one heap served by one thread, instead of a threading.Timer each.
+
+    Times are wall-clock timestamps, so daily entries follow the local clock. Callbacks
+    run on the scheduler thread and must return quickly: device work goes to the
+    executors through the engine, never blocking here.
+    """
+    def __init__(self, name="scheduler"):
+        self._heap = []
+        self._seq = itertools.count()  # Keeps equal times in insertion order
+        self._cond = threading.Condition()
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def at(self, when, func, *args):
+        timer = Timer(when, func, args)
+        with self._cond:
+            heapq.heappush(self._heap, (when, next(self._seq), timer))
+            if self._heap[0][2] is timer:
+                self._cond.notify()
+        return timer
+
+    def after(self, delay, func, *args):
+        return self.at(time.time() + delay, func, *args)
+
+    def daily(self, time_of_day, func, *args):
+        """
+        Runs func(*args) every day at "HH:MM" local time; the returned handle cancels all runs.
+        """
+        seconds = parse_time_of_day(time_of_day)
+        handle = Timer(None, func, args)
+
+        def run():
+            if handle.cancelled:
+                return
+            handle.when = next_daily(seconds)
+            self.at(handle.when, run)
+            func(*args)
+
+        handle.when = next_daily(seconds)
+        self.at(handle.when, run)
+        return handle
+
+    def pending(self):
+        with self._cond:
+            return sum(1 for _, _, timer in self._heap if not timer.cancelled)
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+
+    def _next_due(self):
+        with self._cond:
+            while not self._stopped:
+                while self._heap and self._heap[0][2].cancelled:
+                    heapq.heappop(self._heap)
+                if self._heap:
+                    wait = self._heap[0][0] - time.time()
+                    if wait <= 0:
+                        return heapq.heappop(self._heap)[2]
+                    self._cond.wait(min(wait, MAX_SLEEP))
+                else:
+                    self._cond.wait()
+            return None
+
+    def _run(self):
+        while True:
+            timer = self._next_due()
+            if timer is None:
+                return
+            try:
+                timer.func(*timer.args)
+            except Exception as e:
+                print(f"Scheduled task error: {e}")
@@ -0,0 +1,145 @@
+import json
+import os
+import sys
+import time
+from abc import ABC, abstractmethod
+
+from wake_word import SAMPLE_RATE, SAMPLE_WIDTH, read_wav
+
+LANGUAGE = "ru-RU"
+CHUNK_BYTES = 8000  # 0.25 s of 16 kHz 16-bit audio per streaming step
+
+
+class RecognizerBackend(ABC):
+    """
+    Speech-to-text backend used by the voice pipeline.
+
+    stream() yields (text, is_final) pairs; partial results let the intent stage
+    start before the whole utterance is decoded.
+    """
+    name = "base"
+
+    @abstractmethod
+    def stream(self, pcm):
+        pass
+
+    def recognize(self, pcm):
+        text = ""
+        for text, final in self.stream(pcm):
+            if final:
+                break
+        return text
+
+
+class GoogleBackend(RecognizerBackend):
+    """
+    Google Web Speech API via speech_recognition; one final result per utterance.
+    """
+    name = "google"
+
+    def __init__(self, recognizer=None, language=LANGUAGE):
+        import speech_recognition as sr
+        from speech_recognition.recognizers import google
+
+        self._sr = sr
+        self._google = google
+        self.recognizer = recognizer or sr.Recognizer()
+        self.language = language
+
+    def stream(self, pcm):
+        audio = self._sr.AudioData(pcm, SAMPLE_RATE, SAMPLE_WIDTH)
+        try:
+            text = self._google.recognize_legacy(self.recognizer, audio, language=self.language)
+        except self._sr.UnknownValueError:
+            text = ""
+        yield text, True
+
+
+class VoskBackend(RecognizerBackend):
+    """
+    Offline streaming recognizer with a local Vosk model (e.g. vosk-model-small-ru).
+    """
+    name = "vosk"
+
+    def __init__(self, model_path):
+        from vosk import KaldiRecognizer, Model
+
+        self._model = Model(model_path)
+        self._recognizer_class = KaldiRecognizer
+
+    def stream(self, pcm):
+        recognizer = self._recognizer_class(self._model, SAMPLE_RATE)
+        decoded = []
+        partial = ""
+        for offset in range(0, len(pcm), CHUNK_BYTES):
+            if recognizer.AcceptWaveform(pcm[offset:offset + CHUNK_BYTES]):
+                decoded.append(json.loads(recognizer.Result()).get("text", ""))
+                partial = ""
+            else:
+                partial = json.loads(recognizer.PartialResult()).get("partial", "")
+            text = " ".join(t for t in decoded + [partial] if t)
+            if text:
+                yield text, False
+        decoded.append(json.loads(recognizer.FinalResult()).get("text", ""))
+        yield " ".join(t for t in decoded if t), True
+
+
+def create_backend(config, recognizer=None):
+    """
+    Builds the backend named by config["RECOGNIZER"] ("google" by default, or "vosk" with "VOSK_MODEL").
+    """
+    name = config.get("RECOGNIZER", "google")
+    if name == "vosk":
+        return VoskBackend(config["VOSK_MODEL"])
+    if name == "google":
+        return GoogleBackend(recognizer)
+    raise ValueError(f"Unknown recognizer backend: {name}")
+
+
+def benchmark(backends, paths, parser=None):
+    """
+    Runs every backend on the same WAV files and reports time to first partial, final text and intent.
+    """
+    for path in paths:
+        pcm = read_wav(path)
+        for backend in backends:
+            start = time.perf_counter()
+            first = None
+            text = ""
+            for text, final in backend.stream(pcm):
+                if first is None:
+                    first = time.perf_counter() - start
+                if final:
+                    break
+            decoded = time.perf_counter() - start
+            intent = parser.parse(text) if parser else None
+            total = time.perf_counter() - start
+            print(
+                f"{path} [{backend.name}] first {first * 1000:.0f} ms, final {decoded * 1000:.0f} ms, "
+                f"intent {total * 1000:.0f} ms: {text!r} -> {intent['intent'] if intent else None}"
+            )
+
+
+if __name__ == "__main__":
+    # Usage: python speech_backends.py [--vosk MODEL_DIR] [--no-google] file.wav ...
+    from colors import lookup_color
+    from intent_parser import LocalIntentParser
+    from lamp_engine import CONFIG_FILE
+    from scenes import load_presets
+
+    args = sys.argv[1:]
+    backends = []
+    if "--vosk" in args:
+        index = args.index("--vosk")
+        backends.append(VoskBackend(args[index + 1]))
+        del args[index:index + 2]
+    if "--no-google" in args:
+        args.remove("--no-google")
+    else:
+        backends.insert(0, GoogleBackend())
+    config = {}
+    if os.path.exists(CONFIG_FILE):
+        with open(CONFIG_FILE, "r", encoding="utf-8") as f:
+            config = json.load(f)
+    # Same parser as the app, so colors and presets resolve locally here too
+    benchmark(backends, args, LocalIntentParser(lookup_color, load_presets(config)))
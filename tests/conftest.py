@@ -0,0 +1,39 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench import Bench  # noqa: E402
+from miio_emulator import MiioEmulator  # noqa: E402
+
+TOKEN = "00112233445566778899aabbccddeeff"
+MODEL = "yeelink.light.color2"
+
+
+@pytest.fixture
+def emulator():
+    """
+    Starts emulated bulbs on loopback addresses; each call takes the host's last octet.
+    """
+    started = []
+
+    def start(octet, **options):
+        bulb = MiioEmulator(TOKEN, did=0x2000 + octet, host=f"127.0.0.{octet}", **options).start()
+        started.append(bulb)
+        return bulb
+
+    yield start
+    for bulb in started:
+        bulb.stop()
+
+
+@pytest.fixture
+def bench():
+    """
+    LampEngine connected to two emulated bulbs, "bulb0" and "bulb1", grouped as "all".
+    """
+    bench = Bench(bulbs=2)
+    yield bench
+    bench.close()
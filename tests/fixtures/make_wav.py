@@ -0,0 +1,64 @@
+"""
+Writes the WAV fixtures of test_wake_word.py: 16 kHz 16-bit mono, synthetic and seeded.
+
+Speech is modelled as voiced syllables (a 140 Hz harmonic series under a raised-cosine
+envelope) over a steady noise floor, which is what the energy VAD keys on.
+"""
+import math
+import os
+import random
+import wave
+from array import array
+
+SAMPLE_RATE = 16000
+NOISE = 120  # RMS of the background hiss
+VOICE = 5000  # Peak amplitude of a syllable
+PITCH = 140.0
+SYLLABLE = 0.22  # Seconds per syllable
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def noise(rng, seconds):
+    return [rng.gauss(0, NOISE) for _ in range(int(seconds * SAMPLE_RATE))]
+
+
+def speech(rng, seconds):
+    samples = noise(rng, seconds)
+    length = int(SYLLABLE * SAMPLE_RATE)
+    for i in range(len(samples)):
+        envelope = 0.5 - 0.5 * math.cos(2 * math.pi * (i % length) / length)
+        t = i / SAMPLE_RATE
+        voiced = sum(math.sin(2 * math.pi * PITCH * k * t) / k for k in range(1, 6))
+        samples[i] += VOICE * envelope * voiced / 2.3
+    return samples
+
+
+def click(rng, seconds):
+    return [rng.choice((-1, 1)) * VOICE * 2 if i < 200 else rng.gauss(0, NOISE)
+            for i in range(int(seconds * SAMPLE_RATE))]
+
+
+FIXTURES = {
+    # name: parts of (kind, seconds)
+    "silence.wav": [(noise, 2.0)],
+    "command.wav": [(noise, 0.6), (speech, 1.1), (noise, 0.6)],
+    "two_phrases.wav": [(noise, 0.5), (speech, 0.66), (noise, 0.9), (speech, 0.88), (noise, 0.5)],
+    "click.wav": [(noise, 0.8), (click, 0.05), (noise, 0.8)],
+}
+
+
+def write(path, samples):
+    pcm = array("h", (max(-32768, min(32767, int(s))) for s in samples))
+    with wave.open(path, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(SAMPLE_RATE)
+        f.writeframes(pcm.tobytes())
+
+
+if __name__ == "__main__":
+    rng = random.Random(12)
+    for name, parts in FIXTURES.items():
+        write(os.path.join(HERE, name), [s for kind, seconds in parts for s in kind(rng, seconds)])
+        print(name)
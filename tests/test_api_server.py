@@ -0,0 +1,72 @@
+import asyncio
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+
+from api_server import LampApi
+
+
+def call(bench, method, path, **kwargs):
+    """
+    (status, text) of one request to a LampApi over the bench engine.
+    """
+    async def request():
+        api = LampApi(bench.engine, asyncio.get_running_loop())
+        app = web.Application()
+        app.add_routes(api.routes())
+        async with TestClient(TestServer(app)) as client:
+            response = await client.request(method, path, **kwargs)
+            return response.status, await response.text()
+    return asyncio.run(request())
+
+
+@pytest.mark.parametrize("path, body", [
+    ("/api/bulb0/brightness", [1, 2]),
+    ("/api/bulb0/brightness", {"value": "abc"}),
+    ("/api/bulb0/brightness", {"value": 101}),
+    ("/api/bulb0/brightness", {"value": True}),
+    ("/api/bulb0/temp", {"value": 1000}),
+    ("/api/bulb0/rgb", {"rgb": 5}),
+    ("/api/bulb0/rgb", {"rgb": [1, 2]}),
+    ("/api/bulb0/rgb", {"rgb": [0, 0, 256]}),
+    ("/api/bulb0/rgb", {"hex": "#12"}),
+    ("/api/bulb0/scene", {"brightness": 50, "rgb": [1, 2]}),
+    ("/api/bulb0/scene", {"brightness": "abc", "rgb": [1, 2, 3]}),
+    ("/api/bulb0/scene", {"brightness": 50, "color_temp": "warm"}),
+    ("/api/bulb0/scene", {"rgb": [1, 2, 3]}),
+    ("/api/bulb0/power", {"on": "yes"}),
+    ("/api/bulb0/power", "[]"),
+    ("/api/bulb0/effect", {"name": "breathe", "params": {"period": {}}}),
+])
+def test_invalid_input_is_a_bad_request(bench, path, body):
+    if isinstance(body, str):
+        status, _ = call(bench, "POST", path, data=body)
+    else:
+        status, _ = call(bench, "POST", path, json=body)
+    assert status == 400
+    assert bench.emulators[0].commands.keys() <= {"get_prop"}  # Nothing reached the bulb
+
+
+def test_malformed_json_is_a_bad_request(bench):
+    assert call(bench, "POST", "/api/bulb0/brightness", data="{")[0] == 400
+
+
+def test_unknown_target(bench):
+    assert call(bench, "POST", "/api/nowhere/power")[0] == 404
+
+
+def test_empty_power_body_toggles(bench):
+    bulb = bench.emulators[0]
+    assert bulb.props["power"] == "on"
+    status, _ = call(bench, "POST", "/api/bulb0/power")
+    assert status == 200
+    assert bulb.props["power"] == "off"
+
+
+def test_scene_is_validated_and_applied(bench):
+    bulb = bench.emulators[0]
+    status, _ = call(bench, "POST", "/api/bulb0/scene", json={"brightness": "40", "hex": "#ff0000"})
+    assert status == 200
+    assert bulb.props["bright"] == "40"
+    assert bulb.props["rgb"] == str(0xFF0000)
@@ -0,0 +1,15 @@
+from bench import DRAG_RATE, Bench
+
+
+def test_slider_drag_coalesces_events(bench):
+    result = bench.slider_drag(2)
+    assert result["ops"] == 2
+    assert result["commands"] < 2 * DRAG_RATE // 4  # At most one write per throttle interval, plus edges
+    assert result["p99_ms"] < 1000
+
+
+def test_close_stops_the_engine():
+    bench = Bench(bulbs=1)
+    bench.close()
+    assert bench.engine._stop.is_set()
+    assert all(not executor._thread.is_alive() for executor in bench.engine.fleet.executors.values())
@@ -0,0 +1,15 @@
+from colors import lookup_color
+
+
+def test_lookup_results_are_not_shared():
+    first = lookup_color("красную")
+    first["rgb"] = (0, 0, 255)
+    first["name"] = "синий"
+    assert lookup_color("красную") == {"name": "красный", "hex": "#FF0000", "rgb": (255, 0, 0)}
+
+
+def test_inflected_and_modified_forms():
+    assert lookup_color("Красной")["name"] == "красный"
+    assert lookup_color("тёмно-зелёный")["rgb"] == lookup_color("темнозеленый")["rgb"]
+    assert lookup_color("лампа") is None
+    assert lookup_color("") is None
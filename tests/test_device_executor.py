@@ -0,0 +1,173 @@
+import threading
+import time
+
+import pytest
+from miio.exceptions import DeviceError
+
+from conftest import MODEL, TOKEN
+from device_executor import (
+    BACKGROUND, CommandDropped, CommandQuota, DeviceExecutor, ExecutorClosed, is_quota_error,
+)
+from lamp_engine import yeelight_class
+
+TIMEOUT = 0.5
+
+
+@pytest.fixture
+def executor():
+    executors = []
+
+    def start(bulb, quota=None):
+        fast = type("FastYeelight", (yeelight_class(),), {"timeout": TIMEOUT})
+        executor = DeviceExecutor(name=f"executor-{bulb.address[0]}", quota=quota)
+        executor.connect(lambda: fast(ip=bulb.address[0], token=TOKEN, model=MODEL)).result(5)
+        executors.append(executor)
+        return executor
+
+    yield start
+    for executor in executors:
+        executor.shutdown()
+
+
+def hold(executor):
+    """
+    Parks the worker thread until the returned event is set, so commands pile up behind it.
+    """
+    release = threading.Event()
+    started = threading.Event()
+
+    def wait(device):
+        started.set()
+        release.wait(5)
+
+    executor.submit(wait, cost=0)
+    started.wait(5)
+    return release
+
+
+def test_pending_writes_with_one_key_are_merged(emulator, executor):
+    bulb = emulator(70)
+    devices = executor(bulb)
+    release = hold(devices)
+    futures = [devices.call("set_brightness", value, key="bright") for value in (10, 20, 30, 40)]
+    release.set()
+    results = [future.result(5) for future in futures]
+    assert results == [results[-1]] * len(futures)
+    assert bulb.commands["set_bright"] == 1
+    assert bulb.props["bright"] == "40"
+    assert devices.stats()["merged"] == 3
+
+
+def test_merged_write_runs_after_commands_queued_in_between(emulator, executor):
+    bulb = emulator(75)
+    devices = executor(bulb)
+    order = []
+
+    def brightness(value):
+        def job(device):
+            order.append(f"brightness {value}")
+            device.set_brightness(value)
+        return job
+
+    def scene(device):
+        order.append("scene")
+        device.send("set_scene", ["ct", 2700, 80])
+
+    release = hold(devices)
+    first = devices.submit(brightness(10), key="brightness")
+    devices.submit(scene, key="scene")
+    latest = devices.submit(brightness(40), key="brightness")
+    release.set()
+    first.result(5)
+    latest.result(5)
+    assert order == ["scene", "brightness 40"]
+    assert bulb.props["bright"] == "40"  # The scene did not overwrite the latest value
+
+
+def test_user_commands_run_before_background_ones(emulator, executor):
+    bulb = emulator(71)
+    devices = executor(bulb)
+    order = []
+    release = hold(devices)
+    background = devices.submit(lambda device: order.append("background"), priority=BACKGROUND, cost=0)
+    user = devices.submit(lambda device: order.append("user"), cost=0)
+    release.set()
+    background.result(5)
+    user.result(5)
+    assert order == ["user", "background"]
+
+
+def test_background_commands_are_dropped_when_the_quota_runs_low(emulator, executor):
+    bulb = emulator(72)
+    devices = executor(bulb, quota=CommandQuota(limit=5, period=60.0))
+    with pytest.raises(CommandDropped):
+        devices.call("status", priority=BACKGROUND).result(5)
+    assert "get_prop" not in bulb.commands
+    assert devices.call("status").result(5).is_on  # User commands still go out
+    assert devices.stats()["dropped"] == 1
+
+
+def test_user_commands_are_paced_by_the_quota(emulator, executor):
+    bulb = emulator(73)
+    devices = executor(bulb, quota=CommandQuota(limit=2, period=0.4))  # 5 commands per second
+    began = time.monotonic()
+    futures = [devices.call("set_brightness", value) for value in range(1, 6)]
+    for future in futures:
+        future.result(5)
+    # Two go out on the budget, the remaining three wait about 0.2 s each
+    assert time.monotonic() - began >= 0.5
+    assert bulb.commands["set_bright"] == 5
+    assert bulb.rejected == 0
+
+
+def test_quota_error_from_the_bulb_empties_the_bucket(emulator, executor):
+    bulb = emulator(74, rate_limit=2)
+    devices = executor(bulb)
+    devices.call("status").result(5)
+    devices.call("status").result(5)
+    with pytest.raises(DeviceError, match="quota"):
+        devices.call("status").result(5)
+    assert devices.quota.available() < 1
+
+
+def test_job_waits_for_its_whole_cost(emulator, executor):
+    bulb = emulator(76)
+    devices = executor(bulb, quota=CommandQuota(limit=2, period=1.0))  # 2 commands per second
+    devices.call("status").result(5)
+
+    def status_and_write(device):
+        device.status()
+        device.set_brightness(30)
+
+    began = time.monotonic()
+    devices.submit(status_and_write, cost=2).result(5)
+    # One token was left; the second one takes about 0.5 s to refill
+    assert time.monotonic() - began >= 0.4
+    assert devices.quota.available() < 1
+
+
+def test_unused_reserved_tokens_are_refunded(emulator, executor):
+    bulb = emulator(77)
+    devices = executor(bulb, quota=CommandQuota(limit=10, period=3600.0))
+    devices.submit(lambda device: device.status(), cost=3).result(5)
+    assert round(devices.quota.available()) == 9
+
+
+def test_quota_errors_are_told_by_their_code():
+    assert is_quota_error(DeviceError({"code": -1, "message": "client quota exceeded"}))
+    assert not is_quota_error(DeviceError({"code": -5001, "message": "invalid params: quota"}))
+    assert not is_quota_error(ValueError("quota"))
+
+
+def test_shutdown_fails_pending_commands(emulator, executor):
+    bulb = emulator(78)
+    devices = executor(bulb)
+    release = hold(devices)
+    pending = devices.call("status")
+    devices.shutdown()
+    release.set()
+    with pytest.raises(ExecutorClosed):
+        pending.result(5)
+    with pytest.raises(ExecutorClosed):
+        devices.call("status").result(5)
+    assert "get_prop" not in bulb.commands
@@ -0,0 +1,76 @@
+import pytest
+from miio.exceptions import DeviceError, DeviceException
+
+from conftest import MODEL, TOKEN
+from device_executor import DeviceNotConnected
+from device_session import BREAKER_THRESHOLD, CLOSED, OPEN, RETRY_ATTEMPTS, ManagedSession, is_transient
+from lamp_engine import yeelight_class
+
+TIMEOUT = 0.2  # Short miio timeout so an unreachable bulb fails fast
+
+
+def session_for(bulb):
+    fast = type("FastYeelight", (yeelight_class(),), {"timeout": TIMEOUT})
+    return ManagedSession(lambda: fast(ip=bulb.address[0], token=TOKEN, model=MODEL), sleep=lambda seconds: None)
+
+
+def test_unreachable_bulb_opens_the_circuit(emulator):
+    bulb = emulator(50, loss=1.0)
+    session = session_for(bulb)
+    for _ in range(BREAKER_THRESHOLD):
+        with pytest.raises(DeviceException, match="Unable to discover"):
+            session.call("status")
+    stats = session.stats()
+    assert stats["circuit"] == OPEN
+    assert stats["errors"] == BREAKER_THRESHOLD
+    assert stats["retries"] == BREAKER_THRESHOLD * (RETRY_ATTEMPTS - 1)
+    assert stats["trips"] == 1
+    received = bulb.received
+    with pytest.raises(DeviceNotConnected):
+        session.call("status")
+    assert bulb.received == received  # Fails fast without touching the network
+
+
+def test_probe_closes_the_circuit_once_the_bulb_answers(emulator):
+    bulb = emulator(51, loss=1.0)
+    session = session_for(bulb)
+    for _ in range(BREAKER_THRESHOLD):
+        with pytest.raises(DeviceException):
+            session.call("status")
+    bulb.loss = 0.0
+    session.cooldown = 0.0
+    assert session.probe_due()
+    assert session.call("status").is_on
+    stats = session.stats()
+    assert stats["circuit"] == CLOSED
+    assert stats["reconnects"] == 1
+
+
+def test_handshake_is_bounded_by_the_request_timeout(emulator):
+    import time
+
+    bulb = emulator(52, loss=1.0)
+    session = session_for(bulb)
+    began = time.monotonic()
+    with pytest.raises(DeviceException):
+        session.call("status")
+    assert time.monotonic() - began < RETRY_ATTEMPTS * TIMEOUT + 1.0
+
+
+def test_bulb_errors_are_not_retried(emulator):
+    bulb = emulator(53)
+    session = session_for(bulb)
+    with pytest.raises(DeviceError):
+        session.call("send", "no_such_method", [])
+    stats = session.stats()
+    assert stats["circuit"] == CLOSED
+    assert stats["retries"] == 0
+    assert stats["errors"] == 0
+
+
+def test_is_transient():
+    assert is_transient(TimeoutError())
+    assert is_transient(DeviceException("Unable to discover the device 10.0.0.5"))
+    assert is_transient(DeviceException("No response from the device"))
+    assert not is_transient(DeviceError({"code": -5001, "message": "invalid params"}))
+    assert not is_transient(ValueError("bad value"))
@@ -0,0 +1,69 @@
+import os
+import socket
+import time
+
+import pytest
+
+pytest.importorskip("grpc")
+pytest.importorskip("google.cloud.dialogflow_v2")
+
+from fake_dialogflow import FakeSessions, serve  # noqa: E402
+from intent_cache import IntentCache  # noqa: E402
+from voice_engine import DIALOGFLOW_TIMEOUT, VoiceProcessor  # noqa: E402
+from wake_word import read_wav  # noqa: E402
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("localhost", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def dialogflow():
+    """
+    Fake Sessions service on a free local port, answering "лампа красный" as color.set.
+    """
+    port = free_port()
+    sessions = FakeSessions("лампа красный", "color.set", {"color": "красный"})
+    server = serve(sessions, port)
+    sessions.endpoint = f"localhost:{port}"
+    yield sessions
+    server.stop(None)
+
+
+def processor(endpoint):
+    return VoiceProcessor(cache=IntentCache(path=None), endpoint=endpoint)
+
+
+def test_streaming_resolves_audio_in_one_call(dialogflow):
+    pcm = read_wav(os.path.join(FIXTURES, "command.wav"))
+    voice = processor(dialogflow.endpoint)
+    text, result = voice.process_audio(pcm)
+    assert text == "лампа красный"
+    assert result["intent"] == "color.set"
+    assert result["parameters"] == {"color": "красный"}
+    assert dialogflow.calls == 1
+    assert dialogflow.audio_bytes == len(pcm)
+    assert voice.cache.get(text) == result
+
+
+def test_text_queries_share_one_channel_and_the_cache(dialogflow):
+    voice = processor(dialogflow.endpoint)
+    assert voice.process_query("сделай красный")["intent"] == "color.set"
+    client = voice.session_client
+    voice.process_query("включи красный")
+    assert voice.session_client is client
+    assert dialogflow.calls == 2
+    voice.process_query("Сделай красный!")  # Same normalized phrase, answered from the cache
+    assert dialogflow.calls == 2
+
+
+def test_unreachable_server_fails_within_the_timeout():
+    voice = processor(f"localhost:{free_port()}")
+    began = time.monotonic()
+    assert voice.process_audio(b"\x00" * 3200) == (None, None)
+    assert voice.process_query("сделай красный") is None  # Retried until the timeout runs out
+    assert time.monotonic() - began < DIALOGFLOW_TIMEOUT + 5
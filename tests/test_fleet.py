@@ -0,0 +1,60 @@
+from concurrent.futures import Future
+
+import pytest
+
+from device_executor import DeviceNotConnected
+from fleet import DEFAULT_DEVICE, DeviceRegistry, gather
+
+CONFIG = {
+    "DEVICE_IP": "192.168.1.10", "DEVICE_TOKEN": "aa", "MODEL": "yeelink.light.color2",
+    "DEVICES": {
+        "desk": {"DEVICE_IP": "192.168.1.11", "DEVICE_TOKEN": "bb", "MODEL": "yeelink.light.mono1"},
+    },
+    "GROUPS": {"room": ["lamp", "desk", "gone"]},
+}
+
+
+def test_registry_resolves_devices_and_groups():
+    registry = DeviceRegistry.from_config(CONFIG)
+    assert registry.targets() == [DEFAULT_DEVICE, "desk", "room"]
+    assert registry.members("room") == [DEFAULT_DEVICE, "desk"]  # Unknown members are dropped
+    assert registry.members("desk") == ["desk"]
+    assert registry.members() == [DEFAULT_DEVICE, "desk"]
+    with pytest.raises(KeyError):
+        registry.members("kitchen")
+
+
+def test_registry_round_trips_through_the_config():
+    registry = DeviceRegistry.from_config(CONFIG)
+    config = registry.to_config({"PRESETS": {}})
+    assert config["PRESETS"] == {}
+    again = DeviceRegistry.from_config(config)
+    assert again.devices == registry.devices
+    assert again.groups == {"room": [DEFAULT_DEVICE, "desk"]}
+
+
+def test_gather_waits_for_every_member_and_keeps_partial_failures():
+    ok, failed = Future(), Future()
+    combined = gather({"lamp": ok, "desk": failed})
+    ok.set_result("state")
+    assert not combined.done()
+    failed.set_exception(DeviceNotConnected("Device is not connected"))
+    outcome = combined.result(1)
+    assert outcome.results == {"lamp": "state"}
+    assert list(outcome.errors) == ["desk"]
+    assert isinstance(outcome.errors["desk"], DeviceNotConnected)
+
+
+def test_gather_of_nothing_is_done():
+    outcome = gather({}).result(0)
+    assert outcome.results == {} and outcome.errors == {}
+
+
+def test_group_command_reports_the_failing_bulb_and_applies_the_rest(bench):
+    engine = bench.engine
+    engine.fleet.disconnect("bulb1").result(5)
+    outcome = engine.set_brightness(35, target="all").result(5)
+    assert list(outcome.results) == ["bulb0"]
+    assert isinstance(outcome.errors["bulb1"], DeviceNotConnected)
+    assert bench.emulators[0].props["bright"] == "35"
+    assert bench.emulators[1].props["bright"] != "35"
@@ -0,0 +1,106 @@
+import sqlite3
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from device_state import DeviceState
+from history import HOUR, RAW_RETENTION, History, summarize
+
+DAY = 24 * HOUR
+T0 = 1_700_000_000 // DAY * DAY  # A midnight, so hours are whole
+
+
+@pytest.fixture
+def history(tmp_path):
+    fleet = SimpleNamespace(states={"lamp": DeviceState(), "desk": DeviceState()})
+    return History(str(tmp_path / "history.db"), fleet).open()
+
+
+def insert(history, rows):
+    """
+    Stores (ts, power, brightness) samples of "lamp" directly.
+    """
+    device = history._ids["lamp"]
+    db = sqlite3.connect(history.path)
+    with db:
+        db.executemany("INSERT INTO samples VALUES (?, ?, ?, ?, -1, -1)",
+                       [(ts, device, power, brightness) for ts, power, brightness in rows])
+    return db
+
+
+def test_summarize():
+    rows = [(T0 + 600, 1, 50), (T0 + 1800, 0, 50), (T0 + 3000, 1, 100)]
+    on_seconds, brightness_seconds, changes = summarize(rows, None, T0, T0 + HOUR)
+    assert on_seconds == 1200 + 600
+    assert brightness_seconds == 1200 * 50 + 600 * 100
+    assert changes == 3
+    # The anchor is the state in effect at the start of the span
+    assert summarize([], (1, 20), T0, T0 + HOUR) == (HOUR, HOUR * 20, 0)
+
+
+def test_rollup_matches_raw_usage(history):
+    db = insert(history, [
+        (T0 + 1800, 1, 50),             # On at 00:30
+        (T0 + HOUR + 900, 1, 100),      # Brighter at 01:15
+        (T0 + 3 * HOUR, 0, 100),        # Off at 03:00
+    ])
+    raw = history.usage("lamp", T0, T0 + 4 * HOUR)
+    history.downsample(db, now=T0 + 4 * HOUR + 60)
+    hourly = db.execute("SELECT hour, on_seconds, brightness_seconds, changes FROM hourly "
+                        "WHERE device = ? ORDER BY hour", (history._ids["lamp"],)).fetchall()
+    assert hourly == [
+        (T0, 1800, 1800 * 50, 1),
+        (T0 + HOUR, HOUR, 900 * 50 + 2700 * 100, 1),
+        (T0 + 2 * HOUR, HOUR, HOUR * 100, 0),
+        (T0 + 3 * HOUR, 0, 0, 1),
+    ]
+    assert history.usage("lamp", T0, T0 + 4 * HOUR) == raw
+    assert raw["on_seconds"] == 1800 + 2 * HOUR
+    assert raw["changes"] == 3
+
+
+def test_retention_keeps_the_anchor_sample(history):
+    db = insert(history, [(T0, 1, 40), (T0 + HOUR, 1, 60)])
+    now = T0 + RAW_RETENTION + 3 * HOUR
+    history.downsample(db, now=now)
+    remaining = db.execute("SELECT ts FROM samples").fetchall()
+    assert remaining == [(T0 + HOUR,)]  # The newest expired sample is what later spans start from
+    assert history.usage("lamp", now - HOUR, now)["avg_brightness"] == 60
+
+
+class RacingConnection:
+    """
+    Connection that lets a flush run right after usage() has read the buffer.
+    """
+    def __init__(self, db, history, writer):
+        self.db = db
+        self.history = history
+        self.writer = writer
+        self.raced = False
+
+    def execute(self, *args):
+        if not self.raced:
+            self.raced = True
+            threading.Thread(target=self.history.flush, args=(self.writer,), daemon=True).start()
+            time.sleep(0.2)
+        return self.db.execute(*args)
+
+    def close(self):
+        self.db.close()
+
+
+def test_usage_does_not_count_a_concurrent_flush_twice(history, monkeypatch):
+    state = history.fleet.states["lamp"]
+    state.apply(power=True, brightness=80)
+    history.sample(["lamp"])
+    writer = sqlite3.connect(history.path, check_same_thread=False)
+    connect = history._connect
+    monkeypatch.setattr(history, "_connect", lambda: RacingConnection(connect(), history, writer))
+    now = time.time()
+    assert history.usage("lamp", now - 60, now + 60)["changes"] == 1
+    monkeypatch.setattr(history, "_connect", connect)
+    time.sleep(0.1)
+    assert history.buffer.count == 0  # The flush went through afterwards
+    assert history.usage("lamp", now - 60, now + 60)["changes"] == 1
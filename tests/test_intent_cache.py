@@ -0,0 +1,47 @@
+import json
+
+import intent_cache
+from intent_cache import IntentCache
+
+RESULT = {"intent": "color.set", "parameters": {"color": "красный"}, "confidence": 1.0}
+
+
+def test_malformed_entries_are_skipped(tmp_path, capsys):
+    path = tmp_path / "cache.json"
+    now = 2e9
+    path.write_text(json.dumps([
+        ["лампа красный", now, RESULT],
+        ["truncated", now],
+        "not an entry",
+        [1, now, RESULT],
+        ["bad stamp", "yesterday", RESULT],
+        ["no intent", now, {"parameters": {}}],
+    ]), encoding="utf-8")
+    cache = IntentCache(str(path), ttl=float("inf"))
+    assert cache.get("Лампа, красный!") == RESULT
+    assert cache.stats()["size"] == 1
+    assert "Skipped 5 malformed entries" in capsys.readouterr().out
+
+
+def test_unreadable_file_starts_empty(tmp_path):
+    path = tmp_path / "cache.json"
+    path.write_text('{"lampa": 1}', encoding="utf-8")
+    assert IntentCache(str(path)).stats()["size"] == 0
+    path.write_text('[["лампа", 1', encoding="utf-8")
+    assert IntentCache(str(path)).stats()["size"] == 0
+
+
+def test_puts_are_saved_in_one_batch(tmp_path, monkeypatch):
+    monkeypatch.setattr(intent_cache, "SAVE_DELAY", 60.0)
+    path = tmp_path / "cache.json"
+    cache = IntentCache(str(path))
+    saves = []
+    save = cache.save
+    monkeypatch.setattr(cache, "save", lambda: (saves.append(1), save()))
+    for i in range(20):
+        cache.put(f"фраза {i}", RESULT)
+    assert not path.exists()
+    cache.flush()
+    cache.flush()
+    assert len(saves) == 1
+    assert IntentCache(str(path)).stats()["size"] == 20
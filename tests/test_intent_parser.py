@@ -0,0 +1,57 @@
+import pytest
+
+from colors import lookup_color
+from intent_parser import LOCAL_CONFIDENCE, LocalIntentParser
+
+CONFIDENT = [
+    ("лампа ярче", "brightness.adjust", {"operation": "выше"}),
+    ("лампа сделай потемнее", "brightness.adjust", {"operation": "ниже"}),
+    ("лампа убавь яркость", "brightness.adjust", {"operation": "ниже"}),
+    ("лампа яркость 50", "brightness.adjust", {"operation": "value", "value": 50}),
+    ("лампа 30 процентов", "brightness.adjust", {"operation": "value", "value": 30}),
+    ("лампа яркость на максимум", "brightness.adjust", {"operation": "value", "value": 100}),
+    ("лампа температура 4000", "temperature.set", {"temp": 4000}),
+    ("лампа температура выше", "temperature.set", {"operation": "выше"}),
+    ("лампа температура ниже", "temperature.set", {"operation": "ниже"}),
+    ("лампа повысь температуру", "temperature.set", {"operation": "выше"}),
+    ("лампа потеплее", "temperature.set", {"operation": "ниже"}),
+    ("лампа холоднее", "temperature.set", {"operation": "выше"}),
+    ("лампа теплый свет", "temperature.set", {"temp": 2700}),
+    ("Лампа, красный!", "color.set", {"color": "красный"}),
+    ("лампа включи зелёный цвет", "color.set", {"color": "зеленый"}),
+    ("лампа темно зеленый", "color.set", {"color": "темно зеленый"}),
+    ("лампа режим ночь", "preset.activate", {"preset": "ночь"}),
+    ("лампа день", "preset.activate", {"preset": "день"}),
+]
+
+AMBIGUOUS = [
+    "лампа синий 50 процентов",
+    "лампа температура 4000 яркость 50",
+    "лампа теплый 50 процентов",
+    "лампа день и ночь",
+    "лампа красный и синий",
+    "лампа режим ночь ярче",
+]
+
+
+@pytest.fixture
+def parser():
+    return LocalIntentParser(lookup_color, ["ночь", "день"])
+
+
+@pytest.mark.parametrize("text, intent, parameters", CONFIDENT)
+def test_confident_phrases(parser, text, intent, parameters):
+    result = parser.parse(text)
+    assert result["intent"] == intent
+    assert result["parameters"] == parameters
+    assert result["confidence"] >= LOCAL_CONFIDENCE
+
+
+@pytest.mark.parametrize("text", AMBIGUOUS)
+def test_mixed_phrases_go_to_dialogflow(parser, text):
+    assert parser.parse(text)["confidence"] < LOCAL_CONFIDENCE
+
+
+@pytest.mark.parametrize("text", ["лампа", "лампа что-то непонятное", "лампа температура 9000", "лампа яркость 500"])
+def test_unmatched_phrases(parser, text):
+    assert parser.parse(text) is None
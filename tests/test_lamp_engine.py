@@ -0,0 +1,118 @@
+import threading
+import time
+from concurrent.futures import Future
+
+import lamp_engine
+from lamp_engine import MAX_TEMP, TEMP_STEP
+
+
+def test_temperature_steps_from_the_current_value(bench):
+    bulb = bench.emulators[0]
+    bulb.props["ct"] = "4000"
+    bench.engine.update_status().result()
+    bench.engine.run_intent("temperature.set", {"operation": "выше"}).result()
+    assert bulb.props["ct"] == str(4000 + TEMP_STEP)
+    bench.engine.run_intent("temperature.set", {"operation": "ниже"}).result()
+    bench.engine.run_intent("temperature.set", {"operation": "ниже"}).result()
+    assert bulb.props["ct"] == str(4000 - TEMP_STEP)
+
+
+def test_temperature_step_is_clamped(bench):
+    bulb = bench.emulators[0]
+    bulb.props["ct"] = str(MAX_TEMP)
+    bench.engine.update_status().result()
+    bench.engine.run_intent("temperature.set", {"operation": "выше"}).result()
+    assert bulb.props["ct"] == str(MAX_TEMP)
+
+
+class FakePlayer:
+    """
+    Stands in for FramePlayer, whose music mode needs a bulb that connects back over TCP.
+    """
+    events = []
+
+    def __init__(self, fleet, name, flow):
+        self.name = name
+        self.future = Future()
+
+    def start(self):
+        FakePlayer.events.append(("start", self))
+        return self
+
+    def stop(self):
+        def shut_down():
+            time.sleep(0.2)  # The last frame and set_music [0]
+            FakePlayer.events.append(("stopped", self))
+            self.future.set_result(None)
+        threading.Thread(target=shut_down, daemon=True).start()
+
+
+def test_next_effect_waits_for_the_replaced_player(bench, monkeypatch):
+    monkeypatch.setattr(lamp_engine, "FramePlayer", FakePlayer)
+    FakePlayer.events = []
+    engine = bench.engine
+    engine.play_effect("strobe", hz=20)  # Too fast for a native flow
+    first = engine._players["bulb0"]
+    second_future = engine.play_effect("strobe", hz=20)
+    second = engine._players["bulb0"]
+    assert ("start", second) not in FakePlayer.events  # Not before the first has let go
+    time.sleep(0.4)
+    assert FakePlayer.events == [("start", first), ("stopped", first), ("start", second)]
+    assert not second_future.done()  # Resolves when the second player ends
+
+    engine.play_effect("breathe").result(timeout=5)
+    assert FakePlayer.events[-1] == ("stopped", second)
+    assert bench.emulators[0].commands.get("start_cf") == 1
+    assert "bulb0" not in engine._players
+
+
+def test_poll_refreshes_every_stale_bulb(bench):
+    engine = bench.engine
+    assert engine.poll_stale() == {}  # All fresh after connecting
+    engine.fleet.states["bulb1"].touch()
+    engine.fleet.states["bulb1"].updated_at -= 60
+    bench.emulators[1].props["bright"] = "15"
+    polled = engine.poll_stale()
+    assert list(polled) == ["bulb1"]  # Not the selected bulb0
+    polled["bulb1"].result()
+    assert engine.fleet.states["bulb1"].brightness == 15
+    assert engine.fleet.states["bulb1"].is_fresh(1.0)
+
+
+def test_brightness_value_is_parsed_before_the_job(bench):
+    bulb = bench.emulators[0]
+    bench.engine.run_intent("brightness.adjust", {"value": "50.0"}).result()
+    assert bulb.props["bright"] == "50"
+    commands = dict(bulb.commands)
+    assert bench.engine.run_intent("brightness.adjust", {"value": "много"}) is None
+    assert bench.engine.run_intent("brightness.adjust", {"value": 250}) is None
+    assert bulb.commands == commands
+
+
+def test_unexpected_job_errors_reach_on_error_without_raising(bench):
+    engine = bench.engine
+    raised = []
+    reported = []
+    done = threading.Event()
+
+    def dispatch(func, *args):
+        try:
+            func(*args)
+        except Exception as e:
+            raised.append(e)
+        done.set()
+
+    def broken(state):
+        def job(device):
+            raise ValueError("bad value")
+        return job
+
+    engine.dispatch = dispatch
+    engine.send(broken, on_error=lambda name, e: reported.append((name, type(e)))).result()
+    assert done.wait(5)
+    assert reported == [("bulb0", ValueError)]
+
+    done.clear()
+    engine.send(broken).result()  # No on_error: printed, the listeners still run
+    assert done.wait(5)
+    assert raised == []
@@ -0,0 +1,17 @@
+import pytest
+
+import lampd
+
+
+@pytest.mark.parametrize("args", [
+    ["brightness"], ["temp"], ["rgb", "1", "2"], ["effect"], ["preset"], ["say"], ["--target"], ["blink"],
+])
+def test_missing_arguments_print_usage(args, capsys, monkeypatch):
+    monkeypatch.setattr(lampd, "LampEngine", None)  # Rejected before any bulb is touched
+    assert lampd.main(args) == 2
+    assert "Usage: python lampd.py" in capsys.readouterr().out
+
+
+def test_help_exits_cleanly(capsys):
+    assert lampd.main(["--help"]) == 0
+    assert "Usage" in capsys.readouterr().out
@@ -0,0 +1,97 @@
+import json
+import socket
+import threading
+import time
+
+import pytest
+
+import lan_events
+from device_state import DeviceState
+from lan_events import NotificationListener
+
+
+class FakeLanBulb:
+    """
+    TCP server speaking the Yeelight LAN control protocol: answers get_prop and sends notifications.
+    """
+    def __init__(self, props):
+        self.props = props
+        self.answering = True
+        self.connections = 0
+        self.requests = []
+        self._conn = None
+        self._server = socket.create_server(("127.0.0.1", 0))
+        self.port = self._server.getsockname()[1]
+        threading.Thread(target=self._serve, daemon=True).start()
+
+    def _serve(self):
+        while True:
+            try:
+                conn, _ = self._server.accept()
+            except OSError:
+                return
+            self.connections += 1
+            self._conn = conn
+            with conn:
+                for line in conn.makefile("rb"):
+                    request = json.loads(line)
+                    self.requests.append(request["method"])
+                    if self.answering:
+                        result = [self.props.get(name, "") for name in request["params"]]
+                        conn.sendall(json.dumps({"id": request["id"], "result": result}).encode() + b"\r\n")
+
+    def notify(self, **params):
+        self._conn.sendall(json.dumps({"method": "props", "params": params}).encode() + b"\r\n")
+
+    def close(self):
+        self._server.close()
+
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def fast(monkeypatch):
+    monkeypatch.setattr(lan_events, "READ_TIMEOUT", 0.02)
+    monkeypatch.setattr(lan_events, "CHECK_INTERVAL", 0.2)
+    monkeypatch.setattr(lan_events, "CHECK_TIMEOUT", 0.2)
+    monkeypatch.setattr(lan_events, "RECONNECT_DELAY", 0.05)
+
+
+def test_connect_refreshes_the_stale_cache(fast):
+    bulb = FakeLanBulb({"power": "off", "bright": "20", "ct": "2700", "rgb": "0", "color_mode": "2"})
+    state = DeviceState()
+    state.apply(power=True, brightness=80, color_temp=6500)  # What the cache held before a power cycle
+    listener = NotificationListener("127.0.0.1", state, port=bulb.port).start()
+    try:
+        wait_for(lambda: state.is_fresh(1.0))
+        assert state.snapshot() == {"power": False, "brightness": 20, "color_temp": 2700, "rgb": None}
+    finally:
+        listener.stop()
+        bulb.close()
+
+
+def test_silence_does_not_count_as_fresh(fast):
+    bulb = FakeLanBulb({"power": "on", "bright": "50", "ct": "4000", "rgb": "0", "color_mode": "2"})
+    state = DeviceState()
+    listener = NotificationListener("127.0.0.1", state, port=bulb.port).start()
+    try:
+        wait_for(lambda: state.known)
+        bulb.answering = False
+        confirmed = state.updated_at
+        time.sleep(0.15)  # Several read timeouts, no messages
+        assert state.updated_at == confirmed
+
+        bulb.notify(bright="70")
+        wait_for(lambda: state.brightness == 70)
+        assert state.updated_at > confirmed
+
+        # The next check goes unanswered, so the listener reconnects
+        wait_for(lambda: bulb.connections == 2)
+    finally:
+        listener.stop()
+        bulb.close()
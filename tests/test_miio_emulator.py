@@ -0,0 +1,32 @@
+import hashlib
+import socket
+
+from conftest import TOKEN
+from miio_emulator import HEADER, MAGIC
+
+
+def send(bulb, packet):
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        sock.settimeout(1.0)
+        sock.sendto(packet, bulb.address)
+        try:
+            return sock.recvfrom(4096)[0]
+        except socket.timeout:
+            return None
+
+
+def test_malformed_packets_do_not_stop_the_emulator(emulator):
+    bulb = emulator(60)
+    token = bytes.fromhex(TOKEN)
+    payload = b"not a multiple of the AES block"
+    header = HEADER.pack(MAGIC, 32 + len(payload), 0, bulb.did, 1)
+    packet = header + hashlib.md5(header + token + payload).digest() + payload
+    assert send(bulb, packet) is None
+    assert bulb.stats()["malformed"] == 1
+    hello = HEADER.pack(MAGIC, 32, 0xFFFFFFFF, 0xFFFFFFFF, 0xFFFFFFFF) + b"\xff" * 16
+    assert send(bulb, hello) is not None  # Still answering
+
+
+def test_stop_frees_the_port(emulator):
+    emulator(61).stop()
+    emulator(61).stop()
@@ -0,0 +1,33 @@
+import socket
+
+import pytest
+
+import music_mode
+from conftest import MODEL, TOKEN
+from device_executor import DeviceExecutor
+from lamp_engine import yeelight_class
+from music_mode import MusicStream, encode_frame
+
+
+def test_bulb_leaves_music_mode_when_it_never_connects(emulator, monkeypatch):
+    monkeypatch.setattr(music_mode, "ACCEPT_TIMEOUT", 0.2)
+    bulb = emulator(80)  # Takes set_music but, unlike a real bulb, never connects back
+    fast = type("FastYeelight", (yeelight_class(),), {"timeout": 0.5})
+    executor = DeviceExecutor(name="music-test")
+    try:
+        executor.connect(lambda: fast(ip=bulb.address[0], token=TOKEN, model=MODEL)).result(5)
+        with pytest.raises(socket.timeout):
+            MusicStream(executor, bulb.address[0]).start()
+    finally:
+        executor.shutdown()
+    assert bulb.commands["set_music"] == 2
+    assert bulb.props["music_on"] == "0"
+
+
+def test_frames_encode_as_single_lan_commands():
+    assert encode_frame(1, rgb=(255, 0, 0), brightness=50) == (
+        b'{"id":1,"method":"set_scene","params":["color",16711680,50]}\r\n'
+    )
+    assert encode_frame(2, brightness=10) == b'{"id":2,"method":"set_bright","params":[10,"sudden",0]}\r\n'
+    with pytest.raises(ValueError):
+        encode_frame(3)
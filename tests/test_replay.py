@@ -0,0 +1,12 @@
+import json
+
+import replay
+
+
+def test_empty_registry_exits_with_a_message(tmp_path, capsys):
+    trace = tmp_path / "trace.jsonl"
+    trace.write_text(json.dumps({"start": 0}) + "\n" + json.dumps({"t": 0, "cmd": "toggle_power", "kw": {}}) + "\n")
+    config = tmp_path / "config.json"
+    config.write_text(json.dumps({"DISCOVERY": False}))
+    assert replay.main([str(trace), "--config", str(config)]) == 1
+    assert "No bulbs in" in capsys.readouterr().out
@@ -0,0 +1,58 @@
+import pytest
+
+from scenes import DEFAULT_PRESETS, compile_scene, load_presets, preset_to_scene, rgb_to_int
+
+
+def sent(bulb, before):
+    return {method: count - before.get(method, 0) for method, count in bulb.commands.items()
+            if count != before.get(method, 0)}
+
+
+@pytest.mark.parametrize("name", list(DEFAULT_PRESETS))
+def test_preset_is_one_set_scene(bench, name):
+    bulb = bench.emulators[0]
+    bulb.props["power"] = "off"
+    bench.engine.update_status().result()
+    before = dict(bulb.commands)
+    bench.engine.activate_preset({"preset": name}).result()
+    assert sent(bulb, before) == {"set_scene": 1}
+    preset = DEFAULT_PRESETS[name]
+    assert bulb.props["power"] == "on"
+    assert bulb.props["bright"] == str(preset["brightness"])
+    if "rgb" in preset:
+        assert bulb.props["rgb"] == str(rgb_to_int(preset["rgb"]))
+    else:
+        assert bulb.props["ct"] == str(preset["temp"])
+
+
+def test_repeated_preset_sends_nothing(bench):
+    bulb = bench.emulators[0]
+    bench.engine.activate_preset({"preset": "ночь"}).result()
+    before = dict(bulb.commands)
+    bench.engine.activate_preset({"preset": "ночь"}).result()
+    assert sent(bulb, before) == {}
+
+
+def test_group_preset_is_one_set_scene_per_bulb(bench):
+    befores = [dict(bulb.commands) for bulb in bench.emulators]
+    bench.engine.apply_scene("all", brightness=40, color_temp=2700).result()
+    for bulb, before in zip(bench.emulators, befores):
+        assert sent(bulb, before) == {"set_scene": 1}
+        assert (bulb.props["bright"], bulb.props["ct"]) == ("40", "2700")
+
+
+def test_lone_brightness_on_a_lit_bulb_is_set_bright(bench):
+    bulb = bench.emulators[0]
+    before = dict(bulb.commands)
+    bench.engine.apply_scene(brightness=20).result()
+    assert sent(bulb, before) == {"set_bright": 1}
+
+
+def test_presets_from_config():
+    presets = load_presets({"PRESETS": {"Чтение": {"brightness": "80", "temp": 4500}, "сломан": {"rgb": [1, 2]}}})
+    assert presets == {"чтение": {"brightness": 80, "color_temp": 4500}}
+    assert preset_to_scene({"brightness": 10, "rgb": [255, 0, 0], "temp": 3000}) == {
+        "brightness": 10, "rgb": (255, 0, 0),  # rgb wins over a temperature
+    }
+    assert compile_scene(30, rgb=(255, 0, 0)) == ["color", 0xFF0000, 30]
+    assert compile_scene(30, color_temp=2700) == ["ct", 2700, 30]
@@ -0,0 +1,29 @@
+import pytest
+
+from speech_backends import RecognizerBackend
+
+
+class ScriptedBackend(RecognizerBackend):
+    name = "scripted"
+
+    def __init__(self, *results):
+        self.results = results
+
+    def stream(self, pcm):
+        yield from self.results
+
+
+def test_backends_must_implement_stream():
+    with pytest.raises(TypeError):
+        RecognizerBackend()
+
+    class Incomplete(RecognizerBackend):
+        pass
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+
+def test_recognize_returns_the_first_final_text():
+    backend = ScriptedBackend(("лампа", False), ("лампа красный", True), ("ignored", True))
+    assert backend.recognize(b"") == "лампа красный"
@@ -0,0 +1,97 @@
+import threading
+import time
+from concurrent.futures import Future
+
+from throttle import CoalescingThrottle
+
+INTERVAL = 0.1
+
+
+class Recorder:
+    """
+    Sender that records (value, seconds since creation) and optionally returns a pending Future.
+    """
+    def __init__(self, inflight=False):
+        self.calls = []
+        self.futures = []
+        self.inflight = inflight
+        self.sent = threading.Event()
+        self._began = time.monotonic()
+
+    def __call__(self, value):
+        self.calls.append((value, time.monotonic() - self._began))
+        self.sent.set()
+        if self.inflight:
+            future = Future()
+            self.futures.append(future)
+            return future
+        return None
+
+    def values(self):
+        return [value for value, _ in self.calls]
+
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condition not reached"
+        time.sleep(0.005)
+
+
+def test_first_value_is_sent_at_once():
+    throttle = CoalescingThrottle(interval=INTERVAL)
+    sender = Recorder()
+    throttle.push(sender, 1)
+    assert sender.sent.wait(1)
+    assert sender.calls[0][1] < INTERVAL / 2
+
+
+def test_values_within_an_interval_collapse_to_the_last():
+    throttle = CoalescingThrottle(interval=INTERVAL)
+    sender = Recorder()
+    throttle.push(sender, 1)
+    sender.sent.wait(1)
+    for value in (2, 3, 4):
+        throttle.push(sender, value)
+    wait_for(lambda: len(sender.calls) == 2)
+    time.sleep(INTERVAL * 2)
+    assert sender.values() == [1, 4]
+    assert sender.calls[1][1] >= INTERVAL * 0.9  # Trailing edge, one interval after the first
+
+
+def test_senders_are_throttled_independently():
+    throttle = CoalescingThrottle(interval=INTERVAL)
+    brightness, color = Recorder(), Recorder()
+    throttle.push(brightness, 10)
+    throttle.push(color, (255, 0, 0))
+    wait_for(lambda: brightness.calls and color.calls)
+    assert brightness.calls[0][1] < INTERVAL / 2
+    assert color.calls[0][1] < INTERVAL / 2
+
+
+def test_values_coalesce_while_a_write_is_in_flight():
+    throttle = CoalescingThrottle(interval=INTERVAL)
+    sender = Recorder(inflight=True)
+    throttle.push(sender, 1)
+    sender.sent.wait(1)
+    for value in (2, 3):
+        throttle.push(sender, value)
+        time.sleep(INTERVAL)
+    assert sender.values() == [1]  # Held back past the interval until the bulb answered
+    sender.futures[0].set_result(None)
+    wait_for(lambda: len(sender.calls) == 2)
+    time.sleep(INTERVAL * 2)
+    assert sender.values() == [1, 3]
+
+
+def test_sender_errors_do_not_stop_the_worker():
+    throttle = CoalescingThrottle(interval=0.0)
+    sender = Recorder()
+
+    def failing(value):
+        raise ValueError(value)
+
+    throttle.push(failing, 1)
+    throttle.push(sender, 2)
+    assert sender.sent.wait(1)
+    assert sender.values() == [2]
@@ -0,0 +1,95 @@
+import os
+import wave
+
+import pytest
+
+from wake_word import SAMPLE_RATE, SAMPLE_WIDTH, AudioGate, EnergyVAD, VoskWakeWord, read_wav
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")  # Rebuilt by make_wav.py
+BYTES_PER_SECOND = SAMPLE_RATE * SAMPLE_WIDTH
+
+
+def fixture(name):
+    return read_wav(os.path.join(FIXTURES, name))
+
+
+def seconds(segments):
+    return [(round(s / BYTES_PER_SECOND, 1), round(e / BYTES_PER_SECOND, 1)) for s, e in segments]
+
+
+class ScriptedSpotter:
+    """
+    Hears the wake word in the segments listed by index and records what it was given.
+    """
+    def __init__(self, *hits):
+        self.hits = hits
+        self.heard = []
+
+    def detect(self, pcm):
+        self.heard.append(pcm)
+        return len(self.heard) - 1 in self.hits
+
+
+@pytest.mark.parametrize("name", ["silence.wav", "click.wav"])
+def test_noise_is_never_forwarded(name):
+    gate = AudioGate()
+    assert EnergyVAD().segments(fixture(name)) == []
+    assert gate.process(fixture(name)) is None
+    assert (gate.passed, gate.rejected) == (0, 1)
+
+
+def test_speech_is_trimmed_to_the_voiced_part():
+    pcm = fixture("command.wav")
+    segments = EnergyVAD().segments(pcm)
+    assert seconds(segments) == [(0.6, 1.7)]
+    forwarded = AudioGate().process(pcm)
+    assert forwarded == pcm[segments[0][0]:segments[0][1]]
+
+
+def test_pause_within_hangover_keeps_one_segment():
+    pcm = fixture("command.wav")
+    assert len(EnergyVAD(hangover_ms=30).segments(pcm)) > 1  # Gaps between syllables
+    assert len(EnergyVAD().segments(pcm)) == 1
+
+
+def test_two_phrases_are_forwarded_from_the_wake_word_on():
+    pcm = fixture("two_phrases.wav")
+    first, second = EnergyVAD().segments(pcm)
+    spotter = ScriptedSpotter(1)
+    assert AudioGate(spotter=spotter).process(pcm) == pcm[second[0]:second[1]]
+    assert [len(heard) for heard in spotter.heard] == [first[1] - first[0], second[1] - second[0]]
+
+    spotter = ScriptedSpotter(0)
+    assert AudioGate(spotter=spotter).process(pcm) == pcm[first[0]:second[1]]
+    assert len(spotter.heard) == 1
+
+
+def test_segments_without_the_wake_word_are_dropped():
+    gate = AudioGate(spotter=ScriptedSpotter())
+    assert gate.process(fixture("two_phrases.wav")) is None
+    assert gate.rejected == 1
+
+
+def test_spotter_hears_only_the_wake_window():
+    pcm = fixture("command.wav") * 2  # A long segment: the command twice without a pause
+    spotter = ScriptedSpotter(0)
+    AudioGate(vad=EnergyVAD(hangover_ms=1500), spotter=spotter).process(pcm)
+    assert len(spotter.heard[0]) == int(1.5 * SAMPLE_RATE) * SAMPLE_WIDTH
+
+
+def test_read_wav_rejects_other_formats(tmp_path):
+    path = str(tmp_path / "stereo.wav")
+    with wave.open(path, "wb") as f:
+        f.setnchannels(2)
+        f.setsampwidth(SAMPLE_WIDTH)
+        f.setframerate(SAMPLE_RATE)
+        f.writeframes(b"\x00" * 400)
+    with pytest.raises(ValueError, match="16 kHz 16-bit mono"):
+        read_wav(path)
+
+
+@pytest.mark.skipif(not os.environ.get("WAKE_WORD_MODEL"), reason="set WAKE_WORD_MODEL to a Vosk model directory")
+def test_vosk_spotter_ignores_voiceless_audio():
+    pytest.importorskip("vosk")
+    spotter = VoskWakeWord(os.environ["WAKE_WORD_MODEL"])
+    assert AudioGate(spotter=spotter).process(fixture("command.wav")) is None
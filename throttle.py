@@ -0,0 +1,64 @@
+import threading
+import time
+from concurrent.futures import Future
+
+
+class CoalescingThrottle:
+    """
+    Latest-value-wins channel: sends each property at most once per interval from one long-lived worker.
+
+    The first value after a quiet period is sent at once (leading edge), values pushed while
+    the interval runs overwrite each other and the last one is sent when it ends (trailing edge).
+    If a sender returns a Future, the next value for that property waits until it completes.
+    """
+    def __init__(self, interval=0.2, name="slider-throttle"):
+        self.interval = interval
+        self._cond = threading.Condition()
+        self._pending = {}    # sender -> latest value
+        self._last_sent = {}  # sender -> time of the last send
+        self._inflight = {}   # sender -> Future of the last send
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def push(self, sender, value):
+        with self._cond:
+            self._pending[sender] = value
+            self._cond.notify()
+
+    def _wake(self, _future=None):
+        with self._cond:
+            self._cond.notify()
+
+    def _next_batch(self):
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                ready = []
+                wait = None
+                for sender in self._pending:
+                    inflight = self._inflight.get(sender)
+                    if inflight is not None and not inflight.done():
+                        continue
+                    due = self._last_sent.get(sender, float("-inf")) + self.interval
+                    if due <= now:
+                        ready.append(sender)
+                    elif wait is None or due - now < wait:
+                        wait = due - now
+                if ready:
+                    for sender in ready:
+                        self._last_sent[sender] = now
+                    return [(sender, self._pending.pop(sender)) for sender in ready]
+                self._cond.wait(wait)
+
+    def _run(self):
+        while True:
+            for sender, value in self._next_batch():
+                try:
+                    result = sender(value)
+                except Exception as e:
+                    print(f"Slider error: {e}")
+                    continue
+                if isinstance(result, Future):
+                    with self._cond:
+                        self._inflight[sender] = result
+                    result.add_done_callback(self._wake)
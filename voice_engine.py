@@ -0,0 +1,281 @@
+import os
+import threading
+import time
+
+from colors import lookup_color
+from command_trace import source
+from intent_cache import IntentCache
+from intent_parser import LOCAL_CONFIDENCE, WAKE_WORD, LocalIntentParser
+from metrics import METRICS
+from speech_backends import CHUNK_BYTES, create_backend
+from voice_pipeline import VoicePipeline
+from wake_word import SAMPLE_RATE, SAMPLE_WIDTH, AudioGate, VoskWakeWord
+
+VOICE_EXECUTE_TIMEOUT = 10  # Seconds the execution stage waits for the bulbs
+DIALOGFLOW_TIMEOUT = 10  # Seconds per Dialogflow call, retries included; the client defaults wait 220
+
+
+class VoiceProcessor:
+    """
+    Processes voice commands with a local intent parser, falling back to cached or live Dialogflow results.
+    """
+    def __init__(self, local_parser=None, cache=None, endpoint=None):
+        self.project_id = "smartbulbproject"  # Replace with your Google Cloud Project ID
+        self.credentials_path = "smartbulbproject-2955748c5ce9.json"  # Path to the service account file
+
+        os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = self.credentials_path
+        self.local_parser = local_parser
+        self.cache = cache if cache is not None else IntentCache()
+        self.endpoint = endpoint  # host:port of a local fake Dialogflow server, plain gRPC without credentials
+        self._session_client = None  # Created on the first Dialogflow fallback, so local commands work offline
+        self.session_id = "1-session"  # Unique session identifier
+
+    @property
+    def session_client(self):
+        """
+        One long-lived client, so every request reuses the same gRPC channel.
+        """
+        if self._session_client is None:
+            from google.cloud import dialogflow_v2 as df
+
+            if self.endpoint:
+                import grpc
+                from google.cloud.dialogflow_v2.services.sessions.transports import SessionsGrpcTransport
+
+                transport = SessionsGrpcTransport(channel=grpc.insecure_channel(self.endpoint))
+                self._session_client = df.SessionsClient(transport=transport)
+            else:
+                self._session_client = df.SessionsClient()
+        return self._session_client
+
+    @staticmethod
+    def parse_query_result(query_result):
+        from google.protobuf.json_format import MessageToDict
+
+        result = MessageToDict(query_result._pb)
+        intent = result["intent"]["displayName"]
+        parameters = result.get("parameters", {})
+        confidence = result.get("intentDetectionConfidence", 0)
+        return {"intent": intent, "parameters": parameters, "confidence": confidence}
+
+    def process_audio(self, pcm, sample_rate=SAMPLE_RATE):
+        """
+        Streams raw 16-bit audio through streaming_detect_intent: recognition and intent in one round trip.
+
+        Returns (transcript, result) or (None, None) on error.
+        """
+        try:
+            from google.cloud import dialogflow_v2 as df
+
+            session = self.session_client.session_path(self.project_id, self.session_id)
+            audio_config = df.InputAudioConfig(
+                audio_encoding=df.AudioEncoding.AUDIO_ENCODING_LINEAR_16,
+                sample_rate_hertz=sample_rate,
+                language_code="ru-RU",
+                single_utterance=True,
+            )
+
+            def requests():
+                yield df.StreamingDetectIntentRequest(
+                    session=session, query_input=df.QueryInput(audio_config=audio_config)
+                )
+                for offset in range(0, len(pcm), CHUNK_BYTES):
+                    yield df.StreamingDetectIntentRequest(input_audio=pcm[offset:offset + CHUNK_BYTES])
+
+            query_result = None
+            with METRICS.timer("dialogflow_seconds", call="streaming_detect_intent"):
+                responses = self.session_client.streaming_detect_intent(requests=requests(), timeout=DIALOGFLOW_TIMEOUT)
+                for response in responses:
+                    if response.query_result.query_text:
+                        query_result = response.query_result
+            if query_result is None:
+                return "", None
+            text = query_result.query_text
+            result = self.parse_query_result(query_result)
+            self.cache.put(text, result)
+            return text, result
+
+        except Exception as e:
+            METRICS.error("dialogflow_errors_total", e, call="streaming_detect_intent")
+            print(f"Dialogflow error: {str(e)}")
+            return None, None
+
+    def process_query(self, text):
+        if self.local_parser:
+            result = self.local_parser.parse(text)
+            if result and result["confidence"] >= LOCAL_CONFIDENCE:
+                METRICS.count("intent_source_total", source="local")
+                return result
+        cached = self.cache.get(text)
+        if cached is not None:
+            METRICS.count("intent_source_total", source="cache")
+            return cached
+        try:
+            from google.api_core import exceptions, retry
+            from google.cloud import dialogflow_v2 as df
+
+            session = self.session_client.session_path(self.project_id, self.session_id)
+            # Unavailable servers are retried, but only until the voice command would feel lost
+            retry_policy = retry.Retry(
+                predicate=retry.if_exception_type(exceptions.ServiceUnavailable), deadline=DIALOGFLOW_TIMEOUT
+            )
+            text_input = df.TextInput(text=text, language_code="ru-RU")
+            query_input = df.QueryInput(text=text_input)
+            with METRICS.timer("dialogflow_seconds", call="detect_intent"):
+                response = self.session_client.detect_intent(
+                    request={"session": session, "query_input": query_input},
+                    retry=retry_policy,
+                    timeout=DIALOGFLOW_TIMEOUT,
+                )
+            METRICS.count("intent_source_total", source="dialogflow")
+
+            result = self.parse_query_result(response.query_result)
+            self.cache.put(text, result)
+            return result
+
+        except Exception as e:
+            METRICS.error("dialogflow_errors_total", e, call="detect_intent")
+            print(f"Dialogflow error: {str(e)}")
+            return None
+
+
+class VoiceControl:
+    """
+    Microphone -> wake word -> recognition -> intent -> LampEngine, built on a background thread.
+
+    start() returns at once; speech_recognition, the Vosk models and the ambient noise
+    calibration load off the caller's thread. on_command() is called after an intent runs.
+    """
+    def __init__(self, engine, on_command=None):
+        self.engine = engine
+        self.config = engine.config
+        self.on_command = on_command
+        self.voice_processor = VoiceProcessor(
+            LocalIntentParser(lookup_color, engine.presets),
+            endpoint=self.config.get("DIALOGFLOW_ENDPOINT")
+        )
+        self.voice_pipeline = None
+        self.stop_listening = None
+        self.ready_in = None  # Seconds spent in start-up, set once listening
+
+    def start(self):
+        threading.Thread(target=self.voice_loop, name="voice-init", daemon=True).start()
+
+    def stop(self):
+        if self.stop_listening:
+            self.stop_listening(wait_for_stop=False)
+        self.voice_processor.cache.flush()
+
+    def voice_loop(self):
+        """
+        Builds the pipeline and runs continuous background audio capture feeding it.
+        """
+        started = time.perf_counter()
+        import speech_recognition as sr
+
+        self.recognizer = sr.Recognizer()
+        self.microphone = sr.Microphone()
+        self.audio_gate = self.create_audio_gate()
+        if self.config.get("VOICE_MODE") == "streaming":
+            # Audio goes straight to Dialogflow, which returns the transcript and the intent together
+            stages = [("wake", self.wake_stage), ("dialogflow", self.streaming_stage)]
+        else:
+            self.speech_backend = create_backend(self.config, self.recognizer)
+            stages = [("wake", self.wake_stage), ("recognition", self.recognize_stage), ("intent", self.intent_stage)]
+        self.voice_pipeline = VoicePipeline(stages + [("execution", self.execute_stage)], on_done=self.on_voice_done)
+        METRICS.gauge("voice_queue_depth", self.voice_pipeline.queue_depths)
+
+        def callback(recognizer, audio):
+            self.voice_pipeline.capture(audio)
+
+        with self.microphone as source:
+            self.recognizer.adjust_for_ambient_noise(source, duration=1)
+        self.stop_listening = self.recognizer.listen_in_background(self.microphone, callback)
+        self.ready_in = time.perf_counter() - started
+        print(f"Voice control ready in {self.ready_in * 1000:.0f} ms")
+
+    def create_audio_gate(self):
+        """
+        Local VAD, plus the wake word spotter when "WAKE_WORD_MODEL" points to a Vosk model.
+        """
+        spotter = None
+        model_path = self.config.get("WAKE_WORD_MODEL")
+        if model_path:
+            try:
+                spotter = VoskWakeWord(model_path)
+            except Exception as e:
+                print(f"Wake word spotter unavailable: {e}")
+        return AudioGate(spotter=spotter)
+
+    def wake_stage(self, utterance):
+        """
+        Keeps silence and phrases without the wake word on this machine.
+        """
+        audio = self.audio_gate.process_audio(utterance.audio)
+        if audio is None:
+            return False
+        utterance.audio = audio
+
+    def recognize_stage(self, utterance):
+        """
+        Speech to text with the configured backend; only phrases mentioning the lamp go further.
+        """
+        pcm = utterance.audio.get_raw_data(convert_rate=SAMPLE_RATE, convert_width=SAMPLE_WIDTH)
+        previous = None
+        for text, final in self.speech_backend.stream(pcm):
+            utterance.text = text
+            if final:
+                break
+            # A partial that stayed the same for two chunks and is already a confident local command ends decoding
+            if text == previous and WAKE_WORD in text.lower():
+                result = self.voice_processor.local_parser.parse(text)
+                if result and result["confidence"] >= LOCAL_CONFIDENCE:
+                    break
+            previous = text
+        if not utterance.text:
+            return False
+        print(f"Recognized text: {utterance.text}")
+        return WAKE_WORD in utterance.text.lower()  # If "lamp" is mentioned, process the command
+
+    def intent_stage(self, utterance):
+        """
+        Resolves the intent locally or via Dialogflow.
+        """
+        response = self.voice_processor.process_query(utterance.text)
+        if not response:
+            return False
+        print(f"Intent: {response['intent']}, Params: {response['parameters']}, Conf: {response['confidence']}")
+        utterance.intent = response
+        return response['intent'] in self.engine.advanced_commands
+
+    def streaming_stage(self, utterance):
+        """
+        Recognition and intent resolution in a single streaming_detect_intent call.
+        """
+        pcm = utterance.audio.get_raw_data(convert_rate=SAMPLE_RATE, convert_width=SAMPLE_WIDTH)
+        utterance.text, response = self.voice_processor.process_audio(pcm)
+        if not utterance.text or WAKE_WORD not in utterance.text.lower() or not response:
+            return False
+        print(f"Recognized text: {utterance.text}")
+        print(f"Intent: {response['intent']}, Params: {response['parameters']}, Conf: {response['confidence']}")
+        utterance.intent = response
+        return response['intent'] in self.engine.advanced_commands
+
+    def execute_stage(self, utterance):
+        """
+        Runs the intent handler and waits until the bulbs have answered.
+        """
+        with source("voice"):
+            future = self.engine.run_intent(utterance.intent['intent'], utterance.intent['parameters'])
+        if self.on_command:
+            self.on_command(utterance)
+        if future is not None:
+            future.result(timeout=VOICE_EXECUTE_TIMEOUT)
+
+    def on_voice_done(self, utterance):
+        METRICS.observe("voice_command_seconds", utterance.timestamps[-1][1] - utterance.timestamps[0][1])
+        stages = ", ".join(f"{stage} {ms} ms" for stage, ms in utterance.latencies().items())
+        print(f"Voice command #{utterance.id}: {stages}")
+
+    def stats(self):
+        return self.voice_pipeline.stats() if self.voice_pipeline else {}
@@ -0,0 +1,112 @@
+import collections
+import itertools
+import threading
+import time
+
+from metrics import METRICS
+
+STAGE_QUEUE_SIZE = 2  # Utterances waiting per stage; older ones are dropped when a stage falls behind
+
+
+class DropOldestQueue:
+    """
+    Bounded queue whose put never blocks: when full, the oldest item is discarded.
+    """
+    def __init__(self, maxsize=STAGE_QUEUE_SIZE):
+        self._items = collections.deque(maxlen=maxsize)
+        self._cond = threading.Condition()
+        self.dropped = 0
+
+    def put(self, item):
+        with self._cond:
+            if len(self._items) == self._items.maxlen:
+                self.dropped += 1
+            self._items.append(item)
+            self._cond.notify()
+
+    def get(self):
+        with self._cond:
+            while not self._items:
+                self._cond.wait()
+            return self._items.popleft()
+
+    def __len__(self):
+        return len(self._items)
+
+
+class Utterance:
+    """
+    One spoken phrase travelling through the pipeline, with a timestamp per finished stage.
+    """
+    _ids = itertools.count(1)
+
+    def __init__(self, audio):
+        self.id = next(self._ids)
+        self.audio = audio
+        self.text = None
+        self.intent = None
+        self.timestamps = [("captured", time.perf_counter())]
+
+    def mark(self, stage):
+        self.timestamps.append((stage, time.perf_counter()))
+
+    def latencies(self):
+        """
+        Milliseconds spent in every stage, in pipeline order.
+        """
+        return {
+            stage: round((stamp - previous) * 1000, 1)
+            for (_, previous), (stage, stamp) in zip(self.timestamps, self.timestamps[1:])
+        }
+
+
+class VoicePipeline:
+    """
+    Capture -> recognition -> intent -> execution, each stage on its own thread.
+
+    Stages are (name, func) pairs; func(utterance) returns False to stop processing
+    that utterance. A slow cloud call in one stage never blocks audio capture.
+    """
+    def __init__(self, stages, queue_size=STAGE_QUEUE_SIZE, on_done=None):
+        self.stages = stages
+        self.on_done = on_done
+        self.queues = [DropOldestQueue(queue_size) for _ in stages]
+        for index, (name, _) in enumerate(stages):
+            threading.Thread(target=self._run, args=(index,), name=f"voice-{name}", daemon=True).start()
+
+    def capture(self, audio):
+        """
+        Entry point for the audio listener thread; returns immediately.
+        """
+        self.queues[0].put(Utterance(audio))
+
+    def stats(self):
+        return {
+            name: {"depth": len(q), "dropped": q.dropped}
+            for (name, _), q in zip(self.stages, self.queues)
+        }
+
+    def queue_depths(self):
+        """
+        Gauge reader for METRICS: waiting utterances per stage.
+        """
+        return {(("stage", name),): len(q) for (name, _), q in zip(self.stages, self.queues)}
+
+    def _run(self, index):
+        name, func = self.stages[index]
+        queue = self.queues[index]
+        while True:
+            utterance = queue.get()
+            try:
+                with METRICS.timer("voice_stage_seconds", errors="voice_errors_total", stage=name):
+                    proceed = func(utterance)
+            except Exception as e:
+                print(f"Voice {name} error: {e}")
+                continue
+            if proceed is False:
+                continue
+            utterance.mark(name)
+            if index + 1 < len(self.queues):
+                self.queues[index + 1].put(utterance)
+            elif self.on_done:
+                self.on_done(utterance)
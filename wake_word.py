@@ -0,0 +1,159 @@
+import json
+import math
+import sys
+import wave
+from array import array
+
+from intent_parser import WAKE_WORD
+
+SAMPLE_RATE = 16000
+SAMPLE_WIDTH = 2  # 16-bit PCM
+FRAME_MS = 30
+WAKE_WINDOW = 1.5  # Seconds at the start of a segment searched for the wake word
+
+
+def rms(frame):
+    samples = array("h", frame)
+    if sys.byteorder == "big":
+        samples.byteswap()
+    if not samples:
+        return 0.0
+    return math.sqrt(sum(s * s for s in samples) / len(samples))
+
+
+class EnergyVAD:
+    """
+    Energy based voice activity detector for 16-bit mono PCM.
+
+    The threshold adapts to the recording: frames louder than margin times the
+    noise floor (a low percentile of frame energies) count as speech.
+    """
+    def __init__(self, sample_rate=SAMPLE_RATE, frame_ms=FRAME_MS, margin=3.0, min_rms=300,
+                 hangover_ms=300, min_speech_ms=200):
+        self.sample_rate = sample_rate
+        self.frame_bytes = sample_rate * frame_ms // 1000 * SAMPLE_WIDTH
+        self.margin = margin
+        self.min_rms = min_rms
+        self.hangover = max(1, hangover_ms // frame_ms)
+        self.min_speech = max(1, min_speech_ms // frame_ms)
+
+    def energies(self, pcm):
+        return [rms(pcm[i:i + self.frame_bytes]) for i in range(0, len(pcm) - self.frame_bytes + 1, self.frame_bytes)]
+
+    def threshold(self, energies):
+        if not energies:
+            return self.min_rms
+        ordered = sorted(energies)
+        floor = ordered[len(ordered) // 10]
+        # A recording that is nearly all speech has a high floor; stay below its peaks
+        return max(min(floor * self.margin, ordered[-1] / 4), self.min_rms)
+
+    def segments(self, pcm):
+        """
+        Returns (start, end) byte offsets of speech, with silence trimmed.
+        """
+        energies = self.energies(pcm)
+        threshold = self.threshold(energies)
+        segments = []
+        start = None
+        silent = 0
+        for index, energy in enumerate(energies):
+            if energy >= threshold:
+                if start is None:
+                    start = index
+                silent = 0
+            elif start is not None:
+                silent += 1
+                if silent > self.hangover:
+                    self._close(segments, start, index - silent + 1)
+                    start = None
+                    silent = 0
+        if start is not None:
+            self._close(segments, start, len(energies) - silent)
+        return [(s * self.frame_bytes, e * self.frame_bytes) for s, e in segments]
+
+    def _close(self, segments, start, end):
+        if end - start >= self.min_speech:
+            segments.append((start, end))
+
+
+class VoskWakeWord:
+    """
+    On-device wake word spotter: a Vosk recognizer restricted to the wake word grammar.
+    """
+    def __init__(self, model_path, word=WAKE_WORD, sample_rate=SAMPLE_RATE):
+        from vosk import KaldiRecognizer, Model  # Optional dependency, only needed for wake word gating
+
+        self.word = word
+        self.sample_rate = sample_rate
+        self._model = Model(model_path)
+        self._recognizer_class = KaldiRecognizer
+
+    def detect(self, pcm):
+        recognizer = self._recognizer_class(self._model, self.sample_rate, json.dumps([self.word, "[unk]"]))
+        recognizer.AcceptWaveform(pcm)
+        text = json.loads(recognizer.FinalResult()).get("text", "")
+        return self.word in text.split()
+
+
+class AudioGate:
+    """
+    Drops audio without speech or without the wake word, and trims silence from the rest.
+
+    Without a spotter only the VAD is applied.
+    """
+    def __init__(self, vad=None, spotter=None):
+        self.vad = vad or EnergyVAD()
+        self.spotter = spotter
+        self.passed = 0
+        self.rejected = 0
+
+    def process(self, pcm):
+        """
+        Returns the forwarded PCM (from the first wake-prefixed segment on) or None.
+        """
+        window = int(WAKE_WINDOW * self.vad.sample_rate) * SAMPLE_WIDTH
+        segments = self.vad.segments(pcm)
+        for start, end in segments:
+            if self.spotter is None or self.spotter.detect(pcm[start:min(end, start + window)]):
+                self.passed += 1
+                return pcm[start:segments[-1][1]]
+        self.rejected += 1
+        return None
+
+    def process_audio(self, audio):
+        """
+        Same as process() for a speech_recognition AudioData.
+        """
+        pcm = audio.get_raw_data(convert_rate=self.vad.sample_rate, convert_width=SAMPLE_WIDTH)
+        trimmed = self.process(pcm)
+        if trimmed is None:
+            return None
+        return type(audio)(trimmed, self.vad.sample_rate, SAMPLE_WIDTH)
+
+
+def read_wav(path):
+    """
+    Reads a 16 kHz 16-bit mono WAV fixture.
+    """
+    with wave.open(path, "rb") as f:
+        if (f.getnchannels(), f.getsampwidth(), f.getframerate()) != (1, SAMPLE_WIDTH, SAMPLE_RATE):
+            raise ValueError(f"{path}: expected 16 kHz 16-bit mono")
+        return f.readframes(f.getnframes())
+
+
+if __name__ == "__main__":
+    # Usage: python wake_word.py [--model VOSK_MODEL_DIR] file.wav ...
+    args = sys.argv[1:]
+    spotter = None
+    if args[:1] == ["--model"]:
+        spotter = VoskWakeWord(args[1])
+        args = args[2:]
+    gate = AudioGate(spotter=spotter)
+    for path in args:
+        pcm = read_wav(path)
+        segments = [(s / SAMPLE_WIDTH / SAMPLE_RATE, e / SAMPLE_WIDTH / SAMPLE_RATE) for s, e in gate.vad.segments(pcm)]
+        forwarded = gate.process(pcm)
+        verdict = "forward" if forwarded is not None else "drop"
+        seconds = len(forwarded) / SAMPLE_WIDTH / SAMPLE_RATE if forwarded else 0.0
+        print(f"{path}: {verdict} {seconds:.2f}s, speech at " + ", ".join(f"{s:.2f}-{e:.2f}s" for s, e in segments))